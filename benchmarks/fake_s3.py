@@ -0,0 +1,122 @@
+import time
+import typing
+import threading
+from collections import Counter
+from urllib.parse import parse_qs
+
+import boto3
+from botocore.config import Config
+from werkzeug.serving import make_server, WSGIRequestHandler
+from moto.server import create_backend_app
+
+
+_SLOW_DOWN = (b'<?xml version="1.0" encoding="UTF-8"?>\n'
+              b'<Error><Code>SlowDown</Code><Message>Please reduce your request rate.</Message></Error>')
+
+
+class FakeS3:
+    """
+    In-process stand-in for S3: moto's S3 backend served over HTTP from a local port, behind a model of network and
+    service limits. Each request waits `latency` seconds, plus transfer time at `bandwidth` bytes per second. Requests
+    beyond `requests_per_second` are answered with 503 SlowDown, as S3 answers requests beyond the request rate of a
+    prefix. Requests are counted by operation, including reads of presigned urls.
+
+    `resource()` returns a boto3 S3 resource for the stand-in. Botocore retries are disabled, so throttled requests
+    surface to the FlashFlood concurrency controller, which retries them.
+    """
+    def __init__(self,
+                 latency: float=0.0,
+                 bandwidth: float=None,
+                 requests_per_second: float=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests_per_second = requests_per_second
+        self.requests: Counter = Counter()
+        self.bytes_transferred = 0
+        self.throttled = 0
+        self._tokens = requests_per_second or 0.0
+        self._refill_time = time.monotonic()
+        self._accounting_lock = threading.Lock()
+        self._app = create_backend_app("s3")
+        self._server = make_server("127.0.0.1", 0, self, threaded=True, request_handler=_QuietRequestHandler)
+        self.endpoint_url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def resource(self) -> typing.Any:
+        return boto3.resource("s3",
+                              endpoint_url=self.endpoint_url,
+                              region_name="us-east-1",
+                              aws_access_key_id="benchmark",
+                              aws_secret_access_key="benchmark",
+                              config=Config(s3=dict(addressing_style="path"),
+                                            retries=dict(total_max_attempts=1),
+                                            max_pool_connections=64))
+
+    def reset_counters(self):
+        with self._accounting_lock:
+            self.requests.clear()
+            self.bytes_transferred = 0
+            self.throttled = 0
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __call__(self, environ: dict, start_response: typing.Callable) -> typing.Iterable[bytes]:
+        operation = _operation(environ)
+        request_size = int(environ.get('HTTP_X_AMZ_DECODED_CONTENT_LENGTH') or environ.get('CONTENT_LENGTH') or 0)
+        if self._throttle(operation):
+            environ['wsgi.input'].read(int(environ.get('CONTENT_LENGTH') or 0))
+            body = b"" if "HEAD" == operation else _SLOW_DOWN
+            start_response("503 Slow Down", [("Content-Type", "application/xml"),
+                                             ("Content-Length", str(len(body)))])
+            self._wait()
+            return [body]
+        body = b"".join(self._app(environ, start_response))
+        number_of_bytes = request_size
+        if "HEAD" != operation:
+            number_of_bytes += len(body)
+        with self._accounting_lock:
+            self.bytes_transferred += number_of_bytes
+        self._wait(number_of_bytes)
+        return [body]
+
+    def _throttle(self, operation: str) -> bool:
+        with self._accounting_lock:
+            self.requests[operation] += 1
+            if not self.requests_per_second:
+                return False
+            now = time.monotonic()
+            self._tokens = min(self.requests_per_second,
+                               self._tokens + (now - self._refill_time) * self.requests_per_second)
+            self._refill_time = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return True
+            self._tokens -= 1
+            return False
+
+    def _wait(self, number_of_bytes: int=0):
+        delay = self.latency
+        if self.bandwidth:
+            delay += number_of_bytes / self.bandwidth
+        if delay:
+            time.sleep(delay)
+
+
+def _operation(environ: dict) -> str:
+    method = environ['REQUEST_METHOD']
+    query = parse_qs(environ.get('QUERY_STRING', ""), keep_blank_values=True)
+    key = environ.get('PATH_INFO', "").lstrip("/").partition("/")[2]
+    if "tagging" in query:
+        return "TAGGING"
+    elif "delete" in query or "DELETE" == method:
+        return "DELETE"
+    elif "GET" == method:
+        return "GET" if key else "LIST"
+    return method
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
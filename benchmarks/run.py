@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+"""
+Benchmark FlashFlood operations against an in-process S3 stand-in, emitting one JSON document per benchmark.
+
+    python -m benchmarks.run --number-of-events 100 1000 --event-size 64 4096 --latency 0.005 --output results.json
+    python -m benchmarks.run --compare results.json
+    python -m benchmarks.run --storage s3 filesystem memory --latency 0.005 --output results.json
+
+With several storages, operations per second are also reported side by side, on stderr. Latency, bandwidth and
+throttling apply to the S3 stand-in only.
+
+With `--compare`, results are checked against a previous run, and the exit status is nonzero if request counts grew,
+or throughput dropped by more than `--tolerance`.
+"""
+import os
+import sys
+import json
+import time
+import random
+import typing
+import argparse
+import tempfile
+import contextlib
+from uuid import uuid4
+
+import flashflood
+from flashflood import config
+from flashflood.storage import FilesystemStorage, MemoryStorage
+from benchmarks.fake_s3 import FakeS3
+
+
+STORAGES = ("s3", "filesystem", "memory")
+
+
+def run(number_of_events: int,
+        event_size: int,
+        latency: float=0.0,
+        bandwidth: float=None,
+        requests_per_second: float=None,
+        number_of_lookups: int=100,
+        number_of_updates: int=10,
+        verify_uploads: bool=False,
+        storage: str="s3") -> typing.List[dict]:
+    """
+    Run each benchmark for `number_of_events` events of `event_size` bytes, returning a result document per benchmark.
+    If `verify_uploads` is true, uploads are verified with the object exists waiter.
+
+    `storage` is "s3", the S3 stand-in with `latency`, `bandwidth` and `requests_per_second`, "filesystem", a
+    `FilesystemStorage` in a temporary directory, or "memory", a `MemoryStorage`. Requests are counted for S3 only, and
+    `replay_event_stream`, which reads presigned urls, runs against S3 only.
+    """
+    if storage not in STORAGES:
+        raise ValueError(f"Unknown storage {storage}")
+    s3: typing.Optional[FakeS3] = None
+    results = list()
+
+    def measure(name: str, number_of_operations: int, func: typing.Callable[[], typing.Any]):
+        if s3 is not None:
+            s3.reset_counters()
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        results.append(dict(benchmark=name,
+                            storage=storage,
+                            number_of_events=number_of_events,
+                            event_size=event_size,
+                            latency=latency,
+                            bandwidth=bandwidth,
+                            requests_per_second=requests_per_second,
+                            verify_uploads=verify_uploads,
+                            operations=number_of_operations,
+                            seconds=seconds,
+                            operations_per_second=number_of_operations / seconds if seconds else None,
+                            requests=None if s3 is None else dict(s3.requests),
+                            number_of_requests=None if s3 is None else sum(s3.requests.values()),
+                            bytes_transferred=None if s3 is None else s3.bytes_transferred,
+                            throttled=None if s3 is None else s3.throttled))
+
+    waiter_config = dict(config.object_exists_waiter_config)
+    config.object_exists_waiter_config['Delay'] = 1 if verify_uploads else 0
+    try:
+        with contextlib.ExitStack() as stack:
+            if "s3" == storage:
+                s3 = FakeS3(latency, bandwidth, requests_per_second)
+                stack.callback(s3.close)
+                bucket = s3.resource().create_bucket(Bucket=f"benchmark-{uuid4()}")
+                ff = flashflood.FlashFlood(s3.resource(), bucket.name, "benchmark")
+            elif "filesystem" == storage:
+                root = stack.enter_context(tempfile.TemporaryDirectory())
+                ff = flashflood.FlashFlood(None, None, "benchmark", storage=FilesystemStorage(root))
+            else:
+                ff = flashflood.FlashFlood(None, None, "benchmark", storage=MemoryStorage())
+            _run_benchmarks(ff, measure, number_of_events, event_size, number_of_lookups, number_of_updates,
+                            presigned_urls=s3 is not None)
+    finally:
+        config.object_exists_waiter_config.update(waiter_config)
+    return results
+
+
+def _run_benchmarks(ff: flashflood.FlashFlood,
+                    measure: typing.Callable[[str, int, typing.Callable[[], typing.Any]], None],
+                    number_of_events: int,
+                    event_size: int,
+                    number_of_lookups: int,
+                    number_of_updates: int,
+                    presigned_urls: bool):
+    """
+    Run each benchmark against `ff`, timing it with `measure`. Benchmarks reading presigned urls run only if
+    `presigned_urls` is true.
+    """
+    events: typing.List[flashflood.Event] = list()
+    measure("put", number_of_events,
+            lambda: events.extend(ff.put(os.urandom(event_size)) for _ in range(number_of_events)))
+    measure("journal", number_of_events, lambda: ff.journal(minimum_number_of_events=number_of_events))
+    measure("list_journals", 1, lambda: list(ff.list_journals()))
+    lookups = random.sample(events, min(number_of_lookups, len(events)))
+    measure("get_event", len(lookups), lambda: [ff.get_event(e.event_id) for e in lookups])
+    measure("replay", number_of_events, lambda: list(ff.replay()))
+    if presigned_urls:
+        measure("replay_event_stream", number_of_events,
+                lambda: [e for es in ff.list_event_streams() for e in flashflood.replay_event_stream(es)])
+
+    def _update():
+        for e in random.sample(events, min(number_of_updates, len(events))):
+            ff.update_event(e.event_id, os.urandom(event_size))
+        ff.update()
+
+    measure("update", min(number_of_updates, len(events)), _update)
+
+
+def compare(results: typing.List[dict], baseline: typing.List[dict], tolerance: float) -> typing.List[str]:
+    """
+    Return descriptions of regressions of `results` relative to `baseline`.
+    """
+    def _key(r):
+        return (r['benchmark'], r['number_of_events'], r['event_size'], r.get('storage', "s3"), r['latency'],
+                r['bandwidth'], r['requests_per_second'], r.get('verify_uploads', False))
+
+    baseline_results = {_key(r): r for r in baseline}
+    regressions = list()
+    for r in results:
+        b = baseline_results.get(_key(r))
+        if b is None:
+            continue
+        name = "{}[events={},size={},storage={}]".format(*_key(r)[:4])
+        if None not in (r['number_of_requests'], b['number_of_requests']) and \
+                r['number_of_requests'] > b['number_of_requests']:
+            regressions.append(f"{name}: {r['number_of_requests']} requests, baseline {b['number_of_requests']}")
+        if r['operations_per_second'] and b['operations_per_second']:
+            if r['operations_per_second'] < (1 - tolerance) * b['operations_per_second']:
+                regressions.append(f"{name}: {r['operations_per_second']:.1f} operations per second, "
+                                   f"baseline {b['operations_per_second']:.1f}")
+    return regressions
+
+
+def side_by_side(results: typing.List[dict]) -> str:
+    """
+    Return a table of the operations per second of `results`, with a column per storage.
+    """
+    storages = [storage for storage in STORAGES if any(storage == r['storage'] for r in results)]
+    rows: typing.Dict[tuple, typing.Dict[str, float]] = dict()
+    for r in results:
+        rows.setdefault((r['benchmark'], r['number_of_events'], r['event_size']), dict())[r['storage']] = \
+            r['operations_per_second']
+    lines = [f"{'benchmark':<20} {'events':>8} {'size':>8}" + "".join(f" {storage:>12}" for storage in storages)]
+    for (name, number_of_events, event_size), operations_per_second in rows.items():
+        cells = [f"{operations_per_second[storage]:.1f}" if operations_per_second.get(storage) else "-"
+                 for storage in storages]
+        lines.append(f"{name:<20} {number_of_events:>8} {event_size:>8}" + "".join(f" {c:>12}" for c in cells))
+    return "\n".join(lines)
+
+
+def main(argv: typing.List[str]=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number-of-events", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--event-size", type=int, nargs="+", default=[64, 4096])
+    parser.add_argument("--storage", nargs="+", choices=STORAGES, default=["s3"],
+                        help="storage backends to benchmark, reported side by side")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes per second")
+    parser.add_argument("--requests-per-second", type=float, default=None, help="throttle requests beyond this rate")
+    parser.add_argument("--verify-uploads", action="store_true", help="verify uploads with the object exists waiter")
+    parser.add_argument("--output", default=None, help="write results to this file instead of stdout")
+    parser.add_argument("--compare", default=None, help="results of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed fractional drop in throughput")
+    args = parser.parse_args(argv)
+
+    results = list()
+    for number_of_events in args.number_of_events:
+        for event_size in args.event_size:
+            for storage in args.storage:
+                results.extend(run(number_of_events, event_size, args.latency, args.bandwidth,
+                                   args.requests_per_second, verify_uploads=args.verify_uploads, storage=storage))
+    with (open(args.output, "w") if args.output else contextlib.nullcontext(sys.stdout)) as fh:  # type: ignore
+        for r in results:
+            fh.write(json.dumps(r) + "\n")
+    if 1 < len(args.storage):
+        print(side_by_side(results), file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = [json.loads(line) for line in fh if line.strip()]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print("Regression", regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
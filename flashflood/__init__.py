@@ -1,19 +1,45 @@
 import io
-from datetime import datetime
+import os
+import logging
+from datetime import datetime, timedelta
 import json
+import heapq
+import time
+import asyncio
+import queue
+import random
 import typing
-import requests
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from collections import deque
 from uuid import uuid4
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from flashflood.util import datetime_to_timestamp, datetime_from_timestamp, DateRange, S3Deleter
-from flashflood.objects import Event, BaseJournal, BaseJournalUpdate
-from flashflood.identifiers import JournalID, TOMBSTONE_SUFFIX
+from flashflood.util import (datetime_to_timestamp, datetime_from_timestamp, timestamp_now, DateRange, LRUCache,
+                             concurrent_map)
+from flashflood.objects import (Event, EventTable, EventBatch, EventBatchReader, BaseJournal, BaseJournalUpdate,
+                                layout_depth)
+from flashflood.identifiers import JournalID, JournalUpdateAction, TOMBSTONE_SUFFIX
 from flashflood.key_index import BaseKeyIndex
+from flashflood.lease import BaseJournalLease
+from flashflood.streams import EventStreamReader, ChunkedRange
+from flashflood.aio import EventSource, areplay_event_stream, areplay_event_streams, amerge, client_session
+from flashflood.cache import BlobCache
+from flashflood.compression import BlockIndex, DecompressedRange, BaseCodec, register_codec
+from flashflood.metrics import RequestStats, attributed, run_attributed, submit
+from flashflood.tracing import BaseTracer, RecordingTracer, OpenTelemetryTracer, set_tracer, span
+from flashflood.concurrency import ConcurrencyController, set_controller, get_controller
+from flashflood.storage import BaseStorage, S3Storage, FilesystemStorage, MemoryStorage
+from flashflood.reindex import IndexProgress, IndexReport, reconcile_index
+from flashflood.federation import Federation, shard_by_event_id
+from flashflood.checkpoint import ReplayCheckpoint, LocalCheckpointStore, S3CheckpointStore, StorageCheckpointStore
 from flashflood.exceptions import (FlashFloodException, FlashFloodEventNotFound, FlashFloodEventExistsError,
                                    FlashFloodJournalingError)
 
 
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
 # TODO:
 # What happens if event updates are written for a journal that has been removed?
 #
@@ -21,9 +47,6 @@ from flashflood.exceptions import (FlashFloodException, FlashFloodEventNotFound,
 #
 # Event updates should be applied idempotently
 #
-# write tests for multiple updates/deletes to the same event
-# Create resolution policy for multiple updates/deletes to the same event
-#
 # Use bucket lifecycle policy for garbage collection
 # Warn if policy is not set upon FF instantiation
 #
@@ -31,37 +54,90 @@ from flashflood.exceptions import (FlashFloodException, FlashFloodEventNotFound,
 
 
 class FlashFlood:
-    def __init__(self, s3_resource: typing.Any, bucket: str, root_prefix: str):
-        self.s3 = s3_resource
-        self.s3_client = s3_resource.meta.client
-        self.bucket = self.s3.Bucket(bucket)
+    def __init__(self,
+                 s3_resource: typing.Any,
+                 bucket: typing.Optional[str],
+                 root_prefix: str,
+                 manifest_cache_size: int=128,
+                 blob_cache: BlobCache=None,
+                 codec: str=None,
+                 compression_block_size: int=1024 * 1024,
+                 storage: BaseStorage=None,
+                 partition_format: str=None):
+        """
+        Events are stored in `bucket` under `root_prefix`. If `storage` is provided, events are stored there instead,
+        and `s3_resource` and `bucket` may be `None`.
+
+        If `partition_format` is provided, journal keys are partitioned by the start date of each journal formatted
+        with it, e.g. "%Y/%m/%d", and update keys by the partition of their journal. The format must name periods of at
+        least a day, most significant first, so partitions sort by date. Listings for a date range list only the
+        partitions overlapping it. Journals are never combined across partitions, so `journal` combines the remaining
+        new journals of past partitions below its minimums. Existing stores are moved between layouts with
+        `migrate_layout`.
+        """
+        if storage is None:
+            self.s3 = s3_resource
+            self.s3_client = s3_resource.meta.client
+            self.bucket = self.s3.Bucket(bucket)
+            storage = S3Storage(self.bucket, self.s3_client)
+        self.storage = storage
         if root_prefix.endswith("/"):
             raise ValueError("Root prefix cannot end with `/`")
         self.root_prefix = root_prefix
+        self.partition_format = partition_format
         self._journal_pfx = f"{root_prefix}/journals"
         self._blobs_pfx = f"{root_prefix}/blobs"
         self._update_pfx = f"{root_prefix}/update"
         self._index_pfx = f"{root_prefix}/index"
+        self._lease_pfx = f"{root_prefix}/leases"
+        self._checkpoint_pfx = f"{root_prefix}/checkpoints"
+        _blob_cache, _codec, _compression_block_size = blob_cache, codec, compression_block_size
 
         class _Journal(BaseJournal):
-            bucket = self.bucket
-            s3_client = self.s3_client
+            storage = self.storage
             _journal_pfx = self._journal_pfx
             _blobs_pfx = self._blobs_pfx
+            manifest_cache = LRUCache(manifest_cache_size)
+            blob_cache = _blob_cache
+            codec = _codec
+            compression_block_size = _compression_block_size
+            partition_format = self.partition_format
 
         class _JournalUpdate(BaseJournalUpdate):
-            bucket = self.bucket
-            s3_client = self.s3_client
+            storage = self.storage
             _pfx = self._update_pfx
+            partition_format = self.partition_format
 
         class _KeyIndex(BaseKeyIndex):
-            bucket = self.bucket
+            storage = self.storage
             _pfx = self._index_pfx
 
+        class _JournalLease(BaseJournalLease):
+            storage = self.storage
+            _pfx = self._lease_pfx
+
         self._Journal = _Journal
         self._JournalUpdate = _JournalUpdate
         self._KeyIndex = _KeyIndex
+        self._JournalLease = _JournalLease
+
+    @property
+    def stats(self) -> RequestStats:
+        """
+        Storage requests issued by this FlashFlood, by operation type and attributed to public methods.
+        """
+        return self.storage.stats
 
+    def measure(self) -> typing.ContextManager[RequestStats]:
+        """
+        Collect storage requests issued during the context, e.g.
+            with ff.measure() as m:
+                ff.put(data)
+            m.requests("PUT", method="put")
+        """
+        return self.storage.stats.measure()
+
+    @attributed
     def put(self, data, event_id: str=None, date: datetime=None) -> Event:
         date = date or datetime.utcnow()
         timestamp = datetime_to_timestamp(date)
@@ -75,13 +151,14 @@ class FlashFlood:
             journal = self._Journal(events, data=data, version="new")
             journal.upload()
             self._index_journal(journal)
-            print("new journal", journal.id_)
+            logger.debug("New journal %s", journal.id_, extra=dict(journal_id=journal.id_))
             return Event(event_id, date, data)
 
     def _index_journal(self, journal: BaseJournal):
         journal_id = journal.id_
-        self._KeyIndex.put_batch({e['event_id']: journal_id for e in journal.events})
+        self._KeyIndex.put_batch(dict.fromkeys(journal.events.event_ids, journal_id))
 
+    @attributed
     def update_event(self, event_id: str, new_data: bytes):
         if self.event_exists(event_id):
             journal_id = self._journal_for_event(event_id)
@@ -89,6 +166,7 @@ class FlashFlood:
         else:
             raise FlashFloodEventNotFound(f"Event {event_id} not found")
 
+    @attributed
     def delete_event(self, event_id: str):
         """
         Write delete marker for event.
@@ -98,13 +176,15 @@ class FlashFlood:
         # Deindexing immediately means the event is not available for lookup, but it will still appear in replay.
         self._KeyIndex.delete(event_id)
 
+    @attributed
     def update(self, number_of_updates_to_apply: int=1000) -> int:
         """
-        Apply updates for each update and delete marker.
+        Apply the winning update or delete for each event, and tombstone every update marker, including superseded ones.
+        Only payloads of winning updates are fetched.
         """
         count = 0
         for journal_id, updates in self._JournalUpdate.get_updates_for_all_journals():
-            print("updating journal", journal_id)
+            logger.info("Updating journal %s", journal_id, extra=dict(journal_id=journal_id))
             journal = self._Journal.from_id(journal_id)
             new_journal = journal.updated(updates)
             if new_journal != journal:
@@ -112,66 +192,315 @@ class FlashFlood:
                     new_journal.upload()
                     self._index_journal(new_journal)
                 journal.upload_tombstone()
-            for u in updates.values():
-                u.upload_tombstone()
+            self._JournalUpdate.upload_tombstones(updates.markers())
             count += len(updates)
             if number_of_updates_to_apply <= count:
                 break
         return count
 
-    def journal(self, minimum_number_of_events: int=100, minimum_size: int=None):
+    @attributed
+    def journal(self,
+                minimum_number_of_events: int=100,
+                minimum_size: int=None,
+                lease_duration: int=300,
+                number_of_lease_attempts: int=3):
+        """
+        Combine new journals. The journals to combine are leased for `lease_duration` seconds, so several workers may
+        journal concurrently without combining the same journals.
+
+        With a partitioned layout, journals are combined within a partition. The new journals of a partition dated
+        entirely in the past are combined even if they fall short of `minimum_number_of_events` or `minimum_size`.
+        """
         minimum_size = minimum_size or 0
+        for attempt in range(number_of_lease_attempts):
+            journals_to_combine = self._find_journals_to_combine(minimum_number_of_events, minimum_size)
+            if not journals_to_combine:
+                return
+            lease = self._JournalLease.acquire([journal.id_ for journal in journals_to_combine], lease_duration)
+            if lease is not None:
+                try:
+                    # Another worker may have combined these journals before our lease was acquired
+                    if self._journals_are_live(journals_to_combine):
+                        self.combine_journals(journals_to_combine, lease)
+                        return
+                finally:
+                    lease.release()
+            if attempt < number_of_lease_attempts - 1:
+                time.sleep(random.random() * 2 ** attempt)
+        raise FlashFloodJournalingError(f"Unable to lease journals after {number_of_lease_attempts} attempts")
+
+    def _find_journals_to_combine(self, minimum_number_of_events: int, minimum_size: int) -> typing.List[BaseJournal]:
+        leases = list(self._JournalLease.list())
+        current_partition = self._Journal.partition(timestamp_now())
         number_of_events, size = 0, 0
-        journals_to_combine = list()
+        journals_to_combine: typing.List[BaseJournal] = list()
+
+        def _in_closed_partition() -> bool:
+            # No more journals will be written to partitions dated before the current one
+            partition = self._Journal.partition(journals_to_combine[0].id_)
+            return partition is not None and current_partition is not None and partition < current_partition
+
         for journal_id in self._new_journals():
+            if any(lease.covers(journal_id) for lease in leases):
+                # Only combine contiguous journals, so our lease does not overlap leases held by other workers
+                number_of_events, size = 0, 0
+                journals_to_combine = list()
+                continue
+            if journals_to_combine and self._Journal.partition(journal_id) != self._Journal.partition(
+                    journals_to_combine[0].id_):
+                # Journals never span partitions
+                if _in_closed_partition():
+                    return journals_to_combine
+                number_of_events, size = 0, 0
+                journals_to_combine = list()
             journal = self._Journal.from_id(journal_id)
             size += journal.size
             number_of_events += len(journal.events)
             journals_to_combine.append(journal)
-            print("Found journal to combine", journal.id_)
+            logger.debug("Found journal to combine %s", journal.id_, extra=dict(journal_id=journal.id_))
             if minimum_number_of_events <= number_of_events and minimum_size <= size:
                 break
+        else:
+            if journals_to_combine and _in_closed_partition():
+                return journals_to_combine
         if minimum_number_of_events > number_of_events:
             raise FlashFloodJournalingError(f"Journal condition: minimum_number_of_events={minimum_number_of_events}")
         if minimum_size > size:
             raise FlashFloodJournalingError(f"Journal condition: minimum_size={minimum_size}")
-        self.combine_journals(journals_to_combine)
+        return journals_to_combine
+
+    def _journals_are_live(self, journals: typing.List[BaseJournal]) -> bool:
+        journal_ids = {journal.id_ for journal in journals}
+        first_journal_id, last_journal_id = min(journal_ids), max(journal_ids)
+        search_range = DateRange(first_journal_id.start_date, max(j.end_date for j in journal_ids))
+        for journal_id in self._Journal.list(list_from=JournalID(first_journal_id.range_prefix),
+                                             search_range=search_range):
+            journal_ids.discard(journal_id)
+            if not journal_ids or journal_id > last_journal_id:
+                break
+        return not journal_ids
 
     def _new_journals(self) -> typing.Iterator[JournalID]:
         for journal_id in self._Journal.list():
             if "new" == journal_id.version:
                 yield journal_id
 
-    def combine_journals(self, journals_to_combine: typing.List[BaseJournal]) -> BaseJournal:
-        new_journal = self._Journal()
-        objects_to_delete = journals_to_combine.copy()
-        for journal in journals_to_combine:
-            print("combining journal", journal.id_)
-            updates = self._JournalUpdate.get_updates_for_journal(journal.id_)
-            objects_to_delete.extend(list(updates.values()))
-            journal = journal.updated(updates)
-            for e in journal.events:
-                new_offset = e['offset'] + len(new_journal.data)
-                new_journal.events.append({**e, **dict(offset=new_offset)})
-            new_journal.data += journal.body.read()
-        if not new_journal.is_empty:
-            new_journal.upload()
-            self._index_journal(new_journal)
-        for o in objects_to_delete:
-            o.upload_tombstone()
-        return new_journal
-
-    def replay(self, from_date: datetime=None, to_date: datetime=None) -> typing.Iterator[Event]:
+    @attributed
+    def combine_journals(self,
+                         journals_to_combine: typing.List[BaseJournal],
+                         lease: BaseJournalLease=None) -> BaseJournal:
+        with span("flashflood.journal.combine", number_of_journals=len(journals_to_combine)):
+            events = EventTable()
+            data: typing.List[bytes] = list()
+            size = 0
+            updates_to_delete: typing.List[BaseJournalUpdate] = list()
+            for journal in journals_to_combine:
+                logger.debug("Combining journal %s", journal.id_, extra=dict(journal_id=journal.id_))
+                updates = self._JournalUpdate.get_updates_for_journal(journal.id_)
+                updates_to_delete.extend(updates.markers())
+                journal = journal.updated(updates)
+                events.extend(journal.events, size)
+                data.append(journal.body.read())
+                size += len(data[-1])
+            new_journal = self._Journal(events, data=b"".join(data))
+            if lease is not None and lease.is_expired:
+                raise FlashFloodJournalingError(f"Lease {lease.id_} expired before journals were combined")
+            if not new_journal.is_empty:
+                new_journal.upload()
+                self._index_journal(new_journal)
+                logger.info("Combined %d journals into %s", len(journals_to_combine), new_journal.id_,
+                            extra=dict(journal_id=new_journal.id_))
+            for journal in journals_to_combine:
+                journal.upload_tombstone()
+            self._JournalUpdate.upload_tombstones(updates_to_delete)
+            return new_journal
+
+    @attributed
+    def replay(self,
+               from_date: datetime=None,
+               to_date: datetime=None,
+               checkpoint: ReplayCheckpoint=None,
+               number_of_connections: int=1,
+               apply_pending_updates: bool=False) -> typing.Iterator[Event]:
+        for event, _ in self.replay_with_checkpoints(from_date, to_date, checkpoint, number_of_connections,
+                                                     apply_pending_updates):
+            yield event
+
+    @attributed
+    def replay_with_checkpoints(self,
+                                from_date: datetime=None,
+                                to_date: datetime=None,
+                                checkpoint: ReplayCheckpoint=None,
+                                number_of_connections: int=1,
+                                apply_pending_updates: bool=False
+                                ) -> typing.Iterator[typing.Tuple[Event, ReplayCheckpoint]]:
+        """
+        Replay events, pairing each event with the checkpoint following it. With more than one connection, journal
+        data are fetched in chunks over `number_of_connections` parallel connections.
+
+        If `checkpoint` is provided, replay resumes after it. The checkpoint journal is resumed with a ranged read, and
+        journals listed after it are replayed in full. Journals listed before it, or replacing it, are replayed after
+        the last consumed event date, since journaling may have moved unconsumed events into them. Events from
+        overlapping journals may therefore be replayed again, but are never skipped. Events dated at the last consumed
+        event date are replayed unless the checkpoint records them as consumed.
+
+        If `apply_pending_updates` is true, update and delete markers not yet applied by `update` are read for each
+        journal, listed concurrently a few journals ahead, and applied to replayed events. Checkpoints are unaffected.
+        """
+        search_range = DateRange(from_date, to_date)
+        resume_range: typing.Optional[DateRange] = search_range
+        resume_from, resume_index = None, 0
+        if checkpoint is not None:
+            resume_range = _resume_range(search_range, checkpoint)
+            if self._Journal.is_live(JournalID(checkpoint.journal_id)):
+                resume_from, resume_index = JournalID(checkpoint.journal_id), checkpoint.event_index
+
+        def _journals_to_replay() -> typing.Iterator[typing.Tuple[JournalID, DateRange, int]]:
+            for journal_id in self._list_journals(search_range):
+                if resume_from is not None and resume_from <= journal_id:
+                    yield journal_id, search_range, (resume_index if resume_from == journal_id else 0)
+                elif resume_range is not None and DateRange(journal_id.start_date, journal_id.end_date) in resume_range:
+                    yield journal_id, resume_range, 0
+
+        def _with_updates(item: tuple) -> tuple:
+            return (*item, self._JournalUpdate.get_updates_for_journal(item[0]))
+
+        if apply_pending_updates:
+            journals = concurrent_map(_with_updates, _journals_to_replay(), self._Journal.number_of_listing_workers)
+        else:
+            journals = ((*item, dict()) for item in _journals_to_replay())
+        previous = checkpoint
+        for journal_id, journal_search_range, start_index, updates in journals:
+            logger.debug("Replaying from journal %s", journal_id, extra=dict(journal_id=journal_id))
+            journal = self._Journal.from_id(journal_id)
+            read_range = journal.read_range
+            if 1 < number_of_connections:
+                read_range = _chunked_read_range(journal, number_of_connections)
+            for event, previous in _replay_events(journal_id, journal.events, journal_search_range, read_range,
+                                                  start_index, updates=updates, previous=previous):
+                yield event, previous
+
+    @attributed
+    def replay_batches(self,
+                       from_date: datetime=None,
+                       to_date: datetime=None,
+                       buffer_size: int=8 * 1024 * 1024) -> typing.Iterator[EventBatch]:
+        """
+        Replay events in batches read into a reusable buffer of at least `buffer_size` bytes. Event data in each batch
+        are views into the buffer, valid until the next batch is requested.
+        """
         search_range = DateRange(from_date, to_date)
+        reader = EventBatchReader(buffer_size)
         for journal_id in self.list_journals(from_date, to_date):
-            print("replaying from journal", journal_id)
+            logger.debug("Replaying from journal %s", journal_id, extra=dict(journal_id=journal_id))
             journal = self._Journal.from_id(journal_id)
-            for item in journal.events:
-                event_date = datetime_from_timestamp(item['timestamp'])
-                if event_date in search_range:
-                    yield Event(item['event_id'], event_date, journal.body.read(item['size']))
-                elif event_date in search_range.future:
-                    break
+            yield from reader.read(journal.events, search_range, journal.read_range)
+
+    def checkpoint_store(self) -> StorageCheckpointStore:
+        """
+        Return a store persisting checkpoints alongside this FlashFlood, for sharing among consumers.
+        """
+        return StorageCheckpointStore(self.storage, self._checkpoint_pfx)
+
+    @attributed
+    def tail(self,
+             from_date: datetime=None,
+             minimum_poll_interval: float=1.0,
+             maximum_poll_interval: float=30.0,
+             maximum_idle_time: float=None,
+             rescan_interval: typing.Optional[float]=60.0) -> typing.Iterator[Event]:
+        """
+        Follow events as they are recorded, yielding each event once, with the poll interval doubling while no new
+        events are found. If `maximum_idle_time` is provided, stop after finding no new events for that many seconds.
+
+        Each poll lists journals from a cursor at the start of the oldest "new" journal seen, since journaling may
+        combine it into a journal not seen before, or after the last journal listed. Manifests are fetched only for
+        journals not seen before, and only the data of events not yet yielded is read. Journals rewritten by `update`
+        replace a journal with the same date range, and are skipped. Events dated before the cursor are found by
+        listing every journal in range every `rescan_interval` seconds, or never if `rescan_interval` is `None`.
+        """
+        search_range = DateRange(from_date)
+        cursor: typing.Optional[JournalID] = None
+        seen_journals: typing.Set[JournalID] = set()
+        new_journal_events: typing.Dict[JournalID, typing.List[str]] = dict()
+        seen_events: typing.Set[str] = set()
+        last_rescan = time.monotonic()
+        poll_interval = minimum_poll_interval
+        idle_time = 0.0
+        while True:
+            if cursor is not None and rescan_interval is not None and rescan_interval <= time.monotonic() - last_rescan:
+                cursor, last_rescan = None, time.monotonic()
+            number_of_events = 0
+            listed_journals: typing.List[JournalID] = list()
+            seen_ranges = {id_.range_prefix for id_ in seen_journals}
+            for journal_id in self._Journal.list(list_from=cursor, search_range=search_range):
+                listed_journals.append(journal_id)
+                if journal_id in seen_journals or journal_id.end_date not in search_range:
+                    continue
+                seen_journals.add(journal_id)
+                if "new" != journal_id.version and journal_id.range_prefix in seen_ranges:
+                    continue
+                try:
+                    journal = self._Journal.from_id(journal_id)
+                except FlashFloodException:
+                    # This journal was removed after listing; its events appear in the journal replacing it.
+                    continue
+                if "new" == journal_id.version:
+                    new_journal_events[journal_id] = list(journal.events.event_ids)
+                for event in self._unseen_events(journal, seen_events, search_range):
+                    seen_events.add(event.event_id)
+                    number_of_events += 1
+                    yield event
+            listed = set(listed_journals)
+
+            # Journals after the cursor that were not listed have been removed
+            def _removed(journal_id: JournalID) -> bool:
+                return (cursor is None or cursor < journal_id) and journal_id not in listed
+
+            seen_journals = {journal_id for journal_id in seen_journals if not _removed(journal_id)}
+            new_journal_events = {journal_id: event_ids for journal_id, event_ids in new_journal_events.items()
+                                  if not _removed(journal_id)}
+            seen_events = {event_id for event_ids in new_journal_events.values() for event_id in event_ids}
+            if new_journal_events:
+                cursor = JournalID(min(journal_id.start_timestamp for journal_id in new_journal_events))
+            elif listed_journals:
+                cursor = max(listed_journals + ([cursor] if cursor is not None else []))
+            if number_of_events:
+                poll_interval, idle_time = minimum_poll_interval, 0.0
+            elif maximum_idle_time is not None and idle_time >= maximum_idle_time:
+                return
+            time.sleep(poll_interval)
+            if not number_of_events:
+                idle_time += poll_interval
+                poll_interval = min(2 * poll_interval, maximum_poll_interval)
+
+    @staticmethod
+    def _unseen_events(journal: BaseJournal,
+                       seen_events: typing.Set[str],
+                       search_range: DateRange) -> typing.Iterator[Event]:
+        """
+        Yield the events of `journal` in `search_range` and not in `seen_events`, reading the data of each run of
+        consecutive such events with one ranged read.
+        """
+        events = journal.events
+        wanted = [event_id not in seen_events and datetime_from_timestamp(events.timestamps[i]) in search_range
+                  for i, event_id in enumerate(events.event_ids)]
+        i = 0
+        while i < len(wanted):
+            if not wanted[i]:
+                i += 1
+                continue
+            j = i
+            while j < len(wanted) and wanted[j]:
+                j += 1
+            body = journal.read_range(events.offsets[i], events.offsets[j - 1] + events.sizes[j - 1])
+            try:
+                for k in range(i, j):
+                    data = body.read(events.sizes[k])
+                    yield Event(events.event_ids[k], datetime_from_timestamp(events.timestamps[k]), data)
+            finally:
+                body.close()
+            i = j
 
     def _journal_for_event(self, event_id: str) -> JournalID:
         journal_id = self._KeyIndex.get(event_id)
@@ -180,52 +509,559 @@ class FlashFlood:
         else:
             return journal_id
 
+    @attributed
     def event_exists(self, event_id: str) -> bool:
         return self._KeyIndex.get(event_id) is not None
 
-    def get_event(self, event_id: str) -> Event:
+    @attributed
+    def get_event(self, event_id: str, apply_pending_updates: bool=False) -> Event:
+        """
+        Return the event `event_id`. If `apply_pending_updates` is true, an update not yet applied by `update` is
+        returned instead of the journaled data, and the journal body is not read.
+        """
         journal_id = self._journal_for_event(event_id)
-        journal = self._Journal.from_id(journal_id)
+        journal = self._Journal.from_id(journal_id, use_cache=True)
+        if apply_pending_updates:
+            date = journal.get_event_date(event_id)
+            update = self._JournalUpdate.get_updates_for_journal(journal_id).get(event_id)
+            if update is None:
+                pass
+            elif JournalUpdateAction.UPDATE == update.action:
+                return Event(event_id, date, update.data)
+            else:
+                raise FlashFloodEventNotFound(f"Event {event_id} was deleted")
         return journal.get_event(event_id)
 
     def _generate_presigned_url(self, journal_id: JournalID):
-        key = f"{self._blobs_pfx}/{journal_id.blob_id}"
-        return self.s3_client.generate_presigned_url(ClientMethod="get_object",
-                                                     Params=dict(Bucket=self.bucket.name, Key=key))
+        return self.storage.presigned_url(f"{self._blobs_pfx}/{journal_id.blob_id}")
 
+    def _generate_presigned_manifest_url(self, journal_id: JournalID):
+        return self.storage.presigned_url(self._Journal.key_for(journal_id))
+
+    @attributed
     def list_journals(self, from_date: datetime=None, to_date: datetime=None) -> typing.Iterator[JournalID]:
-        search_range = DateRange(from_date, to_date)
-        for journal_id in self._Journal.list():
+        yield from self._list_journals(DateRange(from_date, to_date))
+
+    def _list_journals(self, search_range: DateRange, list_from: JournalID=None) -> typing.Iterator[JournalID]:
+        for journal_id in self._Journal.list(list_from=list_from, search_range=search_range):
             journal_range = DateRange(journal_id.start_date, journal_id.end_date)
             if journal_range in search_range:
                 yield journal_id
             elif journal_id.start_date in search_range.future:
                 break
 
+    @attributed
     def list_event_streams(self,
                            from_date: datetime=None,
-                           to_date: datetime=None) -> typing.Iterator[typing.Mapping[str, typing.Any]]:
+                           to_date: datetime=None,
+                           include_events: bool=True) -> typing.Iterator[typing.Mapping[str, typing.Any]]:
+        """
+        List an event stream for each journal. If `include_events` is false, manifests are not downloaded, and event
+        streams are compact descriptors with a presigned `manifest_url` instead of events, and the stored size of the
+        journal blob, which is smaller than `size` if compressed, as `stored_size`. Either form may be passed to
+        `replay_event_stream`.
+        """
         for journal_id in self.list_journals(from_date, to_date):
-            event_stream = self._Journal.from_id(journal_id).manifest()
-            event_stream['stream_url'] = self._generate_presigned_url(journal_id)
+            if include_events:
+                yield self._event_stream(journal_id)
+            else:
+                yield self._compact_event_stream(journal_id)
+
+    def _compact_event_stream(self, journal_id: JournalID) -> typing.Dict[str, typing.Any]:
+        metadata = self.storage.metadata(self._Journal.key_for(journal_id))
+        if "journal_data_size" in metadata:
+            size = int(metadata['journal_data_size'])
+        else:
+            size = self._Journal.from_id(journal_id).size
+        return dict(journal_id=journal_id,
+                    from_date=datetime_to_timestamp(journal_id.start_date),
+                    to_date=datetime_to_timestamp(journal_id.end_date),
+                    size=size,
+                    stored_size=self.storage.size(f"{self._blobs_pfx}/{journal_id.blob_id}"),
+                    stream_url=self._generate_presigned_url(journal_id),
+                    manifest_url=self._generate_presigned_manifest_url(journal_id))
+
+    def _event_stream(self, journal_id: JournalID) -> typing.Dict[str, typing.Any]:
+        event_stream = self._Journal.from_id(journal_id).manifest()
+        event_stream['stream_url'] = self._generate_presigned_url(journal_id)
+        return event_stream
+
+    @attributed
+    def parallel_replay(self,
+                        from_date: datetime=None,
+                        to_date: datetime=None,
+                        number_of_processes: int=None,
+                        ordered: bool=False) -> typing.Iterator[Event]:
+        """
+        Replay journals in worker processes. See `parallel_replay_event_streams`.
+        """
+        event_streams = [event_stream for event_stream in self.list_event_streams(from_date, to_date)]
+        yield from parallel_replay_event_streams(event_streams, from_date, to_date, number_of_processes, ordered)
+
+    async def areplay(self,
+                      from_date: datetime=None,
+                      to_date: datetime=None,
+                      concurrency: int=4,
+                      queue_size: int=1000) -> typing.AsyncIterator[Event]:
+        """
+        Asynchronously replay events in order, reading up to `concurrency` journals ahead. Listing and manifest
+        requests run in the default executor, and journal data is streamed from presigned urls with one aiohttp
+        session.
+        """
+        loop = asyncio.get_running_loop()
+        journal_ids = await loop.run_in_executor(None,
+                                                 run_attributed,
+                                                 "areplay",
+                                                 lambda: list(self.list_journals(from_date, to_date)))
+
+        def _source(journal_id: JournalID) -> EventSource:
+            async def _events():
+                event_stream = await loop.run_in_executor(None,
+                                                          run_attributed,
+                                                          "areplay",
+                                                          self._event_stream,
+                                                          journal_id)
+                async for event in areplay_event_stream(event_stream, from_date, to_date, session):
+                    yield event
+            return _events
+
+        async with client_session() as session:
+            async for event in amerge([_source(journal_id) for journal_id in journal_ids],
+                                      concurrency,
+                                      ordered=True,
+                                      queue_size=queue_size):
+                yield event
+
+    @attributed
+    def plan_replay(self,
+                    from_date: datetime=None,
+                    to_date: datetime=None,
+                    n_shards: int=1,
+                    maximum_stream_size: int=None,
+                    number_of_workers: int=8) -> typing.List[typing.List[typing.Mapping[str, typing.Any]]]:
+        """
+        Plan a parallel replay of events in (from_date, to_date] as `n_shards` lists of event streams with roughly equal
+        byte counts. Journals larger than `maximum_stream_size` bytes, by default an even share, are split at event
+        boundaries into sub-streams covering byte ranges of the journal blob. Each sub-stream has a presigned url and
+        the Range header to fetch its bytes, and can be replayed with `replay_event_stream`.
+        """
+        search_range = DateRange(from_date, to_date)
+        journal_ids = [journal_id for journal_id in self._list_journals(search_range)]
+        with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+            futures = [submit(e, self._Journal.from_id, journal_id) for journal_id in journal_ids]
+            journals = [f.result() for f in futures]
+        spans = [(journal, journal.events.positions_in_range(search_range)) for journal in journals]
+        total_size = sum(journal.events.offsets[span[-1]] + journal.events.sizes[span[-1]]
+                         - journal.events.offsets[span[0]]
+                         for journal, span in spans if span)
+        maximum_stream_size = maximum_stream_size or max(1, -(-total_size // n_shards))
+        event_streams = [event_stream
+                         for journal, span in spans if span
+                         for event_stream in self._split_event_stream(journal, span, maximum_stream_size)]
+        # Assign the largest streams first, each to the least loaded shard
+        shards: typing.List[typing.List[typing.Mapping[str, typing.Any]]] = [list() for _ in range(n_shards)]
+        loads = [(0, i) for i in range(n_shards)]
+        for event_stream in sorted(event_streams, key=lambda es: es['size'], reverse=True):
+            load, i = heapq.heappop(loads)
+            shards[i].append(event_stream)
+            heapq.heappush(loads, (load + event_stream['size'], i))
+        for shard in shards:
+            shard.sort(key=lambda es: (es['journal_id'], es['first_event_index']))
+        return shards
+
+    def _split_event_stream(self,
+                            journal: BaseJournal,
+                            span: range,
+                            maximum_stream_size: int) -> typing.Iterator[typing.Mapping[str, typing.Any]]:
+        events = journal.events
+        stream_url = self._generate_presigned_url(journal.id_)
+        start = span[0]
+        while start < span.stop:
+            stop = start + 1
+            while (stop < span.stop
+                   and events.offsets[stop] + events.sizes[stop] - events.offsets[start] <= maximum_stream_size):
+                stop += 1
+            first_byte, end_byte = events.offsets[start], events.offsets[stop - 1] + events.sizes[stop - 1]
+            event_stream = dict(journal_id=journal.id_,
+                                from_date=events.timestamps[start],
+                                to_date=events.timestamps[stop - 1],
+                                size=end_byte - first_byte,
+                                first_event_index=start,
+                                events=events.slice(start, stop).to_list(),
+                                stream_url=stream_url)
+            if journal.blocks is not None:
+                event_stream['blocks'] = journal.blocks.to_dict()
+                first_byte, end_byte = journal.blocks.compressed_range(first_byte, end_byte)
+            event_stream['headers'] = dict(Range=f"bytes={first_byte}-{end_byte - 1}")
             yield event_stream
+            start = stop
+
+    @attributed
+    def migrate_layout(self, from_partition_format: str=None, number_of_workers: int=8) -> int:
+        """
+        Move journal manifests and update markers written with `from_partition_format`, or the flat layout if `None`,
+        into this FlashFlood's layout. Journals spanning partitions of the new layout are split into a journal per
+        partition, with their pending updates applied. Objects are written before the originals are deleted, and each
+        layout lists only its own keys, so readers of either layout see consistent listings. Writers should be stopped
+        while migrating. Return the number of journals and update markers migrated.
+        """
+        if layout_depth(from_partition_format) == layout_depth(self.partition_format):
+            raise ValueError("Cannot migrate between layouts with partition names of equal depth")
+        source = type(self)(None, None, self.root_prefix, storage=self.storage, partition_format=from_partition_format)
+        journals_to_split = list()
+        moves = list()
+        for journal_id in source._Journal.list():
+            if self._Journal.partition(journal_id.start_timestamp) != self._Journal.partition(
+                    datetime_to_timestamp(journal_id.end_date)):
+                journals_to_split.append(journal_id)
+            else:
+                moves.append((source._Journal.key_for(journal_id), self._Journal.key_for(journal_id)))
+        split = set(journals_to_split)
+        moves.extend((source._JournalUpdate(update_id).key, self._JournalUpdate(update_id).key)
+                     for update_id in source._JournalUpdate.list() if update_id.journal_id not in split)
+
+        def _move(src_key: str, dst_key: str):
+            self.storage.put(dst_key, self.storage.get(src_key), metadata=self.storage.metadata(src_key))
+
+        def _split(journal_id: JournalID):
+            journal = source._Journal.from_id(journal_id)
+            journal = journal.updated(source._JournalUpdate.get_updates_for_journal(journal_id))
+            events = journal.events
+            start = 0
+            for stop in range(1, 1 + len(events)):
+                if stop < len(events) and (self._Journal.partition(events.timestamps[stop])
+                                           == self._Journal.partition(events.timestamps[start])):
+                    continue
+                offset = events.offsets[start]
+                new_events = EventTable()
+                new_events.extend(events.slice(start, stop), -offset)
+                data = journal.read_range(offset, events.offsets[stop - 1] + events.sizes[stop - 1]).read()
+                new_journal = self._Journal(new_events, data=data)
+                new_journal.upload()
+                self._index_journal(new_journal)
+                start = stop
+
+        with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+            futures = [submit(e, _move, src_key, dst_key) for src_key, dst_key in moves]
+            futures.extend(submit(e, _split, journal_id) for journal_id in journals_to_split)
+            for f in as_completed(futures):
+                f.result()
+        # Tombstones and tombstoned objects of the source layout are removed with the originals
+        keys_to_delete = [item.key
+                          for pfx in (self._journal_pfx, self._update_pfx)
+                          for item in self.storage.list(f"{pfx}/")
+                          if item.key[len(pfx) + 1:].count("/") == layout_depth(from_partition_format)]
+        self.storage.delete(keys_to_delete)
+        logger.info("Migrated %d objects from layout %s to %s, splitting %d journals",
+                    len(moves) + len(journals_to_split), from_partition_format, self.partition_format,
+                    len(journals_to_split))
+        return len(moves) + len(journals_to_split)
+
+    @attributed
+    def verify_index(self,
+                     number_of_workers: int=8,
+                     chunk_size: int=1000000,
+                     progress: typing.Callable[[IndexProgress], None]=None,
+                     progress_interval: float=10.0,
+                     sample_size: int=100) -> IndexReport:
+        """
+        Compare the key index with the manifests of live journals, without changing it. See `reconcile_index`.
+        """
+        return reconcile_index(self._Journal, self._JournalUpdate, self._KeyIndex, False, number_of_workers, chunk_size,
+                               progress=progress, progress_interval=progress_interval, sample_size=sample_size)
+
+    @attributed
+    def rebuild_index(self,
+                      number_of_workers: int=8,
+                      chunk_size: int=1000000,
+                      progress: typing.Callable[[IndexProgress], None]=None,
+                      progress_interval: float=10.0,
+                      sample_size: int=100) -> IndexReport:
+        """
+        Repair the key index from the manifests of live journals, returning the differences found. Missing and stale
+        entries are written, and dangling and superseded entries deleted, in bulk. See `reconcile_index`.
+        """
+        return reconcile_index(self._Journal, self._JournalUpdate, self._KeyIndex, True, number_of_workers, chunk_size,
+                               progress=progress, progress_interval=progress_interval, sample_size=sample_size)
 
     def _destroy(self):
-        with S3Deleter(self.bucket) as s3d:
-            for item in self.bucket.objects.filter(Prefix=f"{self.root_prefix}/"):
-                s3d.delete(item.key)
+        self.storage.delete([item.key for item in self.storage.list(f"{self.root_prefix}/")])
+
+default_stream_reader = EventStreamReader()
+
+def replay_event_stream(event_stream: typing.Mapping[str, typing.Any],
+                        from_date: datetime=None,
+                        to_date: datetime=None,
+                        checkpoint: ReplayCheckpoint=None,
+                        stream_reader: EventStreamReader=None) -> typing.Iterator[Event]:
+    for event, _ in replay_event_stream_with_checkpoints(event_stream, from_date, to_date, checkpoint, stream_reader):
+        yield event
+
+def replay_event_stream_with_checkpoints(event_stream: typing.Mapping[str, typing.Any],
+                                         from_date: datetime=None,
+                                         to_date: datetime=None,
+                                         checkpoint: ReplayCheckpoint=None,
+                                         stream_reader: EventStreamReader=None
+                                         ) -> typing.Iterator[typing.Tuple[Event, ReplayCheckpoint]]:
+    """
+    Replay events from `event_stream`, pairing each event with the checkpoint following it. `event_stream` may be a
+    whole journal from `list_event_streams`, or a sub-stream from `plan_replay`.
+
+    Data are read with `stream_reader`, by default `default_stream_reader`, which pools connections across streams and
+    resumes dropped connections.
+
+    If `checkpoint` is for this event stream, replay resumes with a ranged request starting at the checkpoint offset.
+    Streams for journals listed after the checkpoint journal are replayed in full, and other streams are replayed from
+    the last consumed event date, skipping events the checkpoint records as consumed.
+    """
+    stream_reader = stream_reader or default_stream_reader
+    event_stream = load_event_stream(event_stream, stream_reader)
+    search_range: typing.Optional[DateRange] = DateRange(from_date, to_date)
+    events = EventTable(event_stream['events'])
+    first_event_index = event_stream.get('first_event_index', 0)
+    start_index = 0
+    if checkpoint is not None:
+        if checkpoint.journal_id == event_stream['journal_id']:
+            start_index = max(0, checkpoint.event_index - first_event_index)
+        elif checkpoint.journal_id > event_stream['journal_id']:
+            search_range = _resume_range(DateRange(from_date, to_date), checkpoint)
+    if search_range is None or not events:
+        return
+    end = events.offsets[-1] + events.sizes[-1]
+    read_range = _event_stream_read_range(event_stream, events, stream_reader)
+
+    def _read_range(offset: int) -> typing.BinaryIO:
+        return read_range(offset, end)
+
+    yield from _replay_events(event_stream['journal_id'],
+                              events,
+                              search_range,
+                              _read_range,
+                              start_index,
+                              first_event_index,
+                              previous=checkpoint)
+
+def load_event_stream(event_stream: typing.Mapping[str, typing.Any],
+                      stream_reader: EventStreamReader=None) -> typing.Mapping[str, typing.Any]:
+    """
+    Return `event_stream` with events, fetching the manifest of a compact event stream.
+    """
+    if "events" in event_stream:
+        return event_stream
+    resp = (stream_reader or default_stream_reader).get(event_stream['manifest_url'])
+    return {**event_stream, **resp.json()}
+
+def _event_stream_read_range(event_stream: typing.Mapping[str, typing.Any],
+                             events: EventTable,
+                             stream_reader: EventStreamReader) -> typing.Callable[[int, int], typing.BinaryIO]:
+    """
+    Return a function reading journal data [start, end) of `event_stream`, decompressing compressed blobs.
+    """
+    url = event_stream['stream_url']
+    if "blocks" in event_stream:
+        blocks = BlockIndex.from_dict(event_stream['blocks'])
+
+        def _fetch(start: int, end: int) -> typing.BinaryIO:
+            return stream_reader.read_range(url, start, end, blocks.offsets)  # type: ignore
+
+        return lambda start, end: DecompressedRange(blocks, start, end, _fetch)  # type: ignore
+    else:
+        return lambda start, end: stream_reader.read_range(url, start, end, events.offsets)  # type: ignore
+
+def parallel_replay_event_streams(event_streams: typing.Sequence[typing.Mapping[str, typing.Any]],
+                                  from_date: datetime=None,
+                                  to_date: datetime=None,
+                                  number_of_processes: int=None,
+                                  ordered: bool=False,
+                                  buffer_size: int=8 * 1024 * 1024,
+                                  poll_interval: float=1.0) -> typing.Iterator[Event]:
+    """
+    Replay `event_streams` in worker processes. Workers read event data in batches of about `buffer_size` bytes, and
+    pass each batch back through a shared memory segment. Workers are checked every `poll_interval` seconds while no
+    batches arrive, and FlashFloodException is raised if a worker dies.
+
+    Events are yielded as batches arrive, or, if `ordered` is true, merged by date across streams. Ordered replay
+    holds events of streams that are ahead in memory until the streams behind them catch up.
+    """
+    context = multiprocessing.get_context()
+    # Start the resource tracker before forking, so segments created by workers are tracked by a process that
+    # outlives them
+    resource_tracker.ensure_running()
+    tasks = context.Queue()
+    results = context.Queue()
+    for i in range(len(event_streams)):
+        tasks.put(i)
+    number_of_processes = min(number_of_processes or os.cpu_count() or 1, len(event_streams))
+    workers = [context.Process(target=_parallel_replay_worker,
+                               args=(event_streams, from_date, to_date, buffer_size, tasks, results),
+                               daemon=True)
+               for _ in range(number_of_processes)]
+    for _ in workers:
+        tasks.put(None)
+    for w in workers:
+        w.start()
+    pending: typing.Dict[int, typing.Deque[Event]] = {i: deque() for i in range(len(event_streams))}
+    done: typing.Set[int] = set()
 
-def replay_event_stream(event_stream: dict, from_date: datetime=None, to_date: datetime=None) -> typing.Iterator[Event]:
+    def _receive():
+        while True:
+            try:
+                message = results.get(timeout=poll_interval)
+                break
+            except queue.Empty:
+                # Workers that died, e.g. killed by a signal, never report their streams done
+                exitcodes = [w.exitcode for w in workers]
+                if all(code is not None for code in exitcodes) or any(code for code in exitcodes):
+                    try:
+                        message = results.get(timeout=poll_interval)
+                        break
+                    except queue.Empty:
+                        missing = sorted(set(range(len(event_streams))) - done)
+                        raise FlashFloodException(f"Replay workers exited with {exitcodes} before event streams "
+                                                  f"{missing} were replayed")
+        if "batch" == message[0]:
+            _, stream_index, shm_name, event_ids, timestamps, offsets, sizes = message
+            shm = shared_memory.SharedMemory(shm_name)
+            try:
+                batch = EventBatch(event_ids, timestamps, offsets, sizes, shm.buf)
+                pending[stream_index].extend(batch.events())
+                del batch
+            finally:
+                shm.close()
+                shm.unlink()
+        elif "done" == message[0]:
+            done.add(message[1])
+        else:
+            raise FlashFloodException(f"Replay of event stream {message[1]} failed: {message[2]}")
+
+    def _stream_events(stream_index: int) -> typing.Iterator[Event]:
+        while True:
+            while pending[stream_index]:
+                yield pending[stream_index].popleft()
+            if stream_index in done:
+                break
+            _receive()
+
+    try:
+        if ordered:
+            yield from heapq.merge(*[_stream_events(i) for i in range(len(event_streams))], key=lambda e: e.date)
+        else:
+            while len(done) < len(event_streams) or any(pending.values()):
+                for events in pending.values():
+                    while events:
+                        yield events.popleft()
+                if len(done) < len(event_streams):
+                    _receive()
+    finally:
+        for w in workers:
+            w.terminate()
+            w.join()
+        # Release segments of batches that were never received
+        while True:
+            try:
+                message = results.get_nowait()
+            except queue.Empty:
+                break
+            if "batch" == message[0]:
+                shm = shared_memory.SharedMemory(message[2])
+                shm.close()
+                shm.unlink()
+
+def _parallel_replay_worker(event_streams: typing.Sequence[typing.Mapping[str, typing.Any]],
+                            from_date: typing.Optional[datetime],
+                            to_date: typing.Optional[datetime],
+                            buffer_size: int,
+                            tasks: typing.Any,
+                            results: typing.Any):
     search_range = DateRange(from_date, to_date)
-    for event_info in event_stream['events']:
-        if datetime_from_timestamp(event_info['timestamp']) in search_range:
-            break
-    byte_range = f"bytes={event_info['offset']}-{event_stream['size']-1}"
-    resp = requests.get(event_stream['stream_url'], headers=dict(Range=byte_range), stream=True)
-    resp.raise_for_status()
-    for item in event_stream['events']:
-        event_date = datetime_from_timestamp(item['timestamp'])
-        if event_date in search_range:
-            yield Event(item['event_id'], event_date, resp.raw.read(item['size']))
-        elif event_date in search_range.future:
-            break
+    reader = EventBatchReader(buffer_size)
+    stream_reader = EventStreamReader(pool_size=1)
+    for stream_index in iter(tasks.get, None):
+        try:
+            event_stream = load_event_stream(event_streams[stream_index], stream_reader)
+            events = EventTable(event_stream['events'])
+            read_range = _event_stream_read_range(event_stream, events, stream_reader)
+            for batch in reader.read(events, search_range, read_range):
+                shm = shared_memory.SharedMemory(create=True, size=max(1, len(batch.data)))
+                assert shm.buf is not None
+                shm.buf[:len(batch.data)] = batch.data
+                results.put(("batch", stream_index, shm.name, batch.event_ids, batch.timestamps, batch.offsets,
+                             batch.sizes))
+                shm.close()
+        except Exception as ex:
+            results.put(("error", stream_index, repr(ex)))
+        else:
+            results.put(("done", stream_index))
+
+def _replay_events(journal_id: str,
+                   events: EventTable,
+                   search_range: DateRange,
+                   read_range: typing.Callable[[int], typing.BinaryIO],
+                   start_index: int=0,
+                   first_event_index: int=0,
+                   updates: typing.Mapping[str, BaseJournalUpdate]=None,
+                   previous: ReplayCheckpoint=None) -> typing.Iterator[typing.Tuple[Event, ReplayCheckpoint]]:
+    """
+    Yield events in `search_range`, starting at `start_index`, paired with the checkpoint following each event.
+    Journal data is read with `read_range(offset)` from the offset of the first event in range. `first_event_index` is
+    the position in the journal of `events[0]`. Events in `updates` are replaced with updated data, or skipped if
+    deleted. Events recorded as consumed by `previous`, the checkpoint replay follows, are skipped.
+    """
+    body: typing.BinaryIO = io.BytesIO()
+    position = None
+    try:
+        for event_index in range(start_index, len(events)):
+            timestamp = events.timestamps[event_index]
+            offset, size = events.offsets[event_index], events.sizes[event_index]
+            event_date = datetime_from_timestamp(timestamp)
+            if event_date in search_range:
+                if position != offset:
+                    body.close()
+                    body = read_range(offset)
+                data = body.read(size)
+                position = offset + size
+                event_id = events.event_ids[event_index]
+                consumed: typing.Tuple[str, ...] = (event_id,)
+                if previous is not None and timestamp == previous.timestamp:
+                    if event_id in previous.consumed:
+                        continue
+                    consumed = previous.consumed + consumed
+                update = updates.get(event_id) if updates else None
+                if update is None:
+                    pass
+                elif JournalUpdateAction.UPDATE == update.action:
+                    data = update.data
+                else:
+                    continue
+                previous = ReplayCheckpoint(journal_id, first_event_index + event_index + 1, position, timestamp,
+                                            consumed)
+                yield Event(event_id, event_date, data), previous
+            elif event_date in search_range.future:
+                break
+    finally:
+        body.close()
+
+def _chunked_read_range(journal: BaseJournal,
+                        number_of_connections: int,
+                        chunk_size: int=8 * 1024 * 1024) -> typing.Callable[[int], typing.BinaryIO]:
+    end = journal.events.offsets[-1] + journal.events.sizes[-1]
+
+    def _read_range(offset: int) -> typing.BinaryIO:
+        return ChunkedRange(journal.read_range,  # type: ignore
+                            journal.events.offsets,
+                            offset,
+                            end,
+                            chunk_size,
+                            number_of_connections)
+    return _read_range
+
+def _resume_range(search_range: DateRange, checkpoint: ReplayCheckpoint) -> typing.Optional[DateRange]:
+    """
+    Narrow `search_range` to dates from the last event consumed before `checkpoint`, inclusive, or return `None` if no
+    dates remain.
+    """
+    last_event_date = datetime_from_timestamp(checkpoint.timestamp)
+    if last_event_date > search_range.end:
+        return None
+    else:
+        return DateRange(max(search_range.start, last_event_date - timedelta(microseconds=1)), search_range.end)
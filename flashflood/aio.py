@@ -0,0 +1,238 @@
+import json
+import asyncio
+import typing
+import contextlib
+from datetime import datetime
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # type: ignore
+
+from flashflood.util import datetime_from_timestamp, DateRange
+from flashflood.objects import Event, EventTable
+from flashflood.compression import BlockIndex, codecs
+from flashflood.exceptions import FlashFloodException
+from flashflood.concurrency import get_controller, prefix_for_url
+
+
+EventSource = typing.Callable[[], typing.AsyncGenerator[Event, None]]
+
+
+def client_session(connect_timeout: float=30.0, read_timeout: float=60.0) -> "aiohttp.ClientSession":
+    """
+    Return an aiohttp session for asynchronous replay, with timeouts in seconds for connecting and for each read.
+    Proxies and CA bundles are configured from the environment. Requires the `aio` extra,
+    `pip install flash-flood[aio]`.
+    """
+    if aiohttp is None:
+        raise FlashFloodException("Asynchronous replay requires aiohttp: pip install flash-flood[aio]")
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+    return aiohttp.ClientSession(timeout=timeout, trust_env=True)
+
+async def areplay_event_stream(event_stream: typing.Mapping[str, typing.Any],
+                               from_date: datetime=None,
+                               to_date: datetime=None,
+                               session: "aiohttp.ClientSession"=None) -> typing.AsyncIterator[Event]:
+    """
+    Asynchronously replay events from `event_stream` with one ranged request, using `session`, or a session from
+    `client_session`. The response is released when replay finishes, fails, or is cancelled.
+    """
+    async with _session_or_new(session) as session:
+        event_stream = await aload_event_stream(event_stream, session)
+        search_range = DateRange(from_date, to_date)
+        events = EventTable(event_stream['events'])
+        in_range = events.positions_in_range(search_range)
+        if not in_range:
+            return
+        position = events.offsets[in_range[0]]
+        end = events.offsets[in_range[-1]] + events.sizes[in_range[-1]]
+        reader: typing.Any
+        if "blocks" in event_stream:
+            blocks = BlockIndex.from_dict(event_stream['blocks'])
+            resp = await _open_range(session, event_stream['stream_url'], *blocks.compressed_range(position, end))
+            reader = _DecompressingReader(resp.content, blocks, position, end)
+        else:
+            resp = await _open_range(session, event_stream['stream_url'], position, end)
+            reader = resp.content
+        try:
+            for i in in_range:
+                if position < events.offsets[i]:
+                    await reader.readexactly(events.offsets[i] - position)
+                data = await reader.readexactly(events.sizes[i])
+                position = events.offsets[i] + events.sizes[i]
+                event_date = datetime_from_timestamp(events.timestamps[i])
+                if event_date in search_range:
+                    yield Event(events.event_ids[i], event_date, data)
+        finally:
+            resp.release()
+
+async def aload_event_stream(event_stream: typing.Mapping[str, typing.Any],
+                             session: "aiohttp.ClientSession"=None) -> typing.Mapping[str, typing.Any]:
+    """
+    Return `event_stream` with events, fetching the manifest of a compact event stream.
+    """
+    if "events" in event_stream:
+        return event_stream
+    async with _session_or_new(session) as session:
+        resp = await _limited_request(session, event_stream['manifest_url'])
+        try:
+            if 200 != resp.status:
+                raise FlashFloodException(f"Unexpected status {resp.status} reading event stream manifest")
+            manifest = json.loads(await resp.read())
+        finally:
+            resp.release()
+    return {**event_stream, **manifest}
+
+async def areplay_event_streams(event_streams: typing.Iterable[typing.Mapping[str, typing.Any]],
+                                from_date: datetime=None,
+                                to_date: datetime=None,
+                                concurrency: int=8,
+                                ordered: bool=False,
+                                queue_size: int=1000,
+                                session: "aiohttp.ClientSession"=None) -> typing.AsyncIterator[Event]:
+    """
+    Asynchronously replay `event_streams`, reading at most `concurrency` streams at once with one session. See
+    `amerge`.
+    """
+    async with _session_or_new(session) as session:
+        def _source(event_stream):
+            return lambda: areplay_event_stream(event_stream, from_date, to_date, session)
+
+        async for event in amerge([_source(event_stream) for event_stream in event_streams],
+                                  concurrency,
+                                  ordered,
+                                  queue_size):
+            yield event
+
+async def amerge(sources: typing.Sequence[EventSource],
+                 concurrency: int=8,
+                 ordered: bool=False,
+                 queue_size: int=1000) -> typing.AsyncIterator[Event]:
+    """
+    Consume at most `concurrency` event sources at once. Sources are started in order, and events are yielded as they
+    arrive, or, if `ordered` is true, source by source.
+
+    Sources pause once `queue_size` of their events are waiting, so a slow consumer applies backpressure. Closing or
+    cancelling the merge cancels the sources.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    done = object()
+    shared_queue: asyncio.Queue = asyncio.Queue(queue_size)
+    queues = [asyncio.Queue(queue_size) if ordered else shared_queue for _ in sources]
+
+    async def _consume(source: EventSource, queue: asyncio.Queue):
+        async with semaphore:
+            events = source()
+            try:
+                async for event in events:
+                    await queue.put(event)
+            except Exception as ex:
+                await queue.put(ex)
+            finally:
+                await events.aclose()
+        await queue.put(done)
+
+    tasks = [asyncio.ensure_future(_consume(source, queue)) for source, queue in zip(sources, queues)]
+    try:
+        if ordered:
+            for queue in queues:
+                async for event in _drain(queue, done, 1):
+                    yield event
+        else:
+            async for event in _drain(shared_queue, done, len(tasks)):
+                yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _drain(queue: asyncio.Queue, done: object, number_of_sources: int) -> typing.AsyncIterator[Event]:
+    while number_of_sources:
+        item = await queue.get()
+        if item is done:
+            number_of_sources -= 1
+        elif isinstance(item, Exception):
+            raise item
+        else:
+            yield item
+
+class _DecompressingReader:
+    """
+    Read journal data [start, end) from a stream of the compressed blocks holding it.
+    """
+    def __init__(self, reader: "aiohttp.StreamReader", blocks: BlockIndex, start: int, end: int):
+        self.reader = reader
+        self.blocks = blocks
+        self.position = start
+        self._codec = codecs[blocks.codec]
+        self._block_indices = iter(blocks.blocks_for_range(start, end))
+        self._buffer = b""
+        self._buffer_start = start
+
+    async def readexactly(self, size: int) -> bytes:
+        parts = list()
+        while size:
+            if self.position >= self._buffer_start + len(self._buffer):
+                i = next(self._block_indices, None)
+                if i is None:
+                    raise FlashFloodException("Unexpected end of journal data")
+                compressed = await self.reader.readexactly(self.blocks.offsets[i + 1] - self.blocks.offsets[i])
+                self._buffer, self._buffer_start = self._codec.decompress(compressed), self.blocks.logical_offsets[i]
+            offset = self.position - self._buffer_start
+            data = self._buffer[offset:offset + size]
+            parts.append(data)
+            self.position += len(data)
+            size -= len(data)
+        return b"".join(parts)
+
+@contextlib.asynccontextmanager
+async def _session_or_new(session: "aiohttp.ClientSession"=None) -> typing.AsyncIterator["aiohttp.ClientSession"]:
+    if session is not None:
+        yield session
+    else:
+        async with client_session() as new_session:
+            yield new_session
+
+async def _open_range(session: "aiohttp.ClientSession",
+                      url: str,
+                      start: int,
+                      end: int) -> "aiohttp.ClientResponse":
+    """
+    Request bytes [start, end) of `url`, returning the response with its content positioned at `start`.
+    """
+    resp = await _limited_request(session, url, dict(Range=f"bytes={start}-{end - 1}"))
+    try:
+        if resp.status not in (200, 206):
+            raise FlashFloodException(f"Unexpected status {resp.status} reading event stream")
+        if 200 == resp.status:
+            # Range was ignored, and the full object is returned
+            await resp.content.readexactly(start)
+    except BaseException:
+        resp.release()
+        raise
+    return resp
+
+async def _limited_request(session: "aiohttp.ClientSession",
+                           url: str,
+                           headers: typing.Dict[str, str]=None) -> "aiohttp.ClientResponse":
+    """
+    GET `url` within the process wide concurrency limit of the S3 prefix it addresses, retrying throttled requests.
+    The response to the last attempt is returned.
+    """
+    controller = get_controller()
+    limit = controller.limit_for(prefix_for_url(url))
+    for attempt in range(controller.maximum_attempts):
+        epoch = await limit.aacquire()
+        throttled = False
+        try:
+            resp = await session.get(url, headers=headers)
+            throttled = resp.status in (429, 503)
+        finally:
+            limit.release(epoch, throttled)
+        if not throttled or attempt == controller.maximum_attempts - 1:
+            break
+        resp.release()
+        limit.record_retry()
+        await asyncio.sleep(controller.delay(attempt))
+    return resp
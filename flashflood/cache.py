@@ -0,0 +1,177 @@
+import os
+import mmap
+import typing
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class BlobCache:
+    """
+    Local cache of journal blob data, stored as files of `block_size` bytes keyed by blob id, block size and block
+    index, so caches with different block sizes may share a directory. Blobs are immutable, so cached blocks never go
+    stale. Files are written to a temporary name and renamed into place, so a crash never leaves a partial block. The
+    least recently used blocks are evicted beyond `capacity` bytes.
+    """
+    _TMP_PREFIX = ".tmp"
+
+    def __init__(self, path: str, capacity: int, block_size: int=1024 * 1024):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.capacity = capacity
+        self.block_size = block_size
+        self.size = 0
+        self._blocks: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        entries = list()
+        for entry in os.scandir(path):
+            if entry.name.startswith(self._TMP_PREFIX):
+                os.remove(entry.path)
+            else:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._blocks[name] = size
+            self.size += size
+        self._evict()
+
+    def read_range(self,
+                   blob_id: str,
+                   start: int,
+                   end: int,
+                   fetch: typing.Callable[[int, int], typing.BinaryIO]) -> "CachedRange":
+        """
+        Return a readable stream of bytes [start, end) of blob `blob_id`. Blocks missing from the cache are read with
+        `fetch(start, end)`, and cached.
+        """
+        return CachedRange(self, blob_id, start, end, fetch)
+
+    def _block_name(self, blob_id: str, block_index: int) -> str:
+        return f"{blob_id}.{self.block_size}.{block_index}"
+
+    def _get(self, blob_id: str, block_index: int) -> typing.Optional[mmap.mmap]:
+        name = self._block_name(blob_id, block_index)
+        with self._lock:
+            if name not in self._blocks:
+                return None
+            self._blocks.move_to_end(name)
+        try:
+            with open(os.path.join(self.path, name), "rb") as fh:
+                block = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            # Evicted by another cache sharing the directory
+            with self._lock:
+                self.size -= self._blocks.pop(name, 0)
+            return None
+        os.utime(os.path.join(self.path, name))
+        return block
+
+    def _put(self, blob_id: str, block_index: int, data: bytes):
+        name = self._block_name(blob_id, block_index)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=self._TMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, os.path.join(self.path, name))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.size += len(data) - self._blocks.pop(name, 0)
+            self._blocks[name] = len(data)
+        self._evict()
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self.size <= self.capacity or not self._blocks:
+                    return
+                name, size = self._blocks.popitem(last=False)
+                self.size -= size
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+
+class CachedRange:
+    """
+    Readable stream of bytes [start, end) of a blob, served from memory mapped cache blocks. Runs of missing blocks
+    are fetched with one ranged read, and cached as they are read.
+    """
+    def __init__(self,
+                 cache: BlobCache,
+                 blob_id: str,
+                 start: int,
+                 end: int,
+                 fetch: typing.Callable[[int, int], typing.BinaryIO]):
+        self.cache = cache
+        self.blob_id = blob_id
+        self.position = start
+        self.end = end
+        self._fetch = fetch
+        self._stream: typing.Optional[typing.BinaryIO] = None
+        self._block: typing.Optional[typing.Any] = None
+        self._block_index = -1
+
+    def read(self, size: int=-1) -> bytes:
+        if size < 0:
+            size = self.end - self.position
+        size = min(size, self.end - self.position)
+        parts = list()
+        while size:
+            block_index, block_offset = divmod(self.position, self.cache.block_size)
+            if block_index != self._block_index:
+                self._load_block(block_index)
+            assert self._block is not None
+            data = self._block[block_offset:block_offset + size]
+            if not data:
+                break
+            parts.append(data)
+            self.position += len(data)
+            size -= len(data)
+        return b"".join(parts)
+
+    def close(self):
+        self._close_stream()
+        self._release_block()
+
+    def _load_block(self, block_index: int):
+        self._release_block()
+        block: typing.Any = self.cache._get(self.blob_id, block_index)
+        if block is not None:
+            self._close_stream()
+        else:
+            block_size = self.cache.block_size
+            if self._stream is None:
+                # Fetch through the end of the block containing the last byte of the range
+                fetch_end = -(-self.end // block_size) * block_size
+                self._stream = self._fetch(block_index * block_size, fetch_end)
+            block = self._read_block(self._stream, block_size)
+            if block:
+                self.cache._put(self.blob_id, block_index, block)
+        self._block, self._block_index = block, block_index
+
+    @staticmethod
+    def _read_block(stream: typing.BinaryIO, block_size: int) -> bytes:
+        parts = list()
+        remaining = block_size
+        while remaining:
+            data = stream.read(remaining)
+            if not data:
+                break
+            parts.append(data)
+            remaining -= len(data)
+        return b"".join(parts)
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _release_block(self):
+        if isinstance(self._block, mmap.mmap):
+            self._block.close()
+        self._block, self._block_index = None, -1
@@ -0,0 +1,89 @@
+import os
+import json
+import typing
+import tempfile
+
+from flashflood.storage import BaseStorage, S3Storage
+from flashflood.exceptions import FlashFloodObjectNotFound
+
+
+class ReplayCheckpoint(typing.NamedTuple):
+    """
+    Replay position following the last consumed event. `event_index` and `offset` locate the next event in the journal
+    `journal_id`, and `timestamp` is the timestamp of the last consumed event. `consumed` lists the ids of consumed
+    events with that timestamp, which are skipped if replay resumes from that timestamp.
+    """
+    journal_id: str
+    event_index: int
+    offset: int
+    timestamp: str
+    consumed: typing.Tuple[str, ...] = ()
+
+    def to_json(self) -> str:
+        return json.dumps(self._asdict())
+
+    @classmethod
+    def from_json(cls, doc: str):
+        checkpoint = json.loads(doc)
+        checkpoint['consumed'] = tuple(checkpoint.get('consumed', ()))
+        return cls(**checkpoint)
+
+
+class BaseCheckpointStore:
+    """
+    Persist named checkpoints. Consumers sharing a name share a checkpoint.
+    """
+    def load(self, name: str) -> typing.Optional[ReplayCheckpoint]:
+        raise NotImplementedError()
+
+    def save(self, name: str, checkpoint: ReplayCheckpoint):
+        raise NotImplementedError()
+
+
+class LocalCheckpointStore(BaseCheckpointStore):
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def load(self, name: str) -> typing.Optional[ReplayCheckpoint]:
+        try:
+            with open(os.path.join(self.path, name)) as fh:
+                return ReplayCheckpoint.from_json(fh.read())
+        except FileNotFoundError:
+            return None
+
+    def save(self, name: str, checkpoint: ReplayCheckpoint):
+        # Write to a temporary file and rename, so a crash never leaves a partial checkpoint
+        fd, tmp_path = tempfile.mkstemp(dir=self.path)
+        try:
+            with os.fdopen(fd, "w") as fh:
+                fh.write(checkpoint.to_json())
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, os.path.join(self.path, name))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+class StorageCheckpointStore(BaseCheckpointStore):
+    def __init__(self, storage: BaseStorage, pfx: str):
+        self.storage = storage
+        self._pfx = pfx
+
+    def load(self, name: str) -> typing.Optional[ReplayCheckpoint]:
+        try:
+            doc = self.storage.get(f"{self._pfx}/{name}").decode("utf-8")
+        except FlashFloodObjectNotFound:
+            return None
+        return ReplayCheckpoint.from_json(doc)
+
+    def save(self, name: str, checkpoint: ReplayCheckpoint):
+        self.storage.put(f"{self._pfx}/{name}", checkpoint.to_json().encode("utf-8"))
+
+
+class S3CheckpointStore(StorageCheckpointStore):
+    def __init__(self, bucket: typing.Any, s3_client: typing.Any, pfx: str):
+        super().__init__(S3Storage(bucket, s3_client), pfx)
+        self.bucket = bucket
+        self.s3_client = s3_client
@@ -0,0 +1,179 @@
+import zlib
+import lzma
+import typing
+from bisect import bisect_right
+
+from flashflood.exceptions import FlashFloodException
+
+
+class BaseCodec:
+    name: typing.Optional[str] = None
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+
+class ZlibCodec(BaseCodec):
+    name = "zlib"
+
+    def __init__(self, level: int=6):
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class LzmaCodec(BaseCodec):
+    name = "lzma"
+
+    def __init__(self, preset: int=6):
+        self.preset = preset
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data, preset=self.preset)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
+
+
+codecs: typing.Dict[str, BaseCodec] = dict()
+
+def register_codec(codec: BaseCodec):
+    """
+    Make `codec` available for compressing and reading journals by name.
+    """
+    assert codec.name
+    codecs[codec.name] = codec
+
+register_codec(ZlibCodec())
+register_codec(LzmaCodec())
+
+
+class BlockIndex:
+    """
+    Layout of a blob compressed in independently decodable blocks. Block `i` holds journal data from
+    `logical_offsets[i]` up to `logical_offsets[i + 1]`, compressed into blob bytes from `offsets[i]` up to
+    `offsets[i + 1]`.
+    """
+    def __init__(self, codec: str, offsets: typing.List[int], logical_offsets: typing.List[int]):
+        if codec not in codecs:
+            raise ValueError(f"Unknown codec {codec}")
+        self.codec = codec
+        self.offsets = offsets
+        self.logical_offsets = logical_offsets
+
+    def to_dict(self) -> dict:
+        return dict(codec=self.codec, offsets=self.offsets, logical_offsets=self.logical_offsets)
+
+    @classmethod
+    def from_dict(cls, doc: typing.Mapping[str, typing.Any]):
+        return cls(doc['codec'], doc['offsets'], doc['logical_offsets'])
+
+    def blocks_for_range(self, start: int, end: int) -> range:
+        """
+        Return the indices of blocks holding journal data [start, end).
+        """
+        if end <= start:
+            return range(0)
+        first = bisect_right(self.logical_offsets, start) - 1
+        last = bisect_right(self.logical_offsets, end - 1) - 1
+        return range(max(first, 0), min(last + 1, len(self.offsets) - 1))
+
+    def compressed_range(self, start: int, end: int) -> typing.Tuple[int, int]:
+        """
+        Return the blob byte range [start, end) holding the blocks of journal data [start, end).
+        """
+        blocks = self.blocks_for_range(start, end)
+        return self.offsets[blocks.start], self.offsets[blocks.stop]
+
+
+def compress_blocks(data: bytes,
+                    boundaries: typing.Sequence[int],
+                    codec: str,
+                    block_size: int=1024 * 1024) -> typing.Tuple[bytes, BlockIndex]:
+    """
+    Compress `data` into blocks of at least `block_size` bytes of data, cut at `boundaries`, the event offsets, so
+    that events are never split across blocks unless larger than a block.
+    """
+    compressor = codecs[codec]
+    cuts = [0]
+    for boundary in boundaries:
+        if boundary - cuts[-1] >= block_size:
+            cuts.append(boundary)
+    if len(data) > cuts[-1]:
+        cuts.append(len(data))
+    parts = list()
+    offsets = [0]
+    for start, end in zip(cuts[:-1], cuts[1:]):
+        parts.append(compressor.compress(data[start:end]))
+        offsets.append(offsets[-1] + len(parts[-1]))
+    return b"".join(parts), BlockIndex(codec, offsets, cuts)
+
+
+class DecompressedRange:
+    """
+    Readable stream of journal data [start, end) from a block compressed blob. The blocks holding the range are read
+    with one call to `fetch(blob_start, blob_end)`, and decompressed one at a time.
+    """
+    def __init__(self,
+                 blocks: BlockIndex,
+                 start: int,
+                 end: int,
+                 fetch: typing.Callable[[int, int], typing.BinaryIO]):
+        self.blocks = blocks
+        self.position = start
+        self.end = end
+        self._fetch = fetch
+        self._codec = codecs[blocks.codec]
+        self._block_indices = iter(blocks.blocks_for_range(start, end))
+        self._stream: typing.Optional[typing.BinaryIO] = None
+        self._buffer = b""
+        self._buffer_start = 0
+
+    def read(self, size: int=-1) -> bytes:
+        if size < 0:
+            size = self.end - self.position
+        size = min(size, self.end - self.position)
+        parts = list()
+        while size:
+            if self.position >= self._buffer_start + len(self._buffer) and not self._next_block():
+                break
+            offset = self.position - self._buffer_start
+            data = self._buffer[offset:offset + size]
+            parts.append(data)
+            self.position += len(data)
+            size -= len(data)
+        return b"".join(parts)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _next_block(self) -> bool:
+        i = next(self._block_indices, None)
+        if i is None:
+            return False
+        if self._stream is None:
+            self._stream = self._fetch(*self.blocks.compressed_range(self.position, self.end))
+        compressed_size = self.blocks.offsets[i + 1] - self.blocks.offsets[i]
+        compressed = _read_exactly(self._stream, compressed_size)
+        self._buffer, self._buffer_start = self._codec.decompress(compressed), self.blocks.logical_offsets[i]
+        return True
+
+
+def _read_exactly(stream: typing.BinaryIO, size: int) -> bytes:
+    parts = list()
+    while size:
+        data = stream.read(size)
+        if not data:
+            raise FlashFloodException("Unexpected end of journal data")
+        parts.append(data)
+        size -= len(data)
+    return b"".join(parts)
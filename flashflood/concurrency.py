@@ -0,0 +1,235 @@
+import time
+import random
+import asyncio
+import typing
+import logging
+import threading
+from contextlib import contextmanager, suppress
+from urllib.parse import urlsplit, unquote
+
+import requests
+from botocore.exceptions import ClientError, WaiterError
+
+
+logger = logging.getLogger(__name__)
+
+THROTTLING_ERROR_CODES = {"SlowDown", "ServiceUnavailable", "503", "Throttling", "ThrottlingException",
+                          "RequestLimitExceeded", "TooManyRequests", "RequestThrottled"}
+
+
+def is_throttling_error(e: BaseException) -> bool:
+    if isinstance(e, (ClientError, WaiterError)):
+        # Waiters raise WaiterError, not ClientError, for the error response of their last attempt
+        response = e.response if isinstance(e, ClientError) else e.last_response or dict()
+        if response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+            return True
+        return response.get('ResponseMetadata', {}).get('HTTPStatusCode') in (429, 503)
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return e.response.status_code in (429, 503)
+    return False
+
+
+def partition_prefix(bucket: str, key: str, depth: int=2) -> str:
+    """
+    Return the prefix used to group requests for `key`: the bucket name and the first `depth` components of the key.
+    S3 request rate limits apply per prefix.
+    """
+    return "/".join([bucket] + key.split("/")[:depth])
+
+
+def prefix_for_url(url: str, depth: int=2) -> str:
+    """
+    Return the prefix used to group requests for `url`, e.g. a presigned url, as `partition_prefix` does for the bucket
+    and key it addresses. Virtual hosted and path style urls are recognised.
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    path = unquote(parts.path.lstrip("/"))
+    if ".s3." in host or ".s3-" in host:
+        bucket, key = host.split(".s3", 1)[0], path
+    else:
+        bucket, _, key = path.partition("/")
+    return partition_prefix(bucket, key, depth)
+
+
+class AdaptiveLimit:
+    """
+    Limit concurrent requests with additive increase, multiplicative decrease. Each successful request raises the
+    limit by `increase / limit`, about `increase` per round of requests. A throttled request multiplies the limit by
+    `decrease`, at most once per round: throttles of requests started before the last decrease are ignored.
+    """
+    def __init__(self, initial: float=8, minimum: float=1, maximum: float=64, increase: float=1, decrease: float=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self._epoch = 0
+        self._condition = threading.Condition()
+        self._async_waiters: typing.List[typing.Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = list()
+
+    def acquire(self) -> int:
+        """
+        Wait for a request slot, returning the epoch to pass to `release`.
+        """
+        with self._condition:
+            while self.in_flight >= max(int(self.limit), 1):
+                self._condition.wait()
+            self.in_flight += 1
+            self.requests += 1
+            return self._epoch
+
+    def try_acquire(self) -> typing.Optional[int]:
+        """
+        Take a request slot if one is free, returning the epoch to pass to `release`, or `None`.
+        """
+        with self._condition:
+            if self.in_flight >= max(int(self.limit), 1):
+                return None
+            self.in_flight += 1
+            self.requests += 1
+            return self._epoch
+
+    async def aacquire(self) -> int:
+        """
+        Wait for a request slot without blocking the event loop, returning the epoch to pass to `release`.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                epoch = self.try_acquire()
+                if epoch is not None:
+                    return epoch
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, epoch: int, throttled: bool=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                if epoch == self._epoch:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._epoch += 1
+            else:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self._condition.notify_all()
+            # Requests may be released from any thread, so waiting coroutines are woken on their own loops
+            for loop, waiter in self._async_waiters:
+                with suppress(RuntimeError):  # The waiting loop was closed
+                    loop.call_soon_threadsafe(_wake, waiter)
+            self._async_waiters.clear()
+
+    def record_retry(self):
+        with self._condition:
+            self.retries += 1
+
+    def metrics(self) -> dict:
+        with self._condition:
+            return dict(limit=self.limit, in_flight=self.in_flight, requests=self.requests, throttled=self.throttled,
+                        retries=self.retries)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ConcurrencyController:
+    """
+    Process wide gate for S3 requests, holding an `AdaptiveLimit` per prefix. Throttled requests are retried up to
+    `maximum_attempts` times with full jitter exponential backoff, starting at `base_delay` seconds.
+    """
+    def __init__(self,
+                 initial_limit: float=8,
+                 minimum_limit: float=1,
+                 maximum_limit: float=64,
+                 maximum_attempts: int=8,
+                 base_delay: float=0.05,
+                 maximum_delay: float=5.0):
+        self.initial_limit = initial_limit
+        self.minimum_limit = minimum_limit
+        self.maximum_limit = maximum_limit
+        self.maximum_attempts = maximum_attempts
+        self.base_delay = base_delay
+        self.maximum_delay = maximum_delay
+        self._limits: typing.Dict[str, AdaptiveLimit] = dict()
+        self._lock = threading.Lock()
+
+    def limit_for(self, prefix: str) -> AdaptiveLimit:
+        with self._lock:
+            limit = self._limits.get(prefix)
+            if limit is None:
+                limit = self._limits[prefix] = AdaptiveLimit(self.initial_limit,
+                                                             self.minimum_limit,
+                                                             self.maximum_limit)
+            return limit
+
+    @contextmanager
+    def limited(self, prefix: str) -> typing.Iterator[None]:
+        """
+        Hold a request slot for `prefix` during the context, without retrying. Throttling errors raised in the
+        context lower the limit.
+        """
+        limit = self.limit_for(prefix)
+        epoch = limit.acquire()
+        throttled = False
+        try:
+            yield
+        except Exception as e:
+            throttled = is_throttling_error(e)
+            raise
+        finally:
+            limit.release(epoch, throttled)
+
+    def call(self, prefix: str, fn: typing.Callable, *args, **kwargs):
+        """
+        Call `fn` within the concurrency limit for `prefix`, retrying throttled calls.
+        """
+        for attempt in range(self.maximum_attempts):
+            try:
+                with self.limited(prefix):
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_throttling_error(e) or attempt == self.maximum_attempts - 1:
+                    raise
+                self.limit_for(prefix).record_retry()
+                delay = self.delay(attempt)
+                logger.debug("Throttled on %s, retrying in %.3fs", prefix, delay)
+                time.sleep(delay)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Return a full jitter delay before retrying after `attempt`, counting from 0.
+        """
+        return random.uniform(0, min(self.maximum_delay, self.base_delay * 2 ** attempt))
+
+    def metrics(self) -> typing.Dict[str, dict]:
+        """
+        Return the current limit, in flight requests, and cumulative request, throttle and retry counts per prefix.
+        """
+        with self._lock:
+            limits = dict(self._limits)
+        return {prefix: limit.metrics() for prefix, limit in sorted(limits.items())}
+
+    def reset(self):
+        with self._lock:
+            self._limits.clear()
+
+
+_controller = ConcurrencyController()
+
+def set_controller(controller: ConcurrencyController):
+    """
+    Replace the process wide controller.
+    """
+    global _controller
+    _controller = controller
+
+def get_controller() -> ConcurrencyController:
+    return _controller
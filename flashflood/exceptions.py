@@ -12,3 +12,6 @@ class FlashFloodEventNotFound(FlashFloodException):
 
 class FlashFloodJournalUploadError(FlashFloodException):
     pass
+
+class FlashFloodObjectNotFound(FlashFloodException):
+    pass
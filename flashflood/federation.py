@@ -0,0 +1,133 @@
+import queue
+import heapq
+import typing
+import hashlib
+import threading
+from uuid import uuid4
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from flashflood.metrics import submit
+from flashflood.exceptions import FlashFloodEventNotFound
+
+if typing.TYPE_CHECKING:
+    from flashflood import FlashFlood, Event  # noqa
+
+
+def shard_by_event_id(event_id: str, number_of_members: int) -> int:
+    """
+    Return a member index from a stable hash of `event_id`.
+    """
+    return int(hashlib.sha256(event_id.encode("utf-8")).hexdigest()[:16], 16) % number_of_members
+
+
+class Federation:
+    """
+    Spread events across member FlashFloods, e.g. in separate buckets or prefixes, so write throughput scales with the
+    number of members. `put` writes to the member at index `shard(event_id, data)`, by default chosen by a stable hash
+    of the event id. Event ids should be unique across members.
+
+    `get_event` probes members concurrently. `replay` and `list_event_streams` merge members by date, reading up to
+    `queue_size` items ahead from each member concurrently. Output is ordered by date if each member's is.
+    """
+    def __init__(self,
+                 members: typing.Sequence["FlashFlood"],
+                 shard: typing.Callable[[str, bytes], int]=None,
+                 queue_size: int=1000):
+        if not members:
+            raise ValueError("A federation needs at least one member")
+        self.members = list(members)
+        self.shard = shard if shard is not None else self._shard_by_event_id
+        self.queue_size = queue_size
+
+    def _shard_by_event_id(self, event_id: str, data: bytes) -> int:
+        return shard_by_event_id(event_id, len(self.members))
+
+    def put(self, data: bytes, event_id: str=None, date: datetime=None) -> "Event":
+        event_id = event_id or str(uuid4())
+        member_index = self.shard(event_id, data)
+        if not 0 <= member_index < len(self.members):
+            raise ValueError(f"Shard {member_index} out of range for {len(self.members)} members")
+        return self.members[member_index].put(data, event_id, date)
+
+    def event_exists(self, event_id: str) -> bool:
+        return any(self._probe(lambda member: member.event_exists(event_id)))
+
+    def get_event(self, event_id: str) -> "Event":
+        """
+        Probe every member for `event_id` concurrently, returning the event from the first member holding it.
+        """
+        def _get_event(member: "FlashFlood") -> typing.Optional["Event"]:
+            try:
+                return member.get_event(event_id)
+            except FlashFloodEventNotFound:
+                return None
+
+        for event in self._probe(_get_event):
+            if event is not None:
+                return event
+        raise FlashFloodEventNotFound(f"Event {event_id} not found")
+
+    def _probe(self, fn: typing.Callable) -> typing.List[typing.Any]:
+        with ThreadPoolExecutor(max_workers=len(self.members)) as e:
+            futures = [submit(e, fn, member) for member in self.members]
+            return [f.result() for f in futures]
+
+    def replay(self, from_date: datetime=None, to_date: datetime=None) -> typing.Iterator["Event"]:
+        yield from self._merge([member.replay(from_date, to_date) for member in self.members],
+                               key=lambda event: event.date)
+
+    def list_event_streams(self,
+                           from_date: datetime=None,
+                           to_date: datetime=None,
+                           include_events: bool=True) -> typing.Iterator[typing.Mapping[str, typing.Any]]:
+        yield from self._merge([member.list_event_streams(from_date, to_date, include_events)
+                                for member in self.members],
+                               key=lambda event_stream: event_stream['from_date'])
+
+    def _merge(self, iterators: typing.List[typing.Iterator], key: typing.Callable) -> typing.Iterator:
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=len(iterators)) as e:
+            try:
+                yield from heapq.merge(*[self._read_ahead(e, it, stop) for it in iterators], key=key)
+            finally:
+                stop.set()
+
+    def _read_ahead(self,
+                    executor: ThreadPoolExecutor,
+                    items: typing.Iterator,
+                    stop: threading.Event) -> typing.Iterator:
+        """
+        Yield from `items`, which are read in a worker thread into a queue, until `stop` is set.
+        """
+        q: queue.Queue = queue.Queue(self.queue_size)
+
+        def _put(message: tuple) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(message, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def _produce():
+            try:
+                for item in items:
+                    if not _put(("item", item)):
+                        return
+                _put(("done", None))
+            except Exception as ex:
+                _put(("error", ex))
+            finally:
+                items.close()  # type: ignore
+
+        submit(executor, _produce)
+        while True:
+            kind, value = q.get()
+            if "item" == kind:
+                yield value
+            elif "error" == kind:
+                raise value
+            else:
+                return
@@ -29,9 +29,13 @@ class JournalID(str):
         start_timestamp, end_timestamp, version, blob_id = self.split(self.DELIMITER)
         return start_timestamp, end_timestamp, version, blob_id
 
+    @property
+    def start_timestamp(self) -> str:
+        return self._parts()[0]
+
     @property
     def start_date(self):
-        return datetime_from_timestamp(self._parts()[0])
+        return datetime_from_timestamp(self.start_timestamp)
 
     @property
     def end_date(self):
@@ -96,3 +100,47 @@ class JournalUpdateID(str):
     @staticmethod
     def prefix_for_journal(journal_id: JournalID):
         return journal_id[::-1]
+
+
+class JournalLeaseID(str):
+    """
+    This defines the id used to compose the object key on storage for journal leases. A lease covers the
+    lexicographic range of journal ids [first_journal_id, last_journal_id] until it expires.
+    """
+    DELIMITER = "--"
+
+    @classmethod
+    def make(cls, first_journal_id: str, last_journal_id: str, expiration_timestamp: str, owner: str):
+        return cls(expiration_timestamp + cls.DELIMITER
+                   + owner + cls.DELIMITER
+                   + first_journal_id + cls.DELIMITER
+                   + last_journal_id)
+
+    @classmethod
+    def from_key(cls, key):
+        return cls(key.rsplit("/", 1)[1])
+
+    @lru_cache()
+    def _parts(self):
+        parts = self.split(self.DELIMITER)
+        expiration_timestamp, owner = parts[:2]
+        number_of_journal_id_parts = (len(parts) - 2) // 2
+        first_journal_id = JournalID(self.DELIMITER.join(parts[2:2 + number_of_journal_id_parts]))
+        last_journal_id = JournalID(self.DELIMITER.join(parts[2 + number_of_journal_id_parts:]))
+        return expiration_timestamp, owner, first_journal_id, last_journal_id
+
+    @property
+    def expiration_date(self):
+        return datetime_from_timestamp(self._parts()[0])
+
+    @property
+    def owner(self) -> str:
+        return self._parts()[1]
+
+    @property
+    def first_journal_id(self) -> JournalID:
+        return self._parts()[2]
+
+    @property
+    def last_journal_id(self) -> JournalID:
+        return self._parts()[3]
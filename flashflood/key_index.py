@@ -1,63 +1,121 @@
-import io
+import re
 import typing
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
 
-from flashflood.util import delete_keys
+from flashflood.util import timestamp_now
+from flashflood.metrics import submit
+from flashflood.tracing import span
+from flashflood.storage import BaseStorage, S3Storage
+
+class IndexEntry(typing.NamedTuple):
+    key: str
+    lookup: str
+    revision: str
+    target: typing.Optional[str]
 
 class BaseKeyIndex:
     """
     Build a simple key value index using s3 keys. Updates are modeled as writes to avoid S3 eventual consistency for
     overwrites.
 
-    Concurrent writes are not supported.
+    Concurrent writes are supported. Each revision is written to a unique key composed of the lookup, a timestamped
+    revision, and the target. The revision sorting last wins, and revisions sorting before it are deleted once it is
+    written.
     """
     DELIMITER: str = "--"
+    storage: typing.Optional[BaseStorage] = None
     bucket: typing.Any = None
     _pfx: typing.Optional[str] = None
 
     @classmethod
-    def put(cls, lookup: str, target: str):
-        keys = cls._put(lookup, target)
-        delete_keys(cls.bucket, keys)
+    def _storage(cls) -> BaseStorage:
+        return cls.storage if cls.storage is not None else S3Storage(cls.bucket)
 
     @classmethod
-    def put_batch(cls, lookup_map: dict):
-        keys_to_delete = list()
-        for lookup, target in lookup_map.items():
+    def put(cls, lookup: str, target: str):
+        with span("flashflood.index.put", lookup=lookup):
             keys = cls._put(lookup, target)
-            keys_to_delete.extend(keys)
-        delete_keys(cls.bucket, keys_to_delete)
+            cls._storage().delete(keys)
+
+    @classmethod
+    def put_batch(cls, lookup_map: dict, number_of_workers: int=4):
+        with span("flashflood.index.put_batch", number_of_lookups=len(lookup_map)):
+            with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+                futures = [submit(e, cls._put, lookup, target) for lookup, target in lookup_map.items()]
+                keys_to_delete = [key for f in futures for key in f.result()]
+            cls._storage().delete(keys_to_delete)
 
     @classmethod
     def _put(cls, lookup: str, target: str) -> list:
-        keys = cls._lookup_keys(lookup)
-        if keys:
-            revision_number = cls._revision_number_for_key(keys[-1]) + 1
-        else:
-            revision_number = 1
-        revision = "%010i" % revision_number
-        key = f"{cls._pfx}/{lookup}" + cls.DELIMITER + revision
-        cls.bucket.Object(key).upload_fileobj(io.BytesIO(b""),
-                                              ExtraArgs=dict(Metadata=dict(target=target)))
-        return keys
+        """
+        Write a new revision for `lookup`, returning the keys of the revisions it supersedes.
+        """
+        key = cls._write(lookup, target)
+        # Revisions sorting after ours were written by a concurrent writer, and win.
+        return [k for k in cls._lookup_keys(lookup) if k < key]
+
+    @classmethod
+    def _write(cls, lookup: str, target: str, timestamp: str=None) -> str:
+        """
+        Write a revision for `lookup` dated `timestamp`, by default now, returning its key.
+        """
+        if cls.DELIMITER in lookup:
+            raise ValueError(f"'{cls.DELIMITER}' not allowed in lookup")
+        revision = f"{timestamp or timestamp_now()}.{uuid4().hex}"
+        key = f"{cls._pfx}/{lookup}" + cls.DELIMITER + revision + cls.DELIMITER + target
+        cls._storage().put(key, metadata=dict(target=target))
+        return key
 
     @classmethod
     def delete(cls, lookup: str):
-        keys = cls._lookup_keys(lookup)
-        if keys:
-            delete_keys(cls.bucket, keys)
+        with span("flashflood.index.delete", lookup=lookup):
+            keys = cls._lookup_keys(lookup)
+            if keys:
+                cls._storage().delete(keys)
 
     @classmethod
     def get(cls, lookup: str):
-        keys = cls._lookup_keys(lookup)
-        if keys:
-            return cls.bucket.Object(keys[-1]).metadata['target']
-        else:
-            return None
+        with span("flashflood.index.get", lookup=lookup):
+            keys = cls._lookup_keys(lookup)
+            if keys:
+                return cls._target_for_key(keys[-1])
+            else:
+                return None
+
+    @classmethod
+    def list_entries(cls) -> typing.Iterator[typing.List[IndexEntry]]:
+        """
+        List the revisions of every lookup, grouped by lookup in key order. Revisions of a lookup are in order, the
+        last winning. Targets of revisions written before targets were stored in keys are `None`.
+        """
+        revisions: typing.List[IndexEntry] = list()
+        for item in cls._storage().list(f"{cls._pfx}/"):
+            entry = cls._parse_key(item.key)
+            if revisions and revisions[-1].lookup != entry.lookup:
+                yield revisions
+                revisions = list()
+            revisions.append(entry)
+        if revisions:
+            yield revisions
 
     @classmethod
     def _lookup_keys(cls, lookup: str):
-        return [item.key for item in cls.bucket.objects.filter(Prefix=f"{cls._pfx}/{lookup}")]
+        # The listing prefix of "abc" also matches revisions of lookups such as "abc-"
+        return [item.key for item in cls._storage().list(f"{cls._pfx}/{lookup}{cls.DELIMITER}")
+                if cls._parse_key(item.key).lookup == lookup]
+
+    @classmethod
+    def _parse_key(cls, key: str) -> IndexEntry:
+        # Lookups may end with "-", so the lookup ends at the first delimiter not followed by "-". Revisions never
+        # start with "-".
+        lookup, revision, *target = re.split(f"{cls.DELIMITER}(?!-)", key[len(f"{cls._pfx}/"):], 2)
+        return IndexEntry(key, lookup, revision, target[0] if target else None)
 
     @classmethod
-    def _revision_number_for_key(cls, key: str) -> int:
-        return int(key.rsplit(cls.DELIMITER, 1)[1])
+    def _target_for_key(cls, key: str) -> str:
+        target = cls._parse_key(key).target
+        if target is None:
+            # Revisions written before targets were stored in keys
+            target = cls._storage().metadata(key)['target']
+        return target
@@ -0,0 +1,81 @@
+import typing
+from uuid import uuid4
+from datetime import datetime, timedelta
+
+from flashflood.util import datetime_to_timestamp, timestamp_now
+from flashflood.storage import BaseStorage, S3Storage
+from flashflood.identifiers import JournalID, JournalLeaseID
+
+
+class BaseJournalLease:
+    """
+    Claim a range of journal ids so that several workers can journal concurrently. A worker writes a lease object, then
+    lists live leases. The claim succeeds only if no other live lease overlaps it. On contention each claimant releases
+    its own lease and backs off, so at most one worker holds any journal.
+
+    This relies on read-after-write consistency for new objects, and on lease durations long compared to clock skew
+    between workers.
+    """
+    storage: typing.Optional[BaseStorage] = None
+    bucket: typing.Any = None
+    s3_client: typing.Any = None
+    _pfx: typing.Optional[str] = None
+
+    def __init__(self, lease_id: JournalLeaseID):
+        self.id_ = lease_id
+        assert self.storage or self.s3_client
+        assert self._pfx
+
+    @classmethod
+    def _storage(cls) -> BaseStorage:
+        return cls.storage if cls.storage is not None else S3Storage(cls.bucket, cls.s3_client)
+
+    @classmethod
+    def from_key(cls, key: str):
+        return cls(JournalLeaseID.from_key(key))
+
+    @classmethod
+    def acquire(cls, journal_ids: typing.Sequence[JournalID], duration: int) -> typing.Optional["BaseJournalLease"]:
+        """
+        Attempt to lease `journal_ids` for `duration` seconds. Return the lease if acquired, otherwise `None`.
+        """
+        expiration_date = datetime.utcnow() + timedelta(seconds=duration)
+        lease_id = JournalLeaseID.make(min(journal_ids),
+                                       max(journal_ids),
+                                       datetime_to_timestamp(expiration_date),
+                                       str(uuid4()))
+        lease = cls(lease_id)
+        cls._storage().put(lease.key, tagging=dict(garbage="true"))
+        for other in cls.list():
+            if other.id_ != lease.id_ and other.overlaps(lease):
+                lease.release()
+                return None
+        return lease
+
+    @classmethod
+    def list(cls) -> typing.Iterator["BaseJournalLease"]:
+        """
+        List leases that have not expired. Lease keys sort by expiration date, so expired leases are skipped by the
+        listing marker.
+        """
+        marker = f"{cls._pfx}/{timestamp_now()}"
+        for item in cls._storage().list(f"{cls._pfx}/", marker):
+            yield cls.from_key(item.key)
+
+    @property
+    def key(self) -> str:
+        return f"{self._pfx}/{self.id_}"
+
+    @property
+    def is_expired(self) -> bool:
+        return self.id_.expiration_date <= datetime.utcnow()
+
+    def covers(self, journal_id: JournalID) -> bool:
+        return self.id_.first_journal_id <= journal_id <= self.id_.last_journal_id
+
+    def overlaps(self, other: "BaseJournalLease") -> bool:
+        return (self.id_.first_journal_id <= other.id_.last_journal_id
+                and other.id_.first_journal_id <= self.id_.last_journal_id)
+
+    def release(self):
+        self._storage().delete([self.key])
@@ -0,0 +1,156 @@
+import typing
+import inspect
+import functools
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNATTRIBUTED = "unattributed"
+
+_method: contextvars.ContextVar[typing.Optional[str]] = contextvars.ContextVar("flashflood_method", default=None)
+
+
+class OperationStats:
+    """
+    Request count, bytes transferred, and latency histogram for one operation type. `histogram[i]` counts requests
+    taking at most `LATENCY_BUCKETS[i]` seconds, and the last entry counts slower requests.
+    """
+    __slots__ = ("count", "bytes", "seconds", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, number_of_bytes: int, seconds: float):
+        self.count += 1
+        self.bytes += number_of_bytes
+        self.seconds += seconds
+        self.histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def to_dict(self) -> dict:
+        return dict(count=self.count, bytes=self.bytes, seconds=self.seconds, histogram=list(self.histogram))
+
+
+class RequestStats:
+    """
+    Thread safe accounting of storage requests by operation type (LIST, GET, HEAD, PUT, TAGGING, DELETE), attributed
+    to the public FlashFlood method that caused them.
+    """
+    def __init__(self):
+        self._operations: typing.Dict[typing.Tuple[str, str], OperationStats] = dict()
+        self._listeners: typing.List["RequestStats"] = list()
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, number_of_bytes: int=0, seconds: float=0.0):
+        method = _method.get() or UNATTRIBUTED
+        with self._lock:
+            stats = self._operations.get((method, operation))
+            if stats is None:
+                stats = self._operations[(method, operation)] = OperationStats()
+            stats.add(number_of_bytes, seconds)
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener.record(operation, number_of_bytes, seconds)
+
+    @contextmanager
+    def measure(self) -> typing.Iterator["RequestStats"]:
+        """
+        Collect requests recorded during the context into a new `RequestStats`. Requests from every thread are
+        collected.
+        """
+        measurement = type(self)()
+        with self._lock:
+            self._listeners.append(measurement)
+        try:
+            yield measurement
+        finally:
+            with self._lock:
+                self._listeners.remove(measurement)
+
+    def _select(self, operation: str=None, method: str=None) -> typing.List[OperationStats]:
+        with self._lock:
+            return [stats for (m, o), stats in self._operations.items()
+                    if (operation is None or o == operation) and (method is None or m == method)]
+
+    def requests(self, operation: str=None, method: str=None) -> int:
+        return sum(stats.count for stats in self._select(operation, method))
+
+    def bytes_transferred(self, operation: str=None, method: str=None) -> int:
+        return sum(stats.bytes for stats in self._select(operation, method))
+
+    def histogram(self, operation: str=None, method: str=None) -> typing.List[int]:
+        return [sum(counts) for counts in zip(*[stats.histogram for stats in self._select(operation, method)])]
+
+    def to_dict(self) -> typing.Dict[str, typing.Dict[str, dict]]:
+        """
+        Return stats keyed by method, then operation.
+        """
+        doc: typing.Dict[str, typing.Dict[str, dict]] = dict()
+        with self._lock:
+            for (method, operation), stats in sorted(self._operations.items()):
+                doc.setdefault(method, dict())[operation] = stats.to_dict()
+        return doc
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+
+@contextmanager
+def attribute(method: str):
+    """
+    Attribute requests in this context to `method`, unless already attributed to an enclosing method.
+    """
+    token = _method.set(method) if _method.get() is None else None
+    try:
+        yield
+    finally:
+        if token is not None:
+            _method.reset(token)
+
+
+def attributed(func):
+    """
+    Decorate a public method, attributing the requests it causes to it. Generators are attributed while they run.
+    """
+    name = func.__name__
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            gen = func(*args, **kwargs)
+            try:
+                while True:
+                    with attribute(name):
+                        try:
+                            item = next(gen)
+                        except StopIteration as e:
+                            return e.value
+                    yield item
+            finally:
+                gen.close()
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with attribute(name):
+                return func(*args, **kwargs)
+    return wrapper
+
+
+def run_attributed(method: str, fn: typing.Callable, *args):
+    """
+    Call `fn`, attributing its requests to `method`. Useful for executors that do not carry context into workers.
+    """
+    with attribute(method):
+        return fn(*args)
+
+
+def submit(executor: typing.Any, fn: typing.Callable, *args, **kwargs):
+    """
+    Submit `fn` to `executor`, carrying request attribution into the worker thread.
+    """
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
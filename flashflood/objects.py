@@ -1,16 +1,49 @@
 import io
+import sys
+import itertools
 import json
+import logging
 import typing
+from array import array
 from datetime import datetime
 from uuid import uuid4
 from string import hexdigits
 from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flashflood.util import (datetime_from_timestamp, datetime_to_timestamp, timestamp_now, DateRange, LRUCache,
+                             date_partitions, concurrent_map)
+from flashflood.cache import BlobCache
+from flashflood.storage import BaseStorage, S3Storage, StoredObject
+from flashflood.tracing import span
+from flashflood.metrics import submit
+from flashflood.compression import BlockIndex, DecompressedRange, compress_blocks
+from flashflood.exceptions import (FlashFloodException, FlashFloodEventNotFound, FlashFloodJournalUploadError,
+                                   FlashFloodObjectNotFound)
+from flashflood.identifiers import JournalID, JournalUpdateID, JournalUpdateAction, TOMBSTONE_SUFFIX
 
-from botocore.exceptions import ClientError
 
-from flashflood.util import datetime_from_timestamp, timestamp_now, S3Deleter, upload_object, update_object_tagging
-from flashflood.exceptions import FlashFloodException, FlashFloodEventNotFound, FlashFloodJournalUploadError
-from flashflood.identifiers import JournalID, JournalUpdateID, JournalUpdateAction, TOMBSTONE_SUFFIX
+logger = logging.getLogger(__name__)
+
+
+def partition_for_journal(partition_format: str, journal_id: str) -> str:
+    """
+    Return the date partition of `journal_id`, named by formatting its start date with `partition_format`.
+    `journal_id` may be any prefix of a journal id containing the start timestamp.
+    """
+    start_timestamp = journal_id.split(JournalID.DELIMITER, 1)[0]
+    return datetime_from_timestamp(start_timestamp).strftime(partition_format)
+
+
+def layout_depth(partition_format: typing.Optional[str]) -> int:
+    """
+    Return the number of key components in partition names for `partition_format`, zero for the flat layout.
+    """
+    return 0 if partition_format is None else 1 + partition_format.count("/")
+
+
+def _in_layout(pfx: str, key: str, partition_format: typing.Optional[str]) -> bool:
+    return key[len(pfx) + 1:].count("/") == layout_depth(partition_format)
 
 
 class Event(typing.NamedTuple):
@@ -19,17 +52,195 @@ class Event(typing.NamedTuple):
     data: bytes
 
 
+class EventTable:
+    """
+    Columnar journal manifest, holding event ids, timestamps, offsets and sizes in parallel columns instead of one dict
+    per event. Indexing and iteration produce event dicts as found in manifest documents.
+    """
+    __slots__ = ("event_ids", "timestamps", "offsets", "sizes", "_positions")
+
+    def __init__(self, events: typing.Iterable[typing.Mapping[str, typing.Any]]=None):
+        self.event_ids: typing.List[str] = list()
+        self.timestamps: typing.List[str] = list()
+        self.offsets = array("q")
+        self.sizes = array("q")
+        self._positions: typing.Optional[typing.Dict[str, int]] = None
+        for e in events or ():
+            self.append(e['event_id'], e['timestamp'], e['offset'], e['size'])
+
+    def append(self, event_id: str, timestamp: str, offset: int, size: int):
+        self.event_ids.append(sys.intern(event_id))
+        self.timestamps.append(timestamp)
+        self.offsets.append(offset)
+        self.sizes.append(size)
+        self._positions = None
+
+    def extend(self, other: "EventTable", offset: int=0):
+        """
+        Append events from `other`, shifting their offsets by `offset`.
+        """
+        self.event_ids.extend(other.event_ids)
+        self.timestamps.extend(other.timestamps)
+        self.offsets.extend(o + offset for o in other.offsets)
+        self.sizes.extend(other.sizes)
+        self._positions = None
+
+    def slice(self, start: int, stop: int) -> "EventTable":
+        table = EventTable()
+        table.event_ids = self.event_ids[start:stop]
+        table.timestamps = self.timestamps[start:stop]
+        table.offsets = self.offsets[start:stop]
+        table.sizes = self.sizes[start:stop]
+        return table
+
+    def positions_in_range(self, search_range: DateRange) -> range:
+        """
+        Return the positions from the first to the last event in `search_range`, comparing timestamps as strings.
+        """
+        from_timestamp = None if datetime.min == search_range.start else datetime_to_timestamp(search_range.start)
+        to_timestamp = None if datetime.max == search_range.end else datetime_to_timestamp(search_range.end)
+        in_range = [i for i, timestamp in enumerate(self.timestamps)
+                    if (from_timestamp is None or from_timestamp < timestamp)
+                    and (to_timestamp is None or timestamp <= to_timestamp)]
+        if in_range:
+            return range(in_range[0], in_range[-1] + 1)
+        else:
+            return range(0)
+
+    def position(self, event_id: str) -> typing.Optional[int]:
+        """
+        Return the position of `event_id`, or `None` if absent. The lookup table is built on first use.
+        """
+        if self._positions is None:
+            self._positions = {event_id: i for i, event_id in enumerate(self.event_ids)}
+        return self._positions.get(event_id)
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def __getitem__(self, i: int) -> dict:
+        return dict(event_id=self.event_ids[i],
+                    timestamp=self.timestamps[i],
+                    offset=self.offsets[i],
+                    size=self.sizes[i])
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self) -> typing.List[dict]:
+        return [e for e in self]
+
+
+class EventBatch:
+    """
+    Events read together from a journal. Event data are views into a buffer that is reused by later batches, and should
+    be copied if needed beyond the current batch.
+    """
+    __slots__ = ("event_ids", "timestamps", "offsets", "sizes", "data")
+
+    def __init__(self,
+                 event_ids: typing.List[str],
+                 timestamps: typing.List[str],
+                 offsets: array,
+                 sizes: array,
+                 data: memoryview):
+        self.event_ids = event_ids
+        self.timestamps = timestamps
+        self.offsets = offsets
+        self.sizes = sizes
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.event_ids)
+
+    def __getitem__(self, i: int) -> memoryview:
+        return self.data[self.offsets[i]:self.offsets[i] + self.sizes[i]]
+
+    def events(self) -> typing.Iterator[Event]:
+        for i, event_id in enumerate(self.event_ids):
+            yield Event(event_id, datetime_from_timestamp(self.timestamps[i]), bytes(self[i]))
+
+
+class EventBatchReader:
+    """
+    Read events in batches into a reusable buffer, with one large read per batch instead of one read per event.
+    """
+    def __init__(self, buffer_size: int=8 * 1024 * 1024):
+        self._buffer = bytearray(buffer_size)
+
+    def read(self,
+             events: EventTable,
+             search_range: DateRange,
+             read_range: typing.Callable[[int, int], typing.BinaryIO]) -> typing.Iterator[EventBatch]:
+        """
+        Read batches of `events` in `search_range`, where `read_range(start, end)` returns a stream of journal data.
+        Event timestamps are compared as strings, without parsing.
+        """
+        in_range = events.positions_in_range(search_range)
+        if not in_range:
+            return
+        offsets, sizes = events.offsets, events.sizes
+        first, last = in_range[0], in_range[-1]
+        start, end = offsets[first], offsets[last] + sizes[last]
+        stream = read_range(start, end)
+        buffer_start, filled = start, 0  # journal offset of buffer[0], and number of bytes in buffer
+        i = first
+        while i <= last:
+            if offsets[i] + sizes[i] - buffer_start > len(self._buffer):
+                # Allocate a new buffer so views from earlier batches stay valid
+                buffer = bytearray(offsets[i] + sizes[i] - buffer_start)
+                buffer[:filled] = self._buffer[:filled]
+                self._buffer = buffer
+            view = memoryview(self._buffer)
+            filled += self._fill(stream, view[filled:], end - buffer_start - filled)
+            j = i
+            while j <= last and offsets[j] + sizes[j] - buffer_start <= filled:
+                j += 1
+            if j == i:
+                raise FlashFloodException("Unexpected end of journal data")
+            batch_offsets = array("q", [o - buffer_start for o in offsets[i:j]])
+            consumed = batch_offsets[-1] + sizes[j - 1]
+            yield EventBatch(events.event_ids[i:j], events.timestamps[i:j], batch_offsets, sizes[i:j], view[:consumed])
+            self._buffer[:filled - consumed] = self._buffer[consumed:filled]
+            buffer_start += consumed
+            filled -= consumed
+            i = j
+
+    @staticmethod
+    def _fill(stream: typing.BinaryIO, view: memoryview, number_of_bytes: int) -> int:
+        view = view[:number_of_bytes]
+        filled = 0
+        while filled < len(view):
+            if hasattr(stream, "readinto"):
+                count = stream.readinto(view[filled:])
+            else:
+                data = stream.read(len(view) - filled)
+                count = len(data)
+                view[filled:filled + count] = data
+            if not count:
+                break
+            filled += count
+        return filled
+
+
 class BaseJournalUpdate:
+    storage: typing.Optional[BaseStorage] = None
     bucket: typing.Any = None
     s3_client: typing.Any = None
     _pfx: typing.Optional[str] = None
+    partition_format: typing.Optional[str] = None
 
     def __init__(self, update_id: JournalUpdateID):
         self.id_ = update_id
         self._data: typing.Optional[bytes] = None
-        assert self.s3_client
+        assert self.storage or self.s3_client
         assert self._pfx
 
+    @classmethod
+    def _storage(cls) -> BaseStorage:
+        return cls.storage if cls.storage is not None else S3Storage(cls.bucket, cls.s3_client)
+
     @classmethod
     def make(cls, journal_id: JournalID, event_id: str, action: JournalUpdateAction):
         id_ = JournalUpdateID.make(journal_id, event_id, action)
@@ -49,9 +260,20 @@ class BaseJournalUpdate:
         id_ = JournalUpdateID.make(journal_id, event_id, JournalUpdateAction.DELETE)
         return cls(id_)._upload(b"")
 
+    @classmethod
+    def _prefix_for_journal(cls, journal_id: JournalID) -> str:
+        if cls.partition_format is None:
+            return f"{cls._pfx}"
+        return f"{cls._pfx}/{partition_for_journal(cls.partition_format, journal_id)}"
+
+    @property
+    def key(self) -> str:
+        return f"{self._prefix_for_journal(self.journal_id)}/{self.id_}"
+
     def _upload(self, data: bytes):
-        key = f"{self._pfx}/{self.id_}"
-        upload_object(self.s3_client, self.bucket.name, key, data)
+        key = self.key
+        with span("flashflood.update.upload", key=key, size=len(data)):
+            self._storage().put(key, data)
 
     @property
     def journal_id(self) -> JournalID:
@@ -68,13 +290,12 @@ class BaseJournalUpdate:
     @property
     def data(self) -> bytes:
         if not self._data:
-            key = f"{self._pfx}/{self.id_}"
+            key = self.key
             try:
-                self._data = self.bucket.Object(key).get()['Body'].read()
-            except ClientError as ex:
-                if ex.response['Error']['Code'] == "NoSuchKey":
-                    raise FlashFloodException(f"JournalUpdate not found for key {key}")
-                raise
+                with span("flashflood.update.fetch", key=key):
+                    self._data = self._storage().get(key)
+            except FlashFloodObjectNotFound:
+                raise FlashFloodException(f"JournalUpdate not found for key {key}")
         if self._data is None:
             raise FlashFloodException(f"Update {self.id_} has no data!")
         else:
@@ -84,16 +305,32 @@ class BaseJournalUpdate:
         """
         Mark journal update as deleted by uploading a tombstone.
         """
-        key = f"{self._pfx}/{self.id_}"
+        key = self.key
+        storage = self._storage()
         try:
-            next(iter(self.bucket.objects.filter(Prefix=key)))
+            next(iter(storage.list(key)))
         except StopIteration:
             raise FlashFloodException(f"Cannot delete non-existent object {key}")
         tombstone_id = JournalUpdateID(f"{self.id_}{TOMBSTONE_SUFFIX}")
-        upload_object(self.s3_client, self.bucket.name, f"{self._pfx}/{tombstone_id}", tagging=dict(garbage="true"))
-        update_object_tagging(self.s3_client, self.bucket.name, key, dict(garbage="true"))
+        storage.put(f"{key}{TOMBSTONE_SUFFIX}", tagging=dict(garbage="true"))
+        storage.update_tagging(key, dict(garbage="true"))
         return tombstone_id
 
+    @classmethod
+    def upload_tombstones(cls, updates: typing.Iterable["BaseJournalUpdate"], number_of_workers: int=8):
+        """
+        Tombstone listed journal updates concurrently, without checking that each exists.
+        """
+        storage = cls._storage()
+
+        def _tombstone(update: BaseJournalUpdate):
+            storage.put(f"{update.key}{TOMBSTONE_SUFFIX}", tagging=dict(garbage="true"))
+            storage.update_tagging(update.key, dict(garbage="true"))
+
+        with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+            for f in as_completed([submit(e, _tombstone, update) for update in updates]):
+                f.result()
+
     @classmethod
     def list_out_of_date_journals(cls) -> typing.Iterator[JournalID]:
         prev_journal_id = str()
@@ -103,34 +340,40 @@ class BaseJournalUpdate:
             prev_journal_id = update_id.journal_id
 
     @classmethod
-    def get_updates_for_all_journals(cls) -> typing.Iterator[typing.Tuple[JournalID, typing.Mapping[str, typing.Any]]]:
+    def get_updates_for_all_journals(cls) -> typing.Iterator[typing.Tuple[JournalID, "JournalUpdates"]]:
         curr_journal_id = JournalID()
-        updates: typing.Dict[str, typing.Any] = dict()
+        updates = JournalUpdates()
         for id_ in cls.list():
             if curr_journal_id != id_.journal_id:
                 if updates:
                     yield curr_journal_id, updates
                 curr_journal_id = id_.journal_id
-                updates = {id_.event_id: cls(id_)}
-            else:
-                updates[id_.event_id] = cls(id_)
+                updates = JournalUpdates()
+            updates.add(cls(id_))
         if updates:
             yield curr_journal_id, updates
 
     @classmethod
-    def get_updates_for_journal(cls, journal_id: JournalID) -> dict:
-        update_id_pfx = JournalUpdateID.prefix_for_journal(journal_id)
-        updates = dict()
-        for id_ in cls.list(update_id_pfx):
-            update = cls(id_)
-            updates[update.event_id] = update
+    def get_updates_for_journal(cls, journal_id: JournalID) -> "JournalUpdates":
+        updates = JournalUpdates()
+        for id_ in cls.list(journal_id):
+            updates.add(cls(id_))
         return updates
 
     @classmethod
-    def list(cls, update_id_pfx="") -> typing.Iterator[JournalUpdateID]:
+    def list(cls, journal_id: JournalID=None) -> typing.Iterator[JournalUpdateID]:
+        """
+        List live update markers, for `journal_id` if provided.
+        """
+        if journal_id is None:
+            pfx = f"{cls._pfx}/"
+        else:
+            pfx = f"{cls._prefix_for_journal(journal_id)}/{JournalUpdateID.prefix_for_journal(journal_id)}"
         prev_key = None
         key = None
-        for item in cls.bucket.objects.filter(Prefix=f"{cls._pfx}/{update_id_pfx}"):
+        for item in cls._storage().list(pfx):
+            if not _in_layout(f"{cls._pfx}", item.key, cls.partition_format):
+                continue
             key = item.key
             if prev_key:
                 if not key.endswith(TOMBSTONE_SUFFIX):
@@ -141,44 +384,116 @@ class BaseJournalUpdate:
             yield JournalUpdateID.from_key(key)
 
 
+class JournalUpdates(dict):
+    """
+    The winning update for each event id. The last writer wins, by update timestamp, and deletes win ties. Markers
+    of losing updates are kept in `superseded`, so they can be tombstoned with the winners without fetching their data.
+    """
+    def __init__(self) -> None:
+        super().__init__()
+        self.superseded: typing.List[BaseJournalUpdate] = list()
+
+    @staticmethod
+    def _precedence(update: BaseJournalUpdate) -> typing.Tuple[str, bool]:
+        return update.id_.timestamp, JournalUpdateAction.DELETE == update.action
+
+    def add(self, update: BaseJournalUpdate):
+        current = self.get(update.event_id)
+        if current is None:
+            self[update.event_id] = update
+        elif self._precedence(current) < self._precedence(update):
+            self.superseded.append(current)
+            self[update.event_id] = update
+        else:
+            self.superseded.append(update)
+
+    def markers(self) -> typing.List[BaseJournalUpdate]:
+        """
+        Return every update marker, winning and superseded.
+        """
+        return list(self.values()) + self.superseded
+
+
 class BaseJournal:
+    storage: typing.Optional[BaseStorage] = None
     bucket: typing.Any = None
     s3_client: typing.Any = None
     _journal_pfx: typing.Optional[str] = None
     _blobs_pfx: typing.Optional[str] = None
-
-    def __init__(self, events: list=None, blob_id: str=None, data: bytes=None, version: str=None):
-        self.events = events or list()
+    manifest_cache: typing.Optional[LRUCache] = None
+    blob_cache: typing.Optional[BlobCache] = None
+    codec: typing.Optional[str] = None
+    compression_block_size: int = 1024 * 1024
+    partition_format: typing.Optional[str] = None
+    number_of_listing_workers: int = 8
+
+    def __init__(self,
+                 events: typing.Union[EventTable, typing.List[dict]]=None,
+                 blob_id: str=None,
+                 data: bytes=None,
+                 version: str=None):
+        self.events = events if isinstance(events, EventTable) else EventTable(events)
         self.blob_id = blob_id or str(uuid4())
         self.data = data or b""
         self._body: typing.Optional[typing.BinaryIO] = None
         self._location = "memory"
         self.version = version or timestamp_now()
-        assert self.s3_client
+        self.blocks: typing.Optional[BlockIndex] = None
+        assert self.storage or self.s3_client
         assert self._journal_pfx
         assert self._blobs_pfx
 
     @classmethod
-    def from_key(cls, key: str):
+    def _storage(cls) -> BaseStorage:
+        return cls.storage if cls.storage is not None else S3Storage(cls.bucket, cls.s3_client)
+
+    @classmethod
+    def from_key(cls, key: str, use_cache: bool=False):
+        """
+        Load the journal manifest at `key`. Manifests are immutable, so with `use_cache` they are served from, and added
+        to, `manifest_cache`.
+        """
         id_ = JournalID.from_key(key)
         blob_id = id_.blob_id
-        try:
-            manifest = json.loads(cls.bucket.Object(key).get()['Body'].read().decode("utf-8"))
-        except ClientError as ex:
-            if ex.response['Error']['Code'] == "NoSuchKey":
-                raise FlashFloodException(f"Journal not found for key {key}")
-            else:
-                raise
-        except json.decoder.JSONDecodeError:
-            print("Unable to decode manifest document from key:", key)
-            raise
-        journal = cls(manifest['events'], blob_id, version=id_.version)
+        cached = cls.manifest_cache.get(key) if use_cache and cls.manifest_cache is not None else None
+        if cached is None:
+            with span("flashflood.manifest.fetch", key=key) as s:
+                try:
+                    manifest = json.loads(cls._storage().get(key).decode("utf-8"))
+                except FlashFloodObjectNotFound:
+                    raise FlashFloodException(f"Journal not found for key {key}")
+                except json.decoder.JSONDecodeError:
+                    logger.error("Unable to decode manifest document from key %s", key, extra=dict(key=key))
+                    raise
+                blocks = BlockIndex.from_dict(manifest['blocks']) if "blocks" in manifest else None
+                cached = (EventTable(manifest['events']), blocks)
+                s.set_attribute("number_of_events", len(cached[0]))
+            if use_cache and cls.manifest_cache is not None:
+                cls.manifest_cache.put(key, cached)
+        events, blocks = cached
+        journal = cls(events, blob_id, version=id_.version)
+        journal.blocks = blocks
         journal._location = "cloud"
         return journal
 
     @classmethod
-    def from_id(cls, journal_id: JournalID):
-        return cls.from_key(f"{cls._journal_pfx}/{journal_id}")
+    def from_id(cls, journal_id: JournalID, use_cache: bool=False):
+        return cls.from_key(cls.key_for(journal_id), use_cache)
+
+    @classmethod
+    def partition(cls, journal_id: str) -> typing.Optional[str]:
+        """
+        Return the date partition of `journal_id`, or `None` for the flat layout.
+        """
+        if cls.partition_format is None:
+            return None
+        return partition_for_journal(cls.partition_format, journal_id)
+
+    @classmethod
+    def key_for(cls, journal_id: str) -> str:
+        if cls.partition_format is None:
+            return f"{cls._journal_pfx}/{journal_id}"
+        return f"{cls._journal_pfx}/{cls.partition(journal_id)}/{journal_id}"
 
     @property
     def body(self) -> typing.BinaryIO:
@@ -186,12 +501,38 @@ class BaseJournal:
             if "memory" == self._location:
                 self._body = io.BytesIO(self.data)
             elif "cloud" == self._location:
-                key = f"{self._blobs_pfx}/{self.blob_id}"
-                self._body = self.bucket.Object(key).get()['Body']
+                if self.blob_cache is None and self.blocks is None:
+                    self._body = self._get_range(0)
+                else:
+                    self._body = self.read_range(0, self.size)
             else:
                 raise ValueError(f"Unknown data location {self._location}")
         return self._body
 
+    def read_range(self, start: int, end: int=None) -> typing.BinaryIO:
+        """
+        Return a readable stream of journal data from byte `start` up to, but not including, byte `end`.
+        """
+        if "memory" == self._location:
+            return io.BytesIO(self.data[start:end])
+        elif "cloud" == self._location:
+            end = self.size if end is None else end
+            fetch = self._get_range if self.blob_cache is None else self._get_cached_range
+            if self.blocks is None:
+                return fetch(start, end)
+            else:
+                return DecompressedRange(self.blocks, start, end, fetch)  # type: ignore
+        else:
+            raise ValueError(f"Unknown data location {self._location}")
+
+    def _get_range(self, start: int, end: int=None) -> typing.BinaryIO:
+        with span("flashflood.blob.read", blob_id=self.blob_id, start=start, end=end):
+            return self._storage().get_range(f"{self._blobs_pfx}/{self.blob_id}", start, end)
+
+    def _get_cached_range(self, start: int, end: int) -> typing.BinaryIO:
+        assert self.blob_cache is not None
+        return self.blob_cache.read_range(self.blob_id, start, end, self._get_range)  # type: ignore
+
     def reload(self):
         self._body = None
 
@@ -204,8 +545,8 @@ class BaseJournal:
         if self.is_empty:
             raise FlashFloodException("Cannot generate id for empty journal")
         else:
-            from_timestamp = self.events[0]['timestamp']
-            to_timestamp = self.events[-1]['timestamp']
+            from_timestamp = self.events.timestamps[0]
+            to_timestamp = self.events.timestamps[-1]
             return JournalID.make(from_timestamp, to_timestamp, self.version, self.blob_id)
 
     @property
@@ -213,63 +554,82 @@ class BaseJournal:
         if "memory" == self._location:
             return len(self.data)
         elif "cloud" == self._location:
-            return sum(e['size'] for e in self.events)
+            return sum(self.events.sizes)
         else:
             raise ValueError(f"Unknown data location {self._location}")
 
     def manifest(self) -> dict:
-        return dict(journal_id=self.id_,
-                    from_date=self.events[0]['timestamp'],
-                    to_date=self.events[-1]['timestamp'],
-                    size=self.size,
-                    events=self.events)
+        manifest = dict(journal_id=self.id_,
+                        from_date=self.events.timestamps[0],
+                        to_date=self.events.timestamps[-1],
+                        size=self.size,
+                        events=self.events.to_list())
+        if self.blocks is not None:
+            manifest['blocks'] = self.blocks.to_dict()
+        return manifest
+
+    def _position(self, event_id: str) -> int:
+        i = self.events.position(event_id)
+        if i is None:
+            raise FlashFloodEventNotFound(f"Event {event_id} not found in journal {self.id_}")
+        return i
+
+    def get_event_date(self, event_id: str) -> datetime:
+        """
+        Return the date of `event_id` from the manifest, without reading the journal body.
+        """
+        return datetime_from_timestamp(self.events.timestamps[self._position(event_id)])
 
     def get_event(self, event_id: str) -> Event:
-        for e in self.events:
-            if e['event_id'] == event_id:
-                blob_key = f"{self._blobs_pfx}/{self.blob_id}"
-                byte_range = f"bytes={e['offset']}-{e['offset'] + e['size'] - 1}"
-                data = self.bucket.Object(blob_key).get(Range=byte_range)['Body'].read()
-                return Event(event_id, datetime_from_timestamp(e['timestamp']), data)
-        raise FlashFloodEventNotFound(f"Event {event_id} not found in journal {self.id_}")
+        i = self._position(event_id)
+        offset, size = self.events.offsets[i], self.events.sizes[i]
+        data = self.read_range(offset, offset + size).read()
+        return Event(event_id, datetime_from_timestamp(self.events.timestamps[i]), data)
 
     def updated(self, updates: typing.Mapping[str, BaseJournalUpdate]):
         if not updates:
             return self
         else:
             self.reload()
-            new_journal_data = b""
-            new_events = list()
-            for e in self.events:
-                event_data = self.body.read(e['size'])
-                e['offset'] = len(new_journal_data)
-                update = updates.get(e['event_id'], None)
+            new_journal_data: typing.List[bytes] = list()
+            new_events = EventTable()
+            offset = 0
+            for i, event_id in enumerate(self.events.event_ids):
+                event_data = self.body.read(self.events.sizes[i])
+                update = updates.get(event_id, None)
                 if update is None:
-                    new_journal_data += event_data
-                    new_events.append(e)
+                    pass
                 elif JournalUpdateAction.UPDATE == update.action:
-                    new_journal_data += update.data
-                    e['size'] = len(update.data)
-                    new_events.append(e)
+                    event_data = update.data
                 elif JournalUpdateAction.DELETE == update.action:
-                    pass
+                    continue
                 else:
                     raise Exception("No handler for journal update {update}")
-            return type(self)(new_events, data=new_journal_data)
+                new_events.append(event_id, self.events.timestamps[i], offset, len(event_data))
+                new_journal_data.append(event_data)
+                offset += len(event_data)
+            return type(self)(new_events, data=b"".join(new_journal_data))
 
     def upload(self) -> str:
         if self.events:
+            if self.codec is None:
+                blob = self.body
+            else:
+                compressed, self.blocks = compress_blocks(self.data,
+                                                          self.events.offsets,
+                                                          self.codec,
+                                                          self.compression_block_size)
+                blob = io.BytesIO(compressed)
             manifest = self.manifest()
-            blob_key = f"{self._blobs_pfx}/{self.blob_id}"
-            self.bucket.Object(blob_key).upload_fileobj(self.body, ExtraArgs=dict(Metadata=dict(journal_id=self.id_)))
-            key = f"{self._journal_pfx}/{self.id_}"
-            metadata = dict(number_of_events=f"{len(self.events)}", journal_data_size=f"{len(self.data)}")
-            upload_object(self.s3_client,
-                          self.bucket.name,
-                          key,
-                          json.dumps(manifest).encode("utf-8"), metadata=metadata)
+            storage = self._storage()
+            key = self.key_for(self.id_)
+            with span("flashflood.journal.upload", journal_id=self.id_, size=len(self.data),
+                      number_of_events=len(self.events)):
+                storage.put(f"{self._blobs_pfx}/{self.blob_id}", blob, metadata=dict(journal_id=self.id_))
+                metadata = dict(number_of_events=f"{len(self.events)}", journal_data_size=f"{len(self.data)}")
+                storage.put(key, json.dumps(manifest).encode("utf-8"), metadata=metadata)
             self.reload()  # make self._body available to for read again
-            print("Uploaded journal", self.id_)
+            logger.debug("Uploaded journal %s", self.id_, extra=dict(journal_id=self.id_))
         else:
             raise FlashFloodJournalUploadError("Cannot upload journal with no events")
         return key
@@ -278,35 +638,40 @@ class BaseJournal:
         """
         Mark journal as deleted by uploading a tombstone.
         """
-        key = f"{self._journal_pfx}/{self.id_}"
+        key = self.key_for(self.id_)
+        storage = self._storage()
         try:
-            next(iter(self.bucket.objects.filter(Prefix=key)))
+            next(iter(storage.list(key)))
         except StopIteration:
             raise FlashFloodException(f"Cannot delete non-existent object {key}")
         tombstone_id = JournalID(f"{self.id_}{TOMBSTONE_SUFFIX}")
-        upload_object(self.s3_client,
-                      self.bucket.name,
-                      f"{self._journal_pfx}/{tombstone_id}",
-                      tagging=dict(garbage="true"))
-        update_object_tagging(self.s3_client, self.bucket.name, key, dict(garbage="true"))
+        storage.put(f"{key}{TOMBSTONE_SUFFIX}", tagging=dict(garbage="true"))
+        storage.update_tagging(key, dict(garbage="true"))
         return tombstone_id
 
     def keys(self):
         id_ = self.id_
-        return [f"{self._journal_pfx}/{id_}", f"{self._blobs_pfx}/{id_.blob_id}"]
+        return [self.key_for(id_), f"{self._blobs_pfx}/{id_.blob_id}"]
 
     @classmethod
-    def list(cls, list_from: JournalID=None) -> typing.Iterator[JournalID]:
+    def is_live(cls, journal_id: JournalID) -> bool:
+        """
+        Test if journal exists and is not tombstoned.
+        """
+        key = cls.key_for(journal_id)
+        keys = [item.key for item in cls._storage().list(key)]
+        return key in keys and f"{key}{TOMBSTONE_SUFFIX}" not in keys
+
+    @classmethod
+    def list(cls, list_from: JournalID=None, search_range: DateRange=None) -> typing.Iterator[JournalID]:
         """
         List the latest non-tombstoned version of each journal.
         if `list_from` is provided, listing will begin after `list_from`.
+        With a partitioned layout, only partitions overlapping `search_range` are listed, several at a time. Journals
+        outside `search_range` may still be listed.
         """
-        # TODO: heuristic to find from_date in bucket listing -xbrianh
         journal_info: dict = dict(range_prefix=None, journal_ids=list())
-        kwargs = dict(Prefix=cls._journal_pfx)
-        if list_from is not None:
-            kwargs['Marker'] = f"{cls._journal_pfx}/{list_from}"
-        for item in cls.bucket.objects.filter(**kwargs):
+        for item in cls._list_keys(list_from, search_range):
             journal_id = JournalID.from_key(item.key)
             if journal_id.range_prefix != journal_info['range_prefix']:
                 for id_ in journal_info['journal_ids']:
@@ -319,5 +684,36 @@ class BaseJournal:
                     journal_info['journal_ids'].remove(journal_id.replace(TOMBSTONE_SUFFIX, ""))
                 else:
                     journal_info['journal_ids'].append(journal_id)
-        if journal_info['journal_ids']:
-            yield journal_info['journal_ids'][-1]
+        for id_ in journal_info['journal_ids']:
+            if id_.version == journal_info['journal_ids'][-1].version:
+                yield id_
+
+    @classmethod
+    def _list_keys(cls, list_from: JournalID=None, search_range: DateRange=None) -> typing.Iterator[StoredObject]:
+        # TODO: heuristic to find from_date in bucket listing -xbrianh
+        storage = cls._storage()
+        pfx = f"{cls._journal_pfx}"
+        marker = None if list_from is None else cls.key_for(list_from)
+        search_range = search_range or DateRange()
+        start = search_range.start
+        if list_from is not None:
+            start = max(start, datetime_from_timestamp(list_from.split(JournalID.DELIMITER, 1)[0]))
+        if cls.partition_format is None or datetime.min == start:
+            listings: typing.Iterable[typing.Iterable[StoredObject]] = [storage.list(pfx, marker)]
+        else:
+            # Journals never span partitions, so only partitions dated within the search range hold journals in it
+            end = min(search_range.end, datetime.utcnow())
+
+            def _list_partition(partition: str) -> typing.List[StoredObject]:
+                return list(storage.list(f"{pfx}/{partition}/", marker))
+
+            partitions = date_partitions(cls.partition_format, start, end)
+            listings = concurrent_map(_list_partition, partitions, cls.number_of_listing_workers)
+            if search_range.end > end:
+                # Journals in partitions dated after now are listed in order, after every partition up to now
+                after_now = f"{pfx}/{partition_for_journal(cls.partition_format, datetime_to_timestamp(end))}/~"
+                listings = itertools.chain(listings, [storage.list(f"{pfx}/", max(marker or "", after_now))])
+        for listing in listings:
+            for item in listing:
+                if _in_layout(pfx, item.key, cls.partition_format):
+                    yield item
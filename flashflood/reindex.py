@@ -0,0 +1,182 @@
+import time
+import typing
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from flashflood.util import timestamp_now, concurrent_map, external_sort
+from flashflood.metrics import submit
+from flashflood.objects import BaseJournal, BaseJournalUpdate
+from flashflood.key_index import BaseKeyIndex, IndexEntry
+from flashflood.identifiers import JournalID, JournalUpdateAction
+
+
+logger = logging.getLogger(__name__)
+
+
+class IndexProgress(typing.NamedTuple):
+    number_of_journals: int
+    number_of_events: int
+    number_of_entries: int
+    number_of_writes: int
+    number_of_deletes: int
+    seconds: float
+
+    @property
+    def events_per_second(self) -> float:
+        return self.number_of_events / self.seconds if self.seconds else 0.0
+
+
+class IndexReport(typing.NamedTuple):
+    """
+    Differences between the key index and live journals. `missing` events have no index entry, and `stale` entries
+    target the wrong journal. `dangling` entries are for events in no live journal, and `orphaned` entries are
+    superseded revisions. A sample of the keys of each is kept in `dangling_keys` and `orphaned_keys`.
+    """
+    number_of_journals: int
+    number_of_events: int
+    number_of_entries: int
+    missing: int
+    stale: int
+    dangling: int
+    orphaned: int
+    dangling_keys: typing.List[str]
+    orphaned_keys: typing.List[str]
+    seconds: float
+
+    @property
+    def is_consistent(self) -> bool:
+        return not (self.missing or self.stale or self.dangling or self.orphaned)
+
+
+def _preference(journal_id: JournalID) -> typing.Tuple[bool, str]:
+    # An event in several live journals, e.g. while journals are combined, is indexed to the newest version
+    return "new" != journal_id.version, journal_id.version
+
+
+def reconcile_index(journal_cls: typing.Type[BaseJournal],
+                    journal_update_cls: typing.Type[BaseJournalUpdate],
+                    key_index_cls: typing.Type[BaseKeyIndex],
+                    repair: bool=False,
+                    number_of_workers: int=8,
+                    chunk_size: int=1000000,
+                    batch_size: int=1000,
+                    progress: typing.Callable[[IndexProgress], None]=None,
+                    progress_interval: float=10.0,
+                    sample_size: int=100) -> IndexReport:
+    """
+    Compare the key index with the events of live journals, excluding events with pending delete markers. If `repair`
+    is true, write missing and stale entries, and delete dangling and orphaned ones.
+
+    Manifests are read `number_of_workers` at a time. Expected entries are sorted in runs of `chunk_size` spilled to
+    local temporary files, and merged with the index listing, which is sorted by lookup. Entries revised after
+    reconciliation starts are left alone. Entries written here are dated when reconciliation started, so concurrent
+    writers win. Delete markers are sorted with expected entries, so memory use does not grow with the store. Up to
+    `sample_size` keys of dangling and orphaned entries are reported.
+    """
+    start = time.perf_counter()
+    start_timestamp = timestamp_now()
+    counts = dict(journals=0, events=0, entries=0, writes=0, deletes=0)
+    last_report = [start]
+
+    def _report(force: bool=False):
+        now = time.perf_counter()
+        if force or now - last_report[0] >= progress_interval:
+            last_report[0] = now
+            snapshot = IndexProgress(counts['journals'], counts['events'], counts['entries'], counts['writes'],
+                                     counts['deletes'], now - start)
+            logger.info("Reconciled index for %d journals, %d events (%.0f events/s), %d entries",
+                        snapshot.number_of_journals, snapshot.number_of_events, snapshot.events_per_second,
+                        snapshot.number_of_entries)
+            if progress is not None:
+                progress(snapshot)
+
+    def _read_manifest(journal_id: JournalID) -> typing.Tuple[JournalID, typing.List[str]]:
+        return journal_id, journal_cls.from_id(journal_id).events.event_ids
+
+    def _expected_entries() -> typing.Iterator[tuple]:
+        for journal_id, event_ids in concurrent_map(_read_manifest, journal_cls.list(), number_of_workers):
+            counts['journals'] += 1
+            counts['events'] += len(event_ids)
+            for event_id in event_ids:
+                yield (event_id + key_index_cls.DELIMITER, *_preference(journal_id), event_id, journal_id)
+            _report()
+        for update_id in journal_update_cls.list():
+            if JournalUpdateAction.DELETE == update_id.action:
+                # Sorts before entries of the deleted event, with no target
+                yield (update_id.event_id + key_index_cls.DELIMITER, False, "", update_id.event_id, "")
+
+    def _expected() -> typing.Iterator[typing.Tuple[str, str, str]]:
+        # Entries of an event are adjacent and sorted by preference, so the last one wins unless the event is deleted
+        prev, deleted = None, False
+        for entry in external_sort(_expected_entries(), chunk_size):
+            if prev is not None and prev[0] != entry[0]:
+                if not deleted:
+                    yield prev[0], prev[3], prev[4]
+                deleted = False
+            deleted = deleted or not entry[4]
+            prev = entry
+        if prev is not None and not deleted:
+            yield prev[0], prev[3], prev[4]
+
+    def _actual() -> typing.Iterator[typing.Tuple[str, typing.List[IndexEntry]]]:
+        for revisions in key_index_cls.list_entries():
+            counts['entries'] += 1
+            yield revisions[0].lookup + key_index_cls.DELIMITER, revisions
+
+    missing, stale, dangling, orphaned = 0, 0, 0, 0
+    dangling_keys: typing.List[str] = list()
+    orphaned_keys: typing.List[str] = list()
+    writes: typing.Dict[str, str] = dict()
+    deletes: typing.List[str] = list()
+
+    with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+        def _flush():
+            # Replacement entries are written before the entries they replace are deleted
+            if repair:
+                futures = [submit(e, key_index_cls._write, lookup, target, start_timestamp)
+                           for lookup, target in writes.items()]
+                for f in as_completed(futures):
+                    f.result()
+                key_index_cls._storage().delete(list(deletes))
+                counts['writes'] += len(writes)
+                counts['deletes'] += len(deletes)
+            writes.clear()
+            deletes.clear()
+
+        expected, actual = _expected(), _actual()
+        exp, act = next(expected, None), next(actual, None)
+        while exp is not None or act is not None:
+            if act is None or (exp is not None and exp[0] < act[0]):
+                assert exp is not None
+                missing += 1
+                writes[exp[1]] = exp[2]
+                exp = next(expected, None)
+            else:
+                revisions = act[1]
+                latest = revisions[-1]
+                if start_timestamp < latest.revision:
+                    pass  # revised by a concurrent writer
+                elif exp is None or act[0] < exp[0]:
+                    dangling += 1
+                    if len(dangling_keys) < sample_size:
+                        dangling_keys.append(latest.key)
+                    deletes.append(latest.key)
+                else:
+                    target = latest.target or key_index_cls._target_for_key(latest.key)
+                    if target != exp[2]:
+                        stale += 1
+                        writes[exp[1]] = exp[2]
+                        deletes.append(latest.key)
+                if start_timestamp >= latest.revision:
+                    orphaned += len(revisions) - 1
+                    orphaned_keys.extend(entry.key for entry in revisions[:-1][:sample_size - len(orphaned_keys)])
+                    deletes.extend(entry.key for entry in revisions[:-1])
+                if exp is not None and exp[0] == act[0]:
+                    exp = next(expected, None)
+                act = next(actual, None)
+            if len(writes) >= batch_size or len(deletes) >= batch_size:
+                _flush()
+        _flush()
+    _report(force=True)
+    return IndexReport(counts['journals'], counts['events'], counts['entries'], missing, stale, dangling, orphaned,
+                       dangling_keys, orphaned_keys, time.perf_counter() - start)
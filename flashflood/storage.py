@@ -0,0 +1,421 @@
+import io
+import os
+import time
+import mmap
+import json
+import heapq
+import shutil
+import typing
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from botocore.exceptions import ClientError
+
+from flashflood.util import upload_object, update_object_tagging, delete_keys
+from flashflood.metrics import RequestStats
+from flashflood.concurrency import get_controller, partition_prefix
+from flashflood.exceptions import FlashFloodObjectNotFound
+
+
+class StoredObject(typing.NamedTuple):
+    key: str
+    size: int
+
+
+class BaseStorage:
+    """
+    Object store holding FlashFlood keys. Implementations must list keys in lexicographical order, and must make newly
+    written objects immediately visible to reads and listings. Implementations backed by a remote service record their
+    requests in `stats`.
+    """
+    def __init__(self):
+        self.stats = RequestStats()
+
+    def list(self, prefix: str, marker: str=None) -> typing.Iterator[StoredObject]:
+        """
+        List objects with keys starting with `prefix` in lexicographical order. If `marker` is provided, listing begins
+        after `marker`.
+        """
+        raise NotImplementedError()
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError()
+
+    def get_range(self, key: str, start: int=0, end: int=None) -> typing.BinaryIO:
+        """
+        Return a readable stream of bytes [start, end) of the object at `key`, through the end of the object if `end`
+        is not provided.
+        """
+        raise NotImplementedError()
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError()
+
+    def metadata(self, key: str) -> typing.Dict[str, str]:
+        raise NotImplementedError()
+
+    def put(self,
+            key: str,
+            data: typing.Union[bytes, typing.BinaryIO]=b"",
+            metadata: typing.Dict[str, str]=None,
+            tagging: typing.Dict[str, str]=None):
+        raise NotImplementedError()
+
+    def update_tagging(self, key: str, tagging: typing.Dict[str, str]):
+        raise NotImplementedError()
+
+    def delete(self, keys: typing.Sequence[str]):
+        """
+        Delete objects at `keys`. Missing keys are ignored.
+        """
+        raise NotImplementedError()
+
+    def presigned_url(self, key: str) -> str:
+        """
+        Return a URL granting temporary HTTP read access to the object at `key`.
+        """
+        raise NotImplementedError(f"{type(self).__name__} does not support presigned URLs")
+
+
+class S3Storage(BaseStorage):
+    _LIST_PAGE_SIZE = 1000
+
+    def __init__(self, bucket: typing.Any, s3_client: typing.Any=None):
+        super().__init__()
+        self.bucket = bucket
+        self.s3_client = s3_client or bucket.meta.client
+
+    def list(self, prefix: str, marker: str=None) -> typing.Iterator[StoredObject]:
+        # Pages are requested individually, so a throttled page is retried without restarting the listing
+        kwargs = dict(Bucket=self.bucket.name, Prefix=prefix, MaxKeys=self._LIST_PAGE_SIZE)
+        if marker is not None:
+            kwargs['Marker'] = marker
+        while True:
+            start = time.perf_counter()
+            resp = self._call(prefix, self.s3_client.list_objects, **kwargs)
+            self.stats.record("LIST", seconds=time.perf_counter() - start)
+            contents = resp.get('Contents', [])
+            for item in contents:
+                yield StoredObject(item['Key'], item['Size'])
+            if not resp.get('IsTruncated') or not contents:
+                return
+            kwargs['Marker'] = contents[-1]['Key']
+
+    def get(self, key: str) -> bytes:
+        return self.get_range(key).read()
+
+    def get_range(self, key: str, start: int=0, end: int=None) -> typing.BinaryIO:
+        kwargs = dict()
+        if start or end is not None:
+            kwargs['Range'] = f"bytes={start}-" if end is None else f"bytes={start}-{end - 1}"
+        request_start = time.perf_counter()
+        try:
+            resp = self._call(key, self.bucket.Object(key).get, **kwargs)
+        except ClientError as ex:
+            self.stats.record("GET", seconds=time.perf_counter() - request_start)
+            if ex.response['Error']['Code'] == "NoSuchKey":
+                raise FlashFloodObjectNotFound(f"No object found for key {key}")
+            raise
+        self.stats.record("GET", resp['ContentLength'], time.perf_counter() - request_start)
+        return resp['Body']
+
+    def size(self, key: str) -> int:
+        return self._head(key).content_length
+
+    def metadata(self, key: str) -> typing.Dict[str, str]:
+        return self._head(key).metadata
+
+    def _head(self, key: str):
+        obj = self.bucket.Object(key)
+        start = time.perf_counter()
+        try:
+            self._call(key, obj.load)
+        except ClientError as ex:
+            if ex.response['Error']['Code'] in ("404", "NoSuchKey"):
+                raise FlashFloodObjectNotFound(f"No object found for key {key}")
+            raise
+        finally:
+            self.stats.record("HEAD", seconds=time.perf_counter() - start)
+        return obj
+
+    def put(self,
+            key: str,
+            data: typing.Union[bytes, typing.BinaryIO]=b"",
+            metadata: typing.Dict[str, str]=None,
+            tagging: typing.Dict[str, str]=None):
+        if isinstance(data, bytes):
+            upload_object(self.s3_client, self.bucket.name, key, data, tagging, metadata, stats=self.stats)
+        else:
+            # Large file objects are uploaded in parts
+            extra_args: typing.Dict[str, typing.Any] = dict()
+            if metadata:
+                extra_args['Metadata'] = metadata
+            if tagging:
+                extra_args['Tagging'] = "&".join([f"{k}={v}" for k, v in tagging.items()])
+            position = data.tell()
+            size = data.seek(0, io.SEEK_END) - position
+            data.seek(position)
+            start = time.perf_counter()
+            # Not retried here, since the transfer closes `data`
+            with get_controller().limited(partition_prefix(self.bucket.name, key)):
+                self.bucket.Object(key).upload_fileobj(data, ExtraArgs=extra_args)
+            self.stats.record("PUT", size, time.perf_counter() - start)
+
+    def update_tagging(self, key: str, tagging: typing.Dict[str, str]):
+        update_object_tagging(self.s3_client, self.bucket.name, key, tagging, stats=self.stats)
+
+    def delete(self, keys: typing.Sequence[str]):
+        delete_keys(self.bucket, list(keys), stats=self.stats)
+
+    def _call(self, key: str, fn: typing.Callable, *args, **kwargs):
+        return get_controller().call(partition_prefix(self.bucket.name, key), fn, *args, **kwargs)
+
+    def presigned_url(self, key: str) -> str:
+        return self.s3_client.generate_presigned_url(ClientMethod="get_object",
+                                                     Params=dict(Bucket=self.bucket.name, Key=key))
+
+
+class FilesystemStorage(BaseStorage):
+    """
+    Store objects as files under `root`, with key delimiters `/` mapped to directories. Files are written to a
+    temporary name and renamed into place, so readers never observe partial objects. Ranged reads are served from
+    memory mapped files. Metadata and tags are kept in sidecar documents.
+
+    Key components longer than file names allow are split across nested directories, each named with a chunk of the
+    component followed by `_CONTINUATION`. Unlike S3, a key cannot also be a directory of other keys, e.g. "a" and
+    "a/b". FlashFlood keys never collide this way.
+    """
+    _TMP_DIR = ".flashflood-tmp"
+    _META_DIR = ".flashflood-meta"
+    _CONTINUATION = "\x7f"
+    _MAXIMUM_NAME_LENGTH = 254
+
+    def __init__(self, root: str):
+        super().__init__()
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, self._TMP_DIR), exist_ok=True)
+        os.makedirs(os.path.join(self.root, self._META_DIR), exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        parts = key.split("/")
+        if not key or any(part in ("", ".", "..") for part in parts) or parts[0] in (self._TMP_DIR, self._META_DIR):
+            raise ValueError(f"Invalid key {key}")
+        if self._CONTINUATION in key:
+            raise ValueError(f"Invalid key {key}")
+        return os.path.join(self.root, *self._names(parts))
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, self._META_DIR, *self._names(key.split("/")))
+
+    def _names(self, parts: typing.List[str]) -> typing.Iterator[str]:
+        for part in parts:
+            if len(part.encode("utf-8")) <= self._MAXIMUM_NAME_LENGTH:
+                yield part
+                continue
+            chunk = ""
+            for c in part:
+                if len((chunk + c).encode("utf-8")) > self._MAXIMUM_NAME_LENGTH:
+                    yield chunk + self._CONTINUATION
+                    chunk = ""
+                chunk += c
+            yield chunk
+
+    def list(self, prefix: str, marker: str=None) -> typing.Iterator[StoredObject]:
+        yield from self._list_dir(self.root, "", prefix, marker or "")
+
+    def _list_dir(self, path: str, key_pfx: str, prefix: str, marker: str) -> typing.Iterator[StoredObject]:
+        try:
+            entries = list(os.scandir(path))
+        except FileNotFoundError:
+            return
+        objects = list()
+        subdirectories = list()
+        for entry in entries:
+            if entry.is_dir():
+                if not key_pfx and entry.name in (self._TMP_DIR, self._META_DIR):
+                    continue
+                elif entry.name.endswith(self._CONTINUATION):
+                    pfx = key_pfx + entry.name[:-len(self._CONTINUATION)]
+                else:
+                    pfx = key_pfx + entry.name + "/"
+                if not (pfx.startswith(prefix) or prefix.startswith(pfx)):
+                    continue
+                if pfx < marker and not marker.startswith(pfx):
+                    continue
+                subdirectories.append(self._list_dir(entry.path, pfx, prefix, marker))
+            else:
+                key = key_pfx + entry.name
+                if key.startswith(prefix) and key > marker:
+                    objects.append(StoredObject(key, entry.stat().st_size))
+        # Directory and continuation names do not sort like the keys below them, so listings are merged by key
+        yield from heapq.merge(sorted(objects), *subdirectories)
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as fh:
+                return fh.read()
+        except (FileNotFoundError, IsADirectoryError):
+            raise FlashFloodObjectNotFound(f"No object found for key {key}")
+
+    def get_range(self, key: str, start: int=0, end: int=None) -> typing.BinaryIO:
+        try:
+            with open(self._path(key), "rb") as fh:
+                if 0 == os.fstat(fh.fileno()).st_size:
+                    return io.BytesIO(b"")
+                mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, IsADirectoryError):
+            raise FlashFloodObjectNotFound(f"No object found for key {key}")
+        return _MappedRange(mapped, start, len(mapped) if end is None else min(end, len(mapped)))  # type: ignore
+
+    def size(self, key: str) -> int:
+        try:
+            return os.stat(self._path(key)).st_size
+        except FileNotFoundError:
+            raise FlashFloodObjectNotFound(f"No object found for key {key}")
+
+    def metadata(self, key: str) -> typing.Dict[str, str]:
+        return self._sidecar(key)['metadata']
+
+    def _sidecar(self, key: str) -> typing.Dict[str, typing.Dict[str, str]]:
+        if not os.path.isfile(self._path(key)):
+            raise FlashFloodObjectNotFound(f"No object found for key {key}")
+        try:
+            with open(self._meta_path(key)) as fh:
+                return json.loads(fh.read())
+        except FileNotFoundError:
+            return dict(metadata=dict(), tagging=dict())
+
+    def put(self,
+            key: str,
+            data: typing.Union[bytes, typing.BinaryIO]=b"",
+            metadata: typing.Dict[str, str]=None,
+            tagging: typing.Dict[str, str]=None):
+        if metadata or tagging:
+            self._write(self._meta_path(key), json.dumps(dict(metadata=metadata or dict(), tagging=tagging or dict())))
+        else:
+            self._remove(self._meta_path(key))
+        self._write(self._path(key), data)
+
+    def update_tagging(self, key: str, tagging: typing.Dict[str, str]):
+        sidecar = self._sidecar(key)
+        self._write(self._meta_path(key), json.dumps(dict(metadata=sidecar['metadata'], tagging=tagging)))
+
+    def tagging(self, key: str) -> typing.Dict[str, str]:
+        return self._sidecar(key)['tagging']
+
+    def delete(self, keys: typing.Sequence[str]):
+        for key in keys:
+            self._remove(self._path(key))
+            self._remove(self._meta_path(key))
+
+    def _write(self, path: str, data: typing.Union[str, bytes, typing.BinaryIO]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, self._TMP_DIR))
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                if isinstance(data, str):
+                    fh.write(data.encode("utf-8"))
+                elif isinstance(data, bytes):
+                    fh.write(data)
+                else:
+                    shutil.copyfileobj(data, fh)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class _MappedRange:
+    """
+    Readable stream of bytes [start, end) of a memory mapped file.
+    """
+    def __init__(self, mapped: mmap.mmap, start: int, end: int):
+        self._mapped = mapped
+        self.position = start
+        self.end = end
+
+    def read(self, size: int=-1) -> bytes:
+        if size < 0:
+            size = self.end - self.position
+        data = self._mapped[self.position:min(self.position + size, self.end)]
+        self.position += len(data)
+        return data
+
+    def close(self):
+        self._mapped.close()
+
+
+class MemoryStorage(BaseStorage):
+    """
+    Store objects in process memory. Useful for tests and ephemeral FlashFloods.
+    """
+    def __init__(self):
+        super().__init__()
+        self._objects: typing.Dict[str, typing.Tuple[bytes, typing.Dict[str, str], typing.Dict[str, str]]] = dict()
+        self._keys: typing.List[str] = list()
+        self._lock = threading.Lock()
+
+    def list(self, prefix: str, marker: str=None) -> typing.Iterator[StoredObject]:
+        with self._lock:
+            if marker is not None and marker >= prefix:
+                start = bisect_right(self._keys, marker)
+            else:
+                start = bisect_left(self._keys, prefix)
+            keys = list()
+            for key in self._keys[start:]:
+                if not key.startswith(prefix):
+                    break
+                keys.append(StoredObject(key, len(self._objects[key][0])))
+        yield from keys
+
+    def _get(self, key: str):
+        try:
+            return self._objects[key]
+        except KeyError:
+            raise FlashFloodObjectNotFound(f"No object found for key {key}")
+
+    def get(self, key: str) -> bytes:
+        return self._get(key)[0]
+
+    def get_range(self, key: str, start: int=0, end: int=None) -> typing.BinaryIO:
+        return io.BytesIO(self._get(key)[0][start:end])
+
+    def size(self, key: str) -> int:
+        return len(self._get(key)[0])
+
+    def metadata(self, key: str) -> typing.Dict[str, str]:
+        return dict(self._get(key)[1])
+
+    def tagging(self, key: str) -> typing.Dict[str, str]:
+        return dict(self._get(key)[2])
+
+    def put(self,
+            key: str,
+            data: typing.Union[bytes, typing.BinaryIO]=b"",
+            metadata: typing.Dict[str, str]=None,
+            tagging: typing.Dict[str, str]=None):
+        if not isinstance(data, bytes):
+            data = data.read()
+        with self._lock:
+            if key not in self._objects:
+                insort(self._keys, key)
+            self._objects[key] = (data, dict(metadata or {}), dict(tagging or {}))
+
+    def update_tagging(self, key: str, tagging: typing.Dict[str, str]):
+        with self._lock:
+            data, metadata, _ = self._get(key)
+            self._objects[key] = (data, metadata, dict(tagging))
+
+    def delete(self, keys: typing.Sequence[str]):
+        with self._lock:
+            for key in keys:
+                if self._objects.pop(key, None) is not None:
+                    del self._keys[bisect_left(self._keys, key)]
@@ -0,0 +1,204 @@
+import typing
+import threading
+import http.client
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from flashflood.metrics import submit
+from flashflood.concurrency import get_controller, prefix_for_url
+from flashflood.exceptions import FlashFloodException
+
+
+_DROPPED_CONNECTION_ERRORS = (requests.exceptions.RequestException,
+                              urllib3.exceptions.HTTPError,
+                              http.client.HTTPException,
+                              ConnectionError)
+
+
+class EventStreamReader:
+    """
+    Read byte ranges of event streams from urls over a pool of keep-alive connections. If a connection drops, reading
+    resumes with a new ranged request starting after the last complete read, which is the next unread event when
+    events are read one at a time.
+
+    Requests share the process wide concurrency limit of the S3 prefix they address, and throttled requests are
+    retried. The limit applies until response headers arrive.
+    """
+    def __init__(self,
+                 pool_size: int=10,
+                 maximum_number_of_resumes: int=5,
+                 session: requests.Session=None,
+                 number_of_connections: int=1,
+                 chunk_size: int=8 * 1024 * 1024):
+        self.number_of_connections = number_of_connections
+        self.chunk_size = chunk_size
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.maximum_number_of_resumes = maximum_number_of_resumes
+        self.number_of_resumes = 0
+        self._lock = threading.Lock()
+
+    def read_range(self,
+                   url: str,
+                   start: int,
+                   end: int,
+                   boundaries: typing.Sequence[int]=None) -> typing.Union["ResumableRange", "ChunkedRange"]:
+        """
+        Return a readable stream of bytes [start, end) of `url`. If `boundaries`, the sorted event offsets, are
+        provided, and the reader has more than one connection, chunks between boundaries are fetched in parallel.
+        """
+        if boundaries is not None and 1 < self.number_of_connections:
+            return ChunkedRange(lambda chunk_start, chunk_end: ResumableRange(self, url, chunk_start, chunk_end),
+                                boundaries,
+                                start,
+                                end,
+                                self.chunk_size,
+                                self.number_of_connections)
+        else:
+            return ResumableRange(self, url, start, end)
+
+    def get(self, url: str, headers: typing.Dict[str, str]=None, stream: bool=False) -> requests.Response:
+        def _get() -> requests.Response:
+            resp = self.session.get(url, headers=headers, stream=stream)
+            try:
+                resp.raise_for_status()
+            except requests.exceptions.HTTPError:
+                resp.close()
+                raise
+            return resp
+
+        return get_controller().call(prefix_for_url(url), _get)
+
+    def _get(self, url: str, start: int, end: int) -> requests.Response:
+        return self.get(url, headers=dict(Range=f"bytes={start}-{end - 1}"), stream=True)
+
+    def _count_resume(self):
+        with self._lock:
+            self.number_of_resumes += 1
+
+
+class ResumableRange:
+    def __init__(self, reader: EventStreamReader, url: str, start: int, end: int):
+        self.reader = reader
+        self.url = url
+        self.position = start
+        self.end = end
+        self.number_of_resumes = 0
+        self._resp: typing.Optional[requests.Response] = None
+
+    def read(self, size: int=-1) -> bytes:
+        if size < 0:
+            size = self.end - self.position
+        size = min(size, self.end - self.position)
+        while True:
+            try:
+                data = self._read(size)
+            except requests.exceptions.HTTPError:
+                self.close()
+                raise
+            except _DROPPED_CONNECTION_ERRORS as ex:
+                self._resume(ex)
+            else:
+                self.position += len(data)
+                return data
+
+    def _read(self, size: int) -> bytes:
+        if self._resp is None:
+            self._resp = self.reader._get(self.url, self.position, self.end)
+        chunks = list()
+        remaining = size
+        while remaining:
+            chunk = self._resp.raw.read(remaining)
+            if not chunk:
+                raise ConnectionError(f"Connection closed {remaining} bytes short of {size} byte read")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def _resume(self, ex: Exception):
+        self.close()
+        if self.number_of_resumes >= self.reader.maximum_number_of_resumes:
+            raise FlashFloodException(f"Unable to resume reading {self.url} at byte {self.position}") from ex
+        self.number_of_resumes += 1
+        self.reader._count_resume()
+
+    def close(self):
+        if self._resp is not None:
+            self._resp.close()
+            self._resp = None
+
+
+class ChunkedRange:
+    """
+    Readable stream of bytes [start, end), fetched with `read_range(chunk_start, chunk_end)` as chunks of about
+    `chunk_size` bytes, cut at event `boundaries`. Up to `number_of_connections` chunks are fetched ahead in parallel,
+    bounding memory to that many chunks beyond the one being read.
+    """
+    def __init__(self,
+                 read_range: typing.Callable[[int, int], typing.Any],
+                 boundaries: typing.Sequence[int],
+                 start: int,
+                 end: int,
+                 chunk_size: int=8 * 1024 * 1024,
+                 number_of_connections: int=4):
+        cuts = [start]
+        for boundary in boundaries[bisect_left(boundaries, start):]:
+            if boundary >= end:
+                break
+            elif boundary - cuts[-1] >= chunk_size:
+                cuts.append(boundary)
+        cuts.append(end)
+        self._read_range = read_range
+        self._chunks = deque(zip(cuts[:-1], cuts[1:]))
+        self._number_of_connections = number_of_connections
+        self._executor = ThreadPoolExecutor(max_workers=number_of_connections)
+        self._futures: typing.Deque[Future] = deque()
+        self._buffer = b""
+        self._buffer_position = 0
+        self._fetch_ahead()
+
+    def read(self, size: int=-1) -> bytes:
+        parts = list()
+        while size:
+            if len(self._buffer) == self._buffer_position:
+                if not self._futures:
+                    break
+                self._buffer, self._buffer_position = self._futures.popleft().result(), 0
+                self._fetch_ahead()
+            available = len(self._buffer) - self._buffer_position
+            count = available if size < 0 else min(size, available)
+            parts.append(self._buffer[self._buffer_position:self._buffer_position + count])
+            self._buffer_position += count
+            if size > 0:
+                size -= count
+        return b"".join(parts)
+
+    def close(self):
+        for f in self._futures:
+            f.cancel()
+        self._futures.clear()
+        self._chunks.clear()
+        self._executor.shutdown(wait=False)
+
+    def _fetch_ahead(self):
+        while self._chunks and len(self._futures) < self._number_of_connections:
+            self._futures.append(submit(self._executor, self._fetch, *self._chunks.popleft()))
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        stream = self._read_range(start, end)
+        try:
+            data = stream.read(end - start)
+        finally:
+            stream.close()
+        if len(data) != end - start:
+            raise FlashFloodException(f"Expected {end - start} bytes reading chunk at {start}, got {len(data)}")
+        return data
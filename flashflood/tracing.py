@@ -0,0 +1,109 @@
+import time
+import typing
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+class BaseTracer:
+    """
+    Receive spans around FlashFlood storage operations: manifest fetches, blob reads, key index operations and
+    uploads. Install with `set_tracer`.
+    """
+    def span(self, name: str, attributes: typing.Dict[str, typing.Any]) -> typing.ContextManager[typing.Any]:
+        """
+        Return a context manager covering the operation. The object it yields should support
+        `set_attribute(key, value)`.
+        """
+        raise NotImplementedError()
+
+
+class FinishedSpan(typing.NamedTuple):
+    name: str
+    parent: typing.Optional[str]
+    attributes: typing.Dict[str, typing.Any]
+    start: float
+    duration: float
+    exception: typing.Optional[BaseException]
+
+
+class _RecordingSpan:
+    __slots__ = ("name", "attributes")
+
+    def __init__(self, name: str, attributes: typing.Dict[str, typing.Any]):
+        self.name = name
+        self.attributes = attributes
+
+    def set_attribute(self, key: str, value: typing.Any):
+        self.attributes[key] = value
+
+
+class RecordingTracer(BaseTracer):
+    """
+    Keep finished spans in memory, for profiling and tests.
+    """
+    def __init__(self):
+        self.spans: typing.List[FinishedSpan] = list()
+        self._current: contextvars.ContextVar[typing.Optional[str]] = contextvars.ContextVar("span", default=None)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, attributes: typing.Dict[str, typing.Any]) -> typing.Iterator[_RecordingSpan]:
+        span = _RecordingSpan(name, dict(attributes))
+        parent = self._current.get()
+        token = self._current.set(name)
+        exception = None
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            exception = e
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self._current.reset(token)
+            with self._lock:
+                self.spans.append(FinishedSpan(name, parent, span.attributes, start, duration, exception))
+
+
+class OpenTelemetryTracer(BaseTracer):
+    """
+    Forward spans to an OpenTelemetry tracer, e.g. `OpenTelemetryTracer(opentelemetry.trace.get_tracer(__name__))`.
+    """
+    def __init__(self, tracer: typing.Any):
+        self.tracer = tracer
+
+    def span(self, name: str, attributes: typing.Dict[str, typing.Any]) -> typing.ContextManager[typing.Any]:
+        return self.tracer.start_as_current_span(name, attributes={k: str(v) for k, v in attributes.items()})
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set_attribute(self, key: str, value: typing.Any):
+        pass
+
+_noop_span = _NoopSpan()
+_tracer: typing.Optional[BaseTracer] = None
+
+def set_tracer(tracer: typing.Optional[BaseTracer]):
+    """
+    Install `tracer` process wide, or disable tracing with `None`.
+    """
+    global _tracer
+    _tracer = tracer
+
+def get_tracer() -> typing.Optional[BaseTracer]:
+    return _tracer
+
+def span(name: str, **attributes) -> typing.ContextManager[typing.Any]:
+    """
+    Trace the enclosed operation. With tracing disabled this returns a shared no-op context manager.
+    """
+    if _tracer is None:
+        return _noop_span
+    return _tracer.span(name, attributes)
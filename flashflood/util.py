@@ -1,6 +1,12 @@
+import json
 import time
+import heapq
 import typing
 import datetime
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
 from string import hexdigits
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from contextlib import AbstractContextManager
@@ -8,6 +14,8 @@ from contextlib import AbstractContextManager
 import boto3
 
 from flashflood import config
+from flashflood.metrics import RequestStats, submit
+from flashflood.concurrency import get_controller, partition_prefix
 
 def datetime_to_timestamp(dt):
     return dt.strftime("%Y-%m-%dT%H%M%S.%fZ")
@@ -78,58 +86,103 @@ class _EmptyDateRange(DateRange):
     def contains(self, *args, **kwargs):
         return False
 
+def date_partitions(partition_format: str, start: datetime.datetime, end: datetime.datetime) -> typing.List[str]:
+    """
+    Return the distinct names, formatted with `partition_format`, of the days from `start` to `end` inclusive, in order.
+    """
+    partitions: typing.List[str] = list()
+    day, last_day = start.date(), end.date()
+    while day <= last_day:
+        partition = day.strftime(partition_format)
+        if not partitions or partitions[-1] != partition:
+            partitions.append(partition)
+        day += datetime.timedelta(days=1)
+    return partitions
+
 _S3_BATCH_DELETE_MAX_KEYS = 1000
 
-def delete_keys(bucket, keys, number_of_workers=4):
+def delete_keys(bucket, keys, number_of_workers: int=None, stats: RequestStats=None):
+    """
+    Delete `keys` from `bucket` in batches. Requests are gated by the process wide concurrency controller, so
+    `number_of_workers` only bounds the thread pool, defaulting to the controller's maximum limit.
+    """
     def _delete(keys_to_delete):
         assert _S3_BATCH_DELETE_MAX_KEYS >= len(keys_to_delete)
         objects = [dict(Key=key) for key in keys_to_delete]
-        bucket.delete_objects(Delete=dict(Objects=objects))
+        start = time.perf_counter()
+        get_controller().call(partition_prefix(bucket.name, keys_to_delete[0]),
+                              bucket.delete_objects,
+                              Delete=dict(Objects=objects))
+        if stats is not None:
+            stats.record("DELETE", seconds=time.perf_counter() - start)
 
     if keys:
+        number_of_batches = 1 + (len(keys) - 1) // _S3_BATCH_DELETE_MAX_KEYS
+        number_of_workers = number_of_workers or min(number_of_batches, int(get_controller().maximum_limit))
         with ThreadPoolExecutor(max_workers=number_of_workers) as e:
             futures = list()
             while keys:
-                futures.append(e.submit(_delete, keys[:_S3_BATCH_DELETE_MAX_KEYS]))
+                futures.append(submit(e, _delete, keys[:_S3_BATCH_DELETE_MAX_KEYS]))
                 keys = keys[_S3_BATCH_DELETE_MAX_KEYS:]
             for f in as_completed(futures):
                 f.result()
 
 class S3Deleter(AbstractContextManager):
-    def __init__(self, bucket, deletion_threshold=5 * _S3_BATCH_DELETE_MAX_KEYS, number_of_workers=4):
+    def __init__(self, bucket, deletion_threshold=5 * _S3_BATCH_DELETE_MAX_KEYS, number_of_workers: int=None):
         self.bucket = bucket
         self.deletion_threshold = deletion_threshold
-        self._keys = list()
+        self._keys: typing.List[str] = list()
         self.number_of_workers = number_of_workers
 
     def delete(self, key):
         self._keys.append(key)
 
     def __exit__(self, *args, **kwargs):
-        delete_keys(self.bucket, self._keys)
+        delete_keys(self.bucket, self._keys, self.number_of_workers)
 
-def concurrent_listing(bucket, prefixes, number_of_workers=4):
+def concurrent_listing(bucket, prefixes, number_of_workers: int=None):
     """
-    Concurrently list objects from `bucket` for `prefixes`. Lexicographical ordering is lost.
+    Concurrently list objects from `bucket` for `prefixes`. Lexicographical ordering is lost. Listings are gated by the
+    process wide concurrency controller, and retried from the start if throttled.
     """
     assert not isinstance(prefixes, str)
 
     def _list(pfx):
         # TDOD: handle or limit unbounded listing into memory
-        return [item for item in bucket.objects.filter(Prefix=pfx)]
+        return get_controller().call(partition_prefix(bucket.name, pfx),
+                                     lambda: [item for item in bucket.objects.filter(Prefix=pfx)])
 
-    with ThreadPoolExecutor(max_workers=number_of_workers) as e:
-        futures = [e.submit(_list, f"{pfx}") for pfx in prefixes]
+    with ThreadPoolExecutor(max_workers=number_of_workers or int(get_controller().maximum_limit)) as e:
+        futures = [submit(e, _list, f"{pfx}") for pfx in prefixes]
         for f in as_completed(futures):
             for item in f.result():
                 yield item
 
+def concurrent_map(fn: typing.Callable, items: typing.Iterable, number_of_workers: int=None) -> typing.Iterator:
+    """
+    Yield `fn(item)` for each of `items`, in order, computing at most `number_of_workers` results ahead.
+    """
+    number_of_workers = number_of_workers or int(get_controller().maximum_limit)
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+        futures = deque(submit(e, fn, item) for item in islice(items, number_of_workers))
+        try:
+            while futures:
+                result = futures.popleft().result()
+                for item in islice(items, 1):
+                    futures.append(submit(e, fn, item))
+                yield result
+        finally:
+            for f in futures:
+                f.cancel()
+
 def upload_object(s3_client: typing.Any,
                   bucket: str,
                   key: str,
                   data: bytes=b"",
                   tagging: typing.Optional[typing.Dict[str, str]]=None,
-                  metadata: typing.Optional[typing.Dict[str, str]]=None) -> bool:
+                  metadata: typing.Optional[typing.Dict[str, str]]=None,
+                  stats: RequestStats=None) -> bool:
     """
     Upload an object to s3.
     Return `True` if upload was verified, otherwise `False`
@@ -139,10 +192,18 @@ def upload_object(s3_client: typing.Any,
         kwargs['Tagging'] = "&".join([f"{k}={v}" for k, v in tagging.items()])
     if metadata:
         kwargs['Metadata'] = metadata
-    s3_client.put_object(**kwargs)
+    prefix = partition_prefix(bucket, key)
+    start = time.perf_counter()
+    get_controller().call(prefix, s3_client.put_object, **kwargs)
+    if stats is not None:
+        stats.record("PUT", len(data), time.perf_counter() - start)
     if config.object_exists_waiter_config['Delay']:
         waiter = s3_client.get_waiter("object_exists")
-        waiter.wait(Bucket=bucket, Key=key, WaiterConfig=config.object_exists_waiter_config)
+        start = time.perf_counter()
+        get_controller().call(prefix, waiter.wait, Bucket=bucket, Key=key,
+                              WaiterConfig=config.object_exists_waiter_config)
+        if stats is not None:
+            stats.record("HEAD", seconds=time.perf_counter() - start)
         return True
     else:
         return False
@@ -150,6 +211,71 @@ def upload_object(s3_client: typing.Any,
 def update_object_tagging(s3_client: typing.Any,
                           bucket: str,
                           key: str,
-                          tagging: typing.Dict[str, str]):
+                          tagging: typing.Dict[str, str],
+                          stats: RequestStats=None):
     tagset = [dict(Key=k, Value=v) for k, v in tagging.items()]
-    s3_client.put_object_tagging(Bucket=bucket, Key=key, Tagging=dict(TagSet=tagset))
+    start = time.perf_counter()
+    get_controller().call(partition_prefix(bucket, key),
+                          s3_client.put_object_tagging,
+                          Bucket=bucket,
+                          Key=key,
+                          Tagging=dict(TagSet=tagset))
+    if stats is not None:
+        stats.record("TAGGING", seconds=time.perf_counter() - start)
+
+def external_sort(items: typing.Iterable[tuple], chunk_size: int=1000000) -> typing.Iterator[tuple]:
+    """
+    Sort tuples of JSON serializable values, holding at most `chunk_size` in memory. Larger inputs are written in
+    sorted runs to temporary files, which are merged.
+    """
+    runs: typing.List[typing.IO] = list()
+    chunk: typing.List[tuple] = list()
+    try:
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                runs.append(_spill(sorted(chunk)))
+                chunk = list()
+        chunk.sort()
+        yield from heapq.merge(*[_read_run(f) for f in runs], chunk)
+    finally:
+        for f in runs:
+            f.close()
+
+def _spill(chunk: typing.List[tuple]) -> typing.IO:
+    f = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for item in chunk:
+        f.write(json.dumps(item) + "\n")
+    f.seek(0)
+    return f
+
+def _read_run(f: typing.IO) -> typing.Iterator[tuple]:
+    for line in f:
+        yield tuple(json.loads(line))
+
+class LRUCache:
+    """
+    Thread safe mapping holding at most `maxsize` items, evicting the least recently used.
+    """
+    def __init__(self, maxsize: int=128):
+        self.maxsize = maxsize
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return default
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
@@ -11,10 +11,12 @@ setup(name='flash-flood',
       author='Brian Hannafious',
       author_email='bhannafi@ucsc.edu',
       license='MIT',
-      packages=find_packages(exclude=['tests']),
+      packages=find_packages(exclude=['tests', 'benchmarks']),
       scripts=glob.glob('scripts/*'),
       zip_safe=False,
       install_requires=install_requires,
+      extras_require=dict(aio=["aiohttp>=3.7"]),
+      python_requires=">=3.8",
       platforms=['MacOS X', 'Posix'],
       test_suite='test',
       classifiers=[
@@ -22,6 +24,6 @@ setup(name='flash-flood',
           'License :: OSI Approved :: MIT License',
           'Operating System :: MacOS :: MacOS X',
           'Operating System :: POSIX',
-          'Programming Language :: Python :: 3.6'
+          'Programming Language :: Python :: 3.8'
       ]
       )
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+import os
+import sys
+import json
+import asyncio
+import threading
+from uuid import uuid4
+from random import randint
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.aio import areplay_event_streams, amerge, aload_event_stream
+from flashflood.exceptions import FlashFloodException
+from tests import infra, random_date
+
+
+class TestAio(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = boto3.resource("s3")
+        cls.bucket = cls.s3.Bucket(infra.get_env("S3_BUCKET"))
+        cls.flashflood = flashflood.FlashFlood(cls.s3, cls.bucket.name, f"flashflood-test-aio-{uuid4()}")
+        cls.events = dict()
+        for _ in range(8):
+            event = cls.flashflood.put(os.urandom(randint(1, 10)), date=random_date())
+            cls.events[event.event_id] = event
+        cls.flashflood.journal(minimum_number_of_events=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.flashflood._destroy()
+
+    def test_areplay(self):
+        async def _replay():
+            return [event async for event in self.flashflood.areplay(concurrency=2, queue_size=1)]
+
+        self.assertEqual(list(self.flashflood.replay()), asyncio.run(_replay()))
+
+    def test_areplay_event_streams(self):
+        event_streams = list(self.flashflood.list_event_streams())
+        dates = sorted(e.date for e in self.events.values())
+        from_date, to_date = dates[1], dates[-2]
+
+        async def _replay(ordered):
+            return [event async for event in areplay_event_streams(event_streams,
+                                                                   from_date,
+                                                                   to_date,
+                                                                   concurrency=2,
+                                                                   ordered=ordered)]
+
+        with self.subTest("Ordered replay should match synchronous replay"):
+            self.assertEqual(list(self.flashflood.replay(from_date, to_date)), asyncio.run(_replay(True)))
+        with self.subTest("Unordered replay should produce the same events"):
+            replayed = asyncio.run(_replay(False))
+            self.assertEqual(sorted(e.event_id for e in self.events.values() if from_date < e.date <= to_date),
+                             sorted(e.event_id for e in replayed))
+            for event in replayed:
+                self.assertEqual(self.events[event.event_id].data, event.data)
+
+    def test_compact_event_streams(self):
+        event_streams = list(self.flashflood.list_event_streams(include_events=False))
+
+        async def _replay():
+            return [event async for event in areplay_event_streams(event_streams, ordered=True)]
+
+        self.assertEqual(list(self.flashflood.replay()), asyncio.run(_replay()))
+
+    def test_cancellation(self):
+        closed = list()
+
+        def _source(i):
+            async def _events():
+                try:
+                    while True:
+                        yield i
+                        await asyncio.sleep(0)
+                finally:
+                    closed.append(i)
+            return _events
+
+        async def _consume():
+            merged = amerge([_source(i) for i in range(4)], concurrency=2, queue_size=1)
+            async for _ in merged:
+                break
+            await merged.aclose()
+
+        asyncio.run(_consume())
+        self.assertEqual([0, 1], sorted(closed))
+
+    def test_errors(self):
+        async def _failing():
+            raise FlashFloodException("failed")
+            yield
+
+        async def _consume():
+            return [e async for e in amerge([_failing])]
+
+        with self.assertRaises(FlashFloodException):
+            asyncio.run(_consume())
+    def test_redirected_chunked_manifest(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _RedirectingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/bkt/root/journals/manifest"
+            event_stream = asyncio.run(aload_event_stream(dict(manifest_url=url)))
+            self.assertEqual(_RedirectingHandler.manifest['events'], event_stream['events'])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class _RedirectingHandler(BaseHTTPRequestHandler):
+    """
+    Redirect to a path ending in "-moved", which serves `manifest` with chunked transfer encoding.
+    """
+    protocol_version = "HTTP/1.1"
+    manifest = dict(events=[dict(event_id="a", timestamp="2019-11-25T000000.000000Z", offset=0, size=1)])
+
+    def do_GET(self):
+        if not self.path.endswith("-moved"):
+            self.send_response(307)
+            self.send_header("Location", self.path + "-moved")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = json.dumps(self.manifest).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in (body[:10], body[10:]):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
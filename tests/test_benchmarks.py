@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import unittest
+from uuid import uuid4
+
+import requests
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+from benchmarks import run
+from benchmarks.fake_s3 import FakeS3
+from flashflood import get_controller, set_controller, ConcurrencyController
+from flashflood.storage import S3Storage
+
+
+class TestFakeS3(unittest.TestCase):
+    def setUp(self):
+        self.s3 = None
+
+    def tearDown(self):
+        if self.s3 is not None:
+            self.s3.close()
+
+    def _storage(self, *args, **kwargs):
+        self.s3 = FakeS3(*args, **kwargs)
+        bucket = self.s3.resource().create_bucket(Bucket=f"test-{uuid4()}")
+        self.s3.reset_counters()
+        return S3Storage(bucket)
+
+    def test_latency(self):
+        storage = self._storage(latency=0.01, bandwidth=1000)
+        start = time.perf_counter()
+        storage.put("foo", b"a" * 10)
+        storage.get("foo")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.04)
+        self.assertEqual(dict(PUT=1, HEAD=1, GET=1), self.s3.requests)  # uploads are verified in tests
+        self.assertEqual(20, self.s3.bytes_transferred)
+
+    def test_throttling(self):
+        controller = get_controller()
+        set_controller(ConcurrencyController(base_delay=0.01, maximum_attempts=20))
+        try:
+            storage = self._storage(requests_per_second=10)
+            for i in range(20):
+                storage.put(f"foo/{i}")
+            self.assertGreater(self.s3.throttled, 0)
+            self.assertEqual(40 + self.s3.throttled, self.s3.requests['PUT'] + self.s3.requests['HEAD'])
+            metrics = get_controller().metrics()
+            self.assertEqual(self.s3.throttled, sum(m['throttled'] for m in metrics.values()))
+            self.assertEqual(20, len(list(storage.list("foo/"))))
+        finally:
+            set_controller(controller)
+
+    def test_list_pages(self):
+        storage = self._storage()
+        storage._LIST_PAGE_SIZE = 2
+        for i in range(5):
+            storage.put(f"foo/{i}")
+        self.s3.reset_counters()
+        self.assertEqual(5, len(list(storage.list("foo/"))))
+        self.assertEqual(dict(LIST=3), self.s3.requests)
+
+    def test_presigned_url(self):
+        storage = self._storage()
+        storage.put("foo/bar", b"0123456789")
+        url = storage.presigned_url("foo/bar")
+        self.assertEqual(b"0123456789", requests.get(url).content)
+        resp = requests.get(url, headers=dict(Range="bytes=2-4"))
+        self.assertEqual(206, resp.status_code)
+        self.assertEqual(b"234", resp.content)
+        self.assertEqual(2, self.s3.requests['GET'])
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_run(self):
+        results = run.run(number_of_events=6, event_size=10, number_of_lookups=3, number_of_updates=2)
+        self.assertEqual(["put", "journal", "list_journals", "get_event", "replay", "replay_event_stream", "update"],
+                         [r['benchmark'] for r in results])
+        for r in results:
+            self.assertGreater(r['number_of_requests'], 0)
+        self.assertNotIn("HEAD", results[0]['requests'])
+        with self.subTest("Uploads should be verified"):
+            verified = run.run(number_of_events=2, event_size=10, number_of_lookups=1, number_of_updates=1,
+                               verify_uploads=True)
+            self.assertGreater(verified[0]['requests'].get('HEAD', 0), 0)
+        with self.subTest("Local storages should run the same workloads"):
+            for storage in ("filesystem", "memory"):
+                local = run.run(number_of_events=6, event_size=10, number_of_lookups=3, number_of_updates=2,
+                                storage=storage)
+                self.assertEqual(["put", "journal", "list_journals", "get_event", "replay", "update"],
+                                 [r['benchmark'] for r in local])
+                self.assertEqual({None}, {r['number_of_requests'] for r in local})
+                self.assertEqual([], run.compare(local, local, tolerance=0.2))
+                table = run.side_by_side(results + local).splitlines()
+                self.assertEqual(["benchmark", "events", "size", "s3", storage], table[0].split())
+                self.assertEqual(1 + len(results), len(table))
+        with self.subTest("Request count increases should be regressions"):
+            self.assertEqual([], run.compare(results, results, tolerance=0.2))
+            baseline = [dict(r, number_of_requests=r['number_of_requests'] - 1) for r in results]
+            self.assertEqual(len(results), len(run.compare(results, baseline, tolerance=0.2)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+import io
+import os
+import sys
+import tempfile
+from uuid import uuid4
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.cache import BlobCache
+from tests import infra
+
+
+class TestBlobCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.data = os.urandom(100)
+        self.fetched = list()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def _fetch(self, start, end):
+        self.fetched.append((start, end))
+        return io.BytesIO(self.data[start:end])
+
+    def test_read_range(self):
+        cache = BlobCache(self.tempdir.name, capacity=1000, block_size=16)
+        with self.subTest("Misses should be fetched with one ranged read"):
+            stream = cache.read_range("blob", 10, 50, self._fetch)
+            self.assertEqual(self.data[10:20], stream.read(10))
+            self.assertEqual(self.data[20:50], stream.read())
+            stream.close()
+            self.assertEqual([(0, 64)], self.fetched)
+        with self.subTest("Hits should not be fetched"):
+            stream = cache.read_range("blob", 16, 48, self._fetch)
+            self.assertEqual(self.data[16:48], stream.read())
+            stream.close()
+            self.assertEqual([(0, 64)], self.fetched)
+        with self.subTest("Blocks past cached blocks should be fetched"):
+            stream = cache.read_range("blob", 40, 100, self._fetch)
+            self.assertEqual(self.data[40:100], stream.read())
+            stream.close()
+            self.assertEqual([(0, 64), (64, 112)], self.fetched)
+
+    def test_eviction(self):
+        cache = BlobCache(self.tempdir.name, capacity=48, block_size=16)
+        cache.read_range("blob", 0, 32, self._fetch).read()
+        cache.read_range("blob", 0, 16, self._fetch).read()
+        cache.read_range("blob", 32, 64, self._fetch).read()
+        with self.subTest("Least recently used blocks should be evicted"):
+            self.assertEqual(48, cache.size)
+            self.assertEqual(sorted(["blob.16.0", "blob.16.2", "blob.16.3"]), sorted(os.listdir(self.tempdir.name)))
+        with self.subTest("Cache should be restored from disk, discarding temporary files"):
+            open(os.path.join(self.tempdir.name, ".tmpabc"), "w").close()
+            cache = BlobCache(self.tempdir.name, capacity=48, block_size=16)
+            self.assertEqual(48, cache.size)
+            self.assertNotIn(".tmpabc", os.listdir(self.tempdir.name))
+            self.fetched.clear()
+            self.assertEqual(self.data[:16], cache.read_range("blob", 0, 16, self._fetch).read())
+            self.assertEqual([], self.fetched)
+
+    def test_block_size_change(self):
+        cache = BlobCache(self.tempdir.name, capacity=1000, block_size=16)
+        self.assertEqual(self.data[:64], cache.read_range("blob", 0, 64, self._fetch).read())
+        cache = BlobCache(self.tempdir.name, capacity=1000, block_size=32)
+        self.fetched.clear()
+        self.assertEqual(self.data[:64], cache.read_range("blob", 0, 64, self._fetch).read())
+        self.assertEqual([(0, 64)], self.fetched)
+        self.assertEqual(self.data[:64], cache.read_range("blob", 0, 64, self._fetch).read())
+        self.assertEqual([(0, 64)], self.fetched)
+
+    def test_journals(self):
+        s3 = boto3.resource("s3")
+        bucket = infra.get_env("S3_BUCKET")
+        ff = flashflood.FlashFlood(s3, bucket, f"flashflood-test-cache-{uuid4()}")
+        try:
+            events = [ff.put(os.urandom(7)) for _ in range(6)]
+            ff.journal(minimum_number_of_events=6)
+            blob_cache = BlobCache(self.tempdir.name, capacity=1000, block_size=16)
+            cached_ff = flashflood.FlashFlood(s3, bucket, ff.root_prefix, blob_cache=blob_cache)
+            for _ in range(2):
+                self.assertEqual(events, [e for e in cached_ff.replay()])
+                for event in events:
+                    self.assertEqual(event, cached_ff.get_event(event.event_id))
+            self.assertEqual(42, cached_ff._Journal.blob_cache.size)
+        finally:
+            ff._destroy()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+import io
+import os
+import sys
+import asyncio
+from uuid import uuid4
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.compression import BlockIndex, DecompressedRange, compress_blocks, codecs
+from tests import infra
+
+
+class TestCompression(unittest.TestCase):
+    def test_compress_blocks(self):
+        data = os.urandom(100)
+        boundaries = list(range(0, 100, 10))
+        for codec in codecs:
+            with self.subTest(codec=codec):
+                compressed, blocks = compress_blocks(data, boundaries, codec, block_size=25)
+                self.assertEqual([0, 30, 60, 90, 100], blocks.logical_offsets)
+                self.assertEqual(len(compressed), blocks.offsets[-1])
+                blocks = BlockIndex.from_dict(blocks.to_dict())
+                fetched = list()
+
+                def _fetch(start, end):
+                    fetched.append((start, end))
+                    return io.BytesIO(compressed[start:end])
+
+                for start, end in [(0, 100), (35, 45), (60, 90), (89, 91)]:
+                    fetched.clear()
+                    self.assertEqual(data[start:end], DecompressedRange(blocks, start, end, _fetch).read())
+                    self.assertEqual([blocks.compressed_range(start, end)], fetched)
+                self.assertEqual((blocks.offsets[1], blocks.offsets[2]), blocks.compressed_range(35, 45))
+
+
+class TestCompressedJournals(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = boto3.resource("s3")
+        cls.bucket = cls.s3.Bucket(infra.get_env("S3_BUCKET"))
+        root_pfx = f"flashflood-test-compression-{uuid4()}"
+        uncompressed = flashflood.FlashFlood(cls.s3, cls.bucket.name, root_pfx)
+        cls.events = [uncompressed.put(b"uncompressed" + os.urandom(4)) for _ in range(3)]
+        uncompressed.journal(minimum_number_of_events=3)
+        cls.flashflood = flashflood.FlashFlood(cls.s3, cls.bucket.name, root_pfx, codec="zlib",
+                                               compression_block_size=40)
+        cls.events.extend(cls.flashflood.put(b"compressed" * 5 + os.urandom(4)) for _ in range(6))
+        cls.flashflood.journal(minimum_number_of_events=6)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.flashflood._destroy()
+
+    def test_journals(self):
+        journals = [self.flashflood._Journal.from_id(journal_id) for journal_id in self.flashflood.list_journals()]
+        self.assertIsNone(journals[0].blocks)
+        self.assertEqual("zlib", journals[1].blocks.codec)
+        self.assertLess(self.bucket.Object(f"{self.flashflood._blobs_pfx}/{journals[1].blob_id}").content_length,
+                        journals[1].size)
+
+    def test_replay(self):
+        self.assertEqual(self.events, list(self.flashflood.replay()))
+        self.assertEqual(self.events, list(self.flashflood.replay(number_of_connections=2)))
+        self.assertEqual(self.events, [e for batch in self.flashflood.replay_batches() for e in batch.events()])
+        self.assertEqual(self.events[4:], list(self.flashflood.replay(from_date=self.events[3].date)))
+
+    def test_get_event(self):
+        for event in self.events:
+            self.assertEqual(event, self.flashflood.get_event(event.event_id))
+
+    def test_event_streams(self):
+        for include_events in (True, False):
+            event_streams = list(self.flashflood.list_event_streams(include_events=include_events))
+            self.assertEqual(self.events, [e for es in event_streams for e in flashflood.replay_event_stream(es)])
+        for event_stream, compact_event_stream in zip(self.flashflood.list_event_streams(),
+                                                      self.flashflood.list_event_streams(include_events=False)):
+            self.assertEqual(event_stream['size'], compact_event_stream['size'])
+            if "blocks" in event_stream:
+                self.assertLess(compact_event_stream['stored_size'], compact_event_stream['size'])
+            else:
+                self.assertEqual(compact_event_stream['stored_size'], compact_event_stream['size'])
+        shards = self.flashflood.plan_replay(n_shards=3)
+        self.assertEqual(sorted(e.event_id for e in self.events),
+                         sorted(e.event_id
+                                for shard in shards
+                                for event_stream in shard
+                                for e in flashflood.replay_event_stream(event_stream)))
+        self.assertEqual(self.events, list(self.flashflood.parallel_replay(number_of_processes=2, ordered=True)))
+
+    def test_areplay(self):
+        async def _replay():
+            return [event async for event in self.flashflood.areplay()]
+
+        self.assertEqual(self.events, asyncio.run(_replay()))
+
+if __name__ == '__main__':
+    unittest.main()
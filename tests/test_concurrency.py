@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import json
+import asyncio
+import threading
+from uuid import uuid4
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError, WaiterError
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.concurrency import (AdaptiveLimit, ConcurrencyController, is_throttling_error, partition_prefix,
+                                    prefix_for_url)
+from flashflood.streams import EventStreamReader
+from flashflood.aio import aload_event_stream
+from flashflood.storage import S3Storage
+from tests import infra
+
+
+def _slow_down():
+    return ClientError(dict(Error=dict(Code="SlowDown", Message="Please reduce your request rate."),
+                            ResponseMetadata=dict(HTTPStatusCode=503)),
+                       "GetObject")
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+    def test_aimd(self):
+        limit = AdaptiveLimit(initial=4, minimum=1, maximum=5)
+        epochs = [limit.acquire() for _ in range(4)]
+        limit.release(epochs[0], throttled=True)
+        self.assertEqual(2, limit.limit)
+        limit.release(epochs[1], throttled=True)  # started before the decrease
+        self.assertEqual(2, limit.limit)
+        limit.release(epochs[2])
+        self.assertEqual(2.5, limit.limit)
+        limit.release(epochs[3])
+        for _ in range(100):
+            limit.release(limit.acquire())
+        self.assertEqual(5, limit.limit)
+        for _ in range(10):
+            limit.release(limit.acquire(), throttled=True)
+        self.assertEqual(1, limit.limit)
+        self.assertEqual(dict(limit=1, in_flight=0, requests=114, throttled=12, retries=0), limit.metrics())
+
+    def test_in_flight(self):
+        limit = AdaptiveLimit(initial=3, maximum=3)
+        in_flight = list()
+        lock = threading.Lock()
+
+        def request():
+            epoch = limit.acquire()
+            with lock:
+                in_flight.append(limit.in_flight)
+            time.sleep(0.01)
+            limit.release(epoch)
+
+        with ThreadPoolExecutor(max_workers=10) as e:
+            for f in [e.submit(request) for _ in range(30)]:
+                f.result()
+        self.assertEqual(3, max(in_flight))
+
+    def test_aacquire(self):
+        limit = AdaptiveLimit(initial=1, maximum=1)
+        epoch = limit.acquire()
+
+        async def _acquire():
+            waiting = asyncio.ensure_future(limit.aacquire())
+            await asyncio.sleep(0.05)
+            self.assertFalse(waiting.done())
+            threading.Timer(0.05, limit.release, (epoch,)).start()  # released from another thread
+            limit.release(await asyncio.wait_for(waiting, 5))
+
+        asyncio.run(_acquire())
+        self.assertEqual(0, limit.in_flight)
+
+
+class TestConcurrencyController(unittest.TestCase):
+    def test_is_throttling_error(self):
+        self.assertTrue(is_throttling_error(_slow_down()))
+        self.assertTrue(is_throttling_error(ClientError(dict(ResponseMetadata=dict(HTTPStatusCode=503)), "PutObject")))
+        self.assertFalse(is_throttling_error(ClientError(dict(Error=dict(Code="NoSuchKey")), "GetObject")))
+        self.assertTrue(is_throttling_error(WaiterError("ObjectExists", "Service Unavailable",
+                                                        dict(ResponseMetadata=dict(HTTPStatusCode=503)))))
+        self.assertFalse(is_throttling_error(WaiterError("ObjectExists", "Max attempts exceeded",
+                                                         dict(ResponseMetadata=dict(HTTPStatusCode=404)))))
+        self.assertFalse(is_throttling_error(ValueError()))
+
+    def test_partition_prefix(self):
+        self.assertEqual("bkt/root/journals", partition_prefix("bkt", "root/journals/a--b--c--d"))
+        self.assertEqual("bkt/root", partition_prefix("bkt", "root"))
+
+    def test_prefix_for_url(self):
+        self.assertEqual("bkt/root/blobs",
+                         prefix_for_url("https://bkt.s3.amazonaws.com/root/blobs/x?X-Amz-Signature=y"))
+        self.assertEqual("bkt/root/blobs", prefix_for_url("https://bkt.s3.us-west-2.amazonaws.com/root/blobs/x"))
+        self.assertEqual("bkt/root/blobs", prefix_for_url("http://127.0.0.1:5000/bkt/root/blobs/x"))
+
+    def test_call(self):
+        controller = ConcurrencyController(base_delay=0.001, maximum_attempts=3)
+        attempts = list()
+
+        def flaky(number_of_failures):
+            attempts.append(1)
+            if len(attempts) <= number_of_failures:
+                raise _slow_down()
+            return "ok"
+
+        self.assertEqual("ok", controller.call("pfx", flaky, 2))
+        self.assertEqual(dict(limit=2.5, in_flight=0, requests=3, throttled=2, retries=2),
+                         controller.metrics()["pfx"])
+        attempts.clear()
+        with self.assertRaises(ClientError):
+            controller.call("pfx", flaky, 3)
+        with self.assertRaises(KeyError):
+            controller.call("other", dict().__getitem__, "a")
+        self.assertEqual(dict(limit=8.125, in_flight=0, requests=1, throttled=0, retries=0),  # not throttled
+                         controller.metrics()["other"])
+
+    def test_limited(self):
+        controller = ConcurrencyController(initial_limit=2)
+        with self.assertRaises(ClientError):
+            with controller.limited("pfx"):
+                self.assertEqual(1, controller.metrics()["pfx"]['in_flight'])
+                raise _slow_down()
+        self.assertEqual(dict(limit=1, in_flight=0, requests=1, throttled=1, retries=0), controller.metrics()["pfx"])
+
+
+class TestS3Concurrency(unittest.TestCase):
+    def setUp(self):
+        self.controller = flashflood.get_controller()
+        flashflood.set_controller(ConcurrencyController(base_delay=0.001))
+
+    def tearDown(self):
+        flashflood.set_controller(self.controller)
+
+    def test_throttled_listing(self):
+        s3 = boto3.resource("s3")
+        bucket = s3.Bucket(infra.get_env("S3_BUCKET"))
+        s3_client = boto3.client("s3")
+        storage = S3Storage(bucket, s3_client)
+        storage._LIST_PAGE_SIZE = 2
+        pfx = f"flashflood-test-concurrency-{uuid4()}"
+        keys = [f"{pfx}/{i}" for i in range(5)]
+        for key in keys:
+            storage.put(key, b"x")
+        calls = list()
+
+        def throttle_every_other_page(**kwargs):
+            calls.append(1)
+            if len(calls) % 2:
+                raise _slow_down()
+
+        s3_client.meta.events.register("before-call.s3.ListObjects", throttle_every_other_page)
+        try:
+            self.assertEqual(keys, [item.key for item in storage.list(pfx)])
+            metrics = flashflood.get_controller().metrics()[partition_prefix(bucket.name, pfx)]
+            self.assertEqual(3, metrics['throttled'])
+            self.assertEqual(3, metrics['retries'])
+            self.assertEqual(3, storage.stats.requests("LIST"))
+        finally:
+            storage.delete(keys)
+
+    def test_throttled_presigned_reads(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _ThrottlingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/bkt/root/blobs/blob"
+        try:
+            _ThrottlingHandler.number_of_throttles = 2
+            stream = EventStreamReader().read_range(url, 2, 10)
+            self.assertEqual(_ThrottlingHandler.body[2:10], stream.read())
+            stream.close()
+            metrics = flashflood.get_controller().metrics()["bkt/root/blobs"]
+            self.assertEqual((2, 2), (metrics['throttled'], metrics['retries']))
+            _ThrottlingHandler.number_of_throttles = 1
+            event_stream = asyncio.run(aload_event_stream(dict(manifest_url=url)))
+            self.assertEqual(json.loads(_ThrottlingHandler.body)['events'], event_stream['events'])
+            metrics = flashflood.get_controller().metrics()["bkt/root/blobs"]
+            self.assertEqual((3, 3), (metrics['throttled'], metrics['retries']))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_flashflood(self):
+        s3 = boto3.resource("s3")
+        ff = flashflood.FlashFlood(s3, infra.get_env("S3_BUCKET"), f"flashflood-test-concurrency-{uuid4()}")
+        try:
+            ff.put(os.urandom(10))
+            ff.journal(minimum_number_of_events=1)
+            self.assertEqual(1, len(list(ff.replay())))
+            metrics = flashflood.get_controller().metrics()
+            self.assertIn(partition_prefix(ff.bucket.name, ff._journal_pfx), metrics)
+            self.assertEqual(ff.stats.requests(), sum(m['requests'] for m in metrics.values()))
+        finally:
+            ff._destroy()
+
+
+class _ThrottlingHandler(BaseHTTPRequestHandler):
+    """
+    Serve `body`, with ranges, after responding `number_of_throttles` times with 503 SlowDown.
+    """
+    body = json.dumps(dict(events=list(range(20)))).encode("utf-8")
+    number_of_throttles = 0
+
+    def do_GET(self):
+        if _ThrottlingHandler.number_of_throttles:
+            _ThrottlingHandler.number_of_throttles -= 1
+            body, status = b"<Error><Code>SlowDown</Code></Error>", 503
+        elif "Range" in self.headers:
+            start, end = self.headers['Range'].split("=")[1].split("-")
+            body, status = self.body[int(start):int(end) + 1], 206
+        else:
+            body, status = self.body, 200
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+if __name__ == '__main__':
+    unittest.main()
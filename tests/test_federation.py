@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+import os
+import sys
+from uuid import uuid4
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.exceptions import FlashFloodEventNotFound
+from tests import infra, random_date
+
+
+class TestFederation(unittest.TestCase):
+    def setUp(self):
+        s3 = boto3.resource("s3")
+        self.members = [flashflood.FlashFlood(s3, infra.get_env("S3_BUCKET"), f"flashflood-test-federation-{uuid4()}")
+                        for _ in range(3)]
+        self.federation = flashflood.Federation(self.members)
+
+    def tearDown(self):
+        for member in self.members:
+            member._destroy()
+
+    def test_federation(self):
+        events = [self.federation.put(os.urandom(8), date=random_date()) for _ in range(12)]
+        with self.subTest("put is routed by event id"):
+            for event in events:
+                member = self.members[flashflood.shard_by_event_id(event.event_id, 3)]
+                self.assertTrue(member.event_exists(event.event_id))
+                self.assertTrue(self.federation.event_exists(event.event_id))
+        with self.subTest("get_event probes members"):
+            for event in events:
+                self.assertEqual(event, self.federation.get_event(event.event_id))
+            with self.assertRaises(FlashFloodEventNotFound):
+                self.federation.get_event(str(uuid4()))
+            self.assertFalse(self.federation.event_exists(str(uuid4())))
+        for member in self.members:
+            member.journal(minimum_number_of_events=1)
+        expected = sorted(events, key=lambda e: e.date)
+        with self.subTest("replay merges members by date"):
+            self.assertEqual(expected, list(self.federation.replay()))
+            from_date, to_date = expected[2].date, expected[8].date
+            self.assertEqual(expected[3:9], list(self.federation.replay(from_date, to_date)))
+        with self.subTest("list_event_streams merges members by date"):
+            event_streams = list(self.federation.list_event_streams(include_events=False))
+            self.assertEqual(sorted(event_streams, key=lambda es: es['from_date']), event_streams)
+            self.assertEqual(sum(len(list(m.list_journals())) for m in self.members), len(event_streams))
+        with self.subTest("replay stops early"):
+            replay = self.federation.replay()
+            self.assertEqual(expected[0], next(replay))
+            replay.close()
+
+    def test_shard(self):
+        federation = flashflood.Federation(self.members, shard=lambda event_id, data: data[0])
+        event = federation.put(b"\x01 event")
+        self.assertTrue(self.members[1].event_exists(event.event_id))
+        with self.assertRaises(ValueError):
+            federation.put(b"\x03 event")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,9 @@ import unittest
 import boto3
 import json
 import time
+import tempfile
+from datetime import datetime, timedelta
+import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from random import randint
 
@@ -13,7 +16,10 @@ pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noq
 sys.path.insert(0, pkg_root)  # noqa
 
 import flashflood
+from flashflood import tracing
 from flashflood.util import datetime_from_timestamp, delete_keys
+from flashflood.checkpoint import ReplayCheckpoint, LocalCheckpointStore
+from flashflood.identifiers import JournalID
 from flashflood.exceptions import FlashFloodException, FlashFloodEventNotFound, FlashFloodEventExistsError
 from tests import infra, random_date
 
@@ -104,6 +110,64 @@ class TestFlashFlood(unittest.TestCase):
             self.flashflood.journal(minimum_number_of_events=number_of_events)
             self._find_event_test(event_id, should_find_event_in_replay=False, should_find_event_in_lookup=False)
 
+    def test_multiple_updates_to_event(self):
+        events = self.generate_events(3, journal=True)
+        event_id, deleted_event_id = list(events.keys())[:2]
+        for i in range(3):
+            self.flashflood.update_event(event_id, b"data %d" % i)
+        self.flashflood.update_event(deleted_event_id, b"stale data")
+        self.flashflood.delete_event(deleted_event_id)
+        tracer = tracing.RecordingTracer()
+        tracing.set_tracer(tracer)
+        try:
+            self.assertEqual(2, self.flashflood.update())
+        finally:
+            tracing.set_tracer(None)
+        self.assertEqual(1, len([s for s in tracer.spans if "flashflood.update.fetch" == s.name]))
+        self.assertEqual([], list(self.flashflood._JournalUpdate.list()))
+        self._find_event_test(event_id, b"data 2")
+        self._find_event_test(deleted_event_id, should_find_event_in_replay=False, should_find_event_in_lookup=False)
+        self.assertEqual(0, self.flashflood.update())
+
+    def test_apply_pending_updates(self):
+        events = sorted(self.generate_events(6, journal=False).values(), key=lambda e: e.date)
+        for _ in range(3):
+            self.flashflood.journal(minimum_number_of_events=2)
+        updated, deleted = events[1], events[4]
+        self.flashflood.update_event(updated.event_id, b"new data")
+        self.flashflood.delete_event(deleted.event_id)
+        expected = [e for e in events if e is not deleted]
+        expected[1] = flashflood.Event(updated.event_id, updated.date, b"new data")
+        with self.subTest("replay applies pending updates when asked"):
+            self.assertEqual(events, list(self.flashflood.replay()))
+            self.assertEqual(expected, list(self.flashflood.replay(apply_pending_updates=True)))
+            self.assertEqual(expected[1:], list(self.flashflood.replay(from_date=events[0].date,
+                                                                       apply_pending_updates=True)))
+        with self.subTest("checkpoints are unaffected"):
+            pairs = list(self.flashflood.replay_with_checkpoints(apply_pending_updates=True))
+            self.assertEqual(expected, [event for event, _ in pairs])
+            resumed = list(self.flashflood.replay(checkpoint=pairs[2][1], apply_pending_updates=True))
+            self.assertEqual(expected[3:], resumed)
+        with self.subTest("get_event applies pending updates when asked"):
+            self.assertEqual(updated, self.flashflood.get_event(updated.event_id))
+            self.assertEqual(expected[1], self.flashflood.get_event(updated.event_id, apply_pending_updates=True))
+            with self.assertRaises(flashflood.FlashFloodEventNotFound):
+                self.flashflood.get_event(deleted.event_id, apply_pending_updates=True)
+        with self.subTest("get_event does not read journal data overridden by pending updates"):
+            def read_range(*args, **kwargs):
+                raise AssertionError("Journal data should not be read")
+
+            self.flashflood._Journal.read_range = read_range
+            try:
+                self.assertEqual(expected[1], self.flashflood.get_event(updated.event_id, apply_pending_updates=True))
+                with self.assertRaises(flashflood.FlashFloodEventNotFound):
+                    self.flashflood.get_event(deleted.event_id, apply_pending_updates=True)
+            finally:
+                del self.flashflood._Journal.read_range
+        self.flashflood.update()
+        self.assertEqual(expected, list(self.flashflood.replay()))
+        self.assertEqual(expected, list(self.flashflood.replay(apply_pending_updates=True)))
+
     def _find_event_test(self,
                          event_id: str,
                          expected_data: bytes=None,
@@ -208,6 +272,7 @@ class TestFlashFlood(unittest.TestCase):
             for event in retrieved_events:
                 self.assertGreater(event.date, from_date)
                 self.assertLessEqual(event.date, to_date)
+                self.assertEqual(events[event.event_id].data, event.data)
             self.assertEqual(len(dates) - 2, len(retrieved_events))
 
         with self.subTest("events via urls should be returned in order with date > from_date"):
@@ -241,6 +306,143 @@ class TestFlashFlood(unittest.TestCase):
         for event in events[4:]:
             self.assertIn(event, retrieved_events)
 
+    def test_parallel_replay(self):
+        events = self.generate_events(6)
+        events.update(self.generate_events(4, journal=False))
+        with self.subTest("Unordered replay should produce all events"):
+            replayed = [e for e in self.flashflood.parallel_replay(number_of_processes=3)]
+            self.assertEqual(sorted(events), sorted(e.event_id for e in replayed))
+            for event in replayed:
+                self.assertEqual(events[event.event_id].data, event.data)
+        with self.subTest("Ordered replay should merge events by date"):
+            event_streams = [es for es in self.flashflood.list_event_streams()]
+            replayed = [e for e in flashflood.parallel_replay_event_streams(event_streams,
+                                                                            number_of_processes=2,
+                                                                            ordered=True,
+                                                                            buffer_size=8)]
+            self.assertEqual(sorted(events.values(), key=lambda e: e.date), replayed)
+        with self.subTest("Replay should fail if a worker dies"):
+            event_streams = [es for es in self.flashflood.list_event_streams()]
+            event_streams[1] = _DyingEventStream()
+            for ordered in (False, True):
+                with self.assertRaises(FlashFloodException):
+                    list(flashflood.parallel_replay_event_streams(event_streams,
+                                                                  number_of_processes=2,
+                                                                  ordered=ordered,
+                                                                  poll_interval=0.1))
+
+    def test_plan_replay(self, n_shards=3):
+        events = self.generate_events(12, journal=False)
+        self.flashflood.journal(minimum_number_of_events=12)
+        expected = [e.event_id for e in self.flashflood.replay()]
+        total_size = sum(len(e.data) for e in events.values())
+        shards = self.flashflood.plan_replay(n_shards=n_shards)
+        with self.subTest("Shards should be roughly equal in size"):
+            self.assertEqual(n_shards, len(shards))
+            self.assertEqual(total_size, sum(es['size'] for shard in shards for es in shard))
+            for shard in shards:
+                self.assertLessEqual(sum(es['size'] for es in shard), 2 * -(-total_size // n_shards))
+        with self.subTest("Range headers should fetch sub-stream bytes"):
+            for shard in shards:
+                for event_stream in shard:
+                    resp = requests.get(event_stream['stream_url'], headers=event_stream['headers'])
+                    self.assertEqual(b"".join(events[e['event_id']].data for e in event_stream['events']),
+                                     resp.content)
+        with self.subTest("Replaying all shards should produce all events"):
+            replayed = [event
+                        for shard in shards
+                        for event_stream in shard
+                        for event in flashflood.replay_event_stream(event_stream)]
+            self.assertEqual(sorted(expected), sorted(e.event_id for e in replayed))
+            for event in replayed:
+                self.assertEqual(events[event.event_id].data, event.data)
+        with self.subTest("Checkpoints should carry journal positions"):
+            event_streams = sorted((es for shard in shards for es in shard),
+                                   key=lambda es: (es['journal_id'], es['first_event_index']))
+            _, checkpoint = [r for r in flashflood.replay_event_stream_with_checkpoints(event_streams[0])][-1]
+            remaining = [e.event_id
+                         for es in event_streams
+                         for e in flashflood.replay_event_stream(es, checkpoint=checkpoint)]
+            self.assertEqual(expected[checkpoint.event_index:], remaining)
+
+    def test_replay_checkpoints(self):
+        self.generate_events(6)
+        self.generate_events(3, journal=False)
+        replay = [(event, checkpoint) for event, checkpoint in self.flashflood.replay_with_checkpoints()]
+        events = [event for event, _ in replay]
+        with self.subTest("Replay should resume after checkpoint"):
+            for i in [0, 2, 5, 7]:
+                _, checkpoint = replay[i]
+                resumed_events = [e for e in self.flashflood.replay(checkpoint=checkpoint)]
+                number_of_replayed_events = len(resumed_events) - len(events[i + 1:])
+                self.assertEqual(events[i + 1:], resumed_events[number_of_replayed_events:])
+                # Events may be replayed again from journals overlapping the checkpoint journal
+                for event in resumed_events[:number_of_replayed_events]:
+                    self.assertIn(event, events[:i + 1])
+        with self.subTest("Event stream replay should resume after checkpoint"):
+            for event_stream in self.flashflood.list_event_streams():
+                stream_replay = [r for r in flashflood.replay_event_stream_with_checkpoints(event_stream)]
+                _, checkpoint = stream_replay[0]
+                self.assertEqual([event for event, _ in stream_replay[1:]],
+                                 [e for e in flashflood.replay_event_stream(event_stream, checkpoint=checkpoint)])
+        with self.subTest("Replay should not skip events moved by journaling"):
+            positions = [[i for i, (_, checkpoint) in enumerate(replay)
+                          if is_new == ("new" == JournalID(checkpoint.journal_id).version)][0]
+                         for is_new in (True, False)]
+            self.flashflood.journal(minimum_number_of_events=3)
+            for i in positions:
+                _, checkpoint = replay[i]
+                resumed_event_ids = [e.event_id for e in self.flashflood.replay(checkpoint=checkpoint)]
+                for event in events[i + 1:]:
+                    self.assertIn(event.event_id, resumed_event_ids)
+
+    def test_replay_checkpoints_at_shared_timestamp(self):
+        date = random_date()
+        events = [self.flashflood.put(self._random_data(), date=date) for _ in range(3)]
+        replay = list(self.flashflood.replay_with_checkpoints())
+        self.assertEqual(sorted(e.event_id for e in events), sorted(e.event_id for e, _ in replay))
+        _, checkpoint = replay[0]
+        self.flashflood.journal(minimum_number_of_events=3)
+        self.assertEqual([e.event_id for e, _ in replay[1:]],
+                         [e.event_id for e in self.flashflood.replay(checkpoint=checkpoint)])
+        _, checkpoint = list(self.flashflood.replay_with_checkpoints())[1]
+        self.assertEqual(2, len(checkpoint.consumed))
+        self.assertEqual([replay[2][0].event_id], [e.event_id for e in self.flashflood.replay(checkpoint=checkpoint)])
+        for event_stream in self.flashflood.list_event_streams():
+            self.assertEqual([replay[2][0].event_id],
+                             [e.event_id for e in flashflood.replay_event_stream(event_stream, checkpoint=checkpoint)])
+
+    def test_replay_batches(self):
+        self.generate_events(12)
+        self.generate_events(3, journal=False)
+        events = [e for e in self.flashflood.replay()]
+        for buffer_size in [4, 32, 1024]:
+            with self.subTest(f"Batches should contain replayed events with buffer_size={buffer_size}"):
+                batched_events = [e for batch in self.flashflood.replay_batches(buffer_size=buffer_size)
+                                  for e in batch.events()]
+                self.assertEqual(events, batched_events)
+        with self.subTest("Batches should contain only events in range"):
+            dates = sorted(e.date for e in events)
+            from_date, to_date = dates[2], dates[-3]
+            batches = [b for b in self.flashflood.replay_batches(from_date, to_date, buffer_size=16)]
+            self.assertEqual([e.event_id for e in self.flashflood.replay(from_date, to_date)],
+                             [event_id for batch in batches for event_id in batch.event_ids])
+        with self.subTest("Batch items should be views of event data"):
+            for batch in self.flashflood.replay_batches():
+                for i in range(len(batch)):
+                    self.assertIsInstance(batch[i], memoryview)
+                    self.assertEqual(events[0].data, bytes(batch[i]))
+                    events.pop(0)
+
+    def test_checkpoint_stores(self):
+        checkpoint = ReplayCheckpoint("journal_id", 3, 2, "timestamp", ("event_id",))
+        with tempfile.TemporaryDirectory() as dirname:
+            for store in [self.flashflood.checkpoint_store(), LocalCheckpointStore(dirname)]:
+                with self.subTest(store.__class__.__name__):
+                    self.assertIsNone(store.load("consumer_group"))
+                    store.save("consumer_group", checkpoint)
+                    self.assertEqual(checkpoint, store.load("consumer_group"))
+
     def test_journal(self):
         self.generate_events(1, journal=False)
         with self.subTest("raise FlashFloodJournalingError when attempting to journal more new events than available"):
@@ -253,6 +455,82 @@ class TestFlashFlood(unittest.TestCase):
         with self.subTest("Should succeed when minimum number and size thresholds are met"):
             self.flashflood.journal(minimum_number_of_events=5, minimum_size=5)
 
+    def test_concurrent_journal(self, number_of_workers=3):
+        events = self.generate_events(12, journal=False)
+
+        def _journal():
+            ff = flashflood.FlashFlood(self.s3, self.bucket.name, self.root_pfx)
+            while True:
+                try:
+                    ff.journal(minimum_number_of_events=2, number_of_lease_attempts=10)
+                except flashflood.FlashFloodJournalingError:
+                    break
+
+        with ThreadPoolExecutor(max_workers=number_of_workers) as e:
+            for f in as_completed([e.submit(_journal) for _ in range(number_of_workers)]):
+                f.result()
+        with self.subTest("Each event should be journaled exactly once"):
+            replayed_event_ids = [event.event_id for event in self.flashflood.replay()]
+            self.assertEqual(sorted(events.keys()), sorted(replayed_event_ids))
+        with self.subTest("Events should be indexed to live journals"):
+            for event_id in events:
+                self.assertEqual(events[event_id].data, self.flashflood.get_event(event_id).data)
+        with self.subTest("Leases should be released"):
+            self.assertEqual(0, len(list(self.flashflood._JournalLease.list())))
+
+    def test_tail(self):
+        tail = self.flashflood.tail(minimum_poll_interval=0.1, maximum_poll_interval=0.5, maximum_idle_time=5)
+
+        def _put_events(number_of_events):
+            events = [self.flashflood.put(self._random_data()) for _ in range(number_of_events)]
+            return {e.event_id: e for e in events}
+
+        events = _put_events(3)
+        tailed_events = [next(tail) for _ in range(3)]
+        with self.subTest("Should follow new events"):
+            self.assertEqual(sorted(events.keys()), sorted(e.event_id for e in tailed_events))
+            for event in tailed_events:
+                self.assertEqual(events[event.event_id].data, event.data)
+        with self.subTest("Should yield each event once when journals are combined"):
+            events.update(_put_events(2))
+            self.flashflood.journal(minimum_number_of_events=4)
+            events.update(_put_events(2))
+            tailed_events.extend(tail)
+            self.assertEqual(sorted(events.keys()), sorted(e.event_id for e in tailed_events))
+        with self.subTest("Should list journals from a cursor after the first poll"):
+            list_froms = list()
+            list_journals = self.flashflood._Journal.list
+
+            def _list(list_from=None, search_range=None):
+                list_froms.append(list_from)
+                return list_journals(list_from, search_range)
+
+            self.flashflood._Journal.list = _list
+            try:
+                tail = self.flashflood.tail(minimum_poll_interval=0.1, maximum_idle_time=0.2, rescan_interval=None)
+                self.assertEqual(sorted(events.keys()), sorted(e.event_id for e in tail))
+            finally:
+                del self.flashflood._Journal.list
+            self.assertIsNone(list_froms[0])
+            self.assertGreater(len(list_froms), 1)
+            self.assertNotIn(None, list_froms[1:])
+        with self.subTest("Should follow events dated before events already yielded"):
+            tail = self.flashflood.tail(minimum_poll_interval=0.1, maximum_poll_interval=0.5, maximum_idle_time=2,
+                                        rescan_interval=0.2)
+            self.assertEqual(sorted(events.keys()), sorted(next(tail).event_id for _ in range(len(events))))
+            event = self.flashflood.put(self._random_data(), date=datetime.utcnow() - timedelta(days=1))
+            events[event.event_id] = event
+            self.assertEqual(event, next(tail))
+            self.flashflood.journal(minimum_number_of_events=1)
+            self.flashflood.update_event(event.event_id, self._random_data())
+            self.flashflood.update()
+            self.assertEqual([], list(tail))
+        with self.subTest("Should follow events after from_date"):
+            from_date = sorted(e.date for e in events.values())[3]
+            tail = self.flashflood.tail(from_date, minimum_poll_interval=0.1, maximum_idle_time=0.1)
+            self.assertEqual(sorted(e.event_id for e in events.values() if e.date > from_date),
+                             sorted(e.event_id for e in tail))
+
     def test_event_streams(self):
         events = dict()
         events.update(self.generate_events())
@@ -262,6 +540,18 @@ class TestFlashFlood(unittest.TestCase):
                             for event in flashflood.replay_event_stream(event_stream)}
         for event_id in events:
             self.assertEqual(events[event_id].data, retrieved_events[event_id].data)
+        with self.subTest("Compact event streams should describe journals without events"):
+            event_streams = [es for es in self.flashflood.list_event_streams()]
+            compact_event_streams = [es for es in self.flashflood.list_event_streams(include_events=False)]
+            for event_stream, compact_event_stream in zip(event_streams, compact_event_streams):
+                self.assertNotIn("events", compact_event_stream)
+                for key in ("journal_id", "from_date", "to_date", "size"):
+                    self.assertEqual(event_stream[key], compact_event_stream[key])
+                self.assertEqual(event_stream['events'],
+                                 flashflood.load_event_stream(compact_event_stream)['events'])
+        with self.subTest("Compact event streams should replay"):
+            self.assertEqual([e for es in event_streams for e in flashflood.replay_event_stream(es)],
+                             [e for es in compact_event_streams for e in flashflood.replay_event_stream(es)])
 
     def test_get_new_journals(self):
         number_of_events = 3
@@ -284,5 +574,12 @@ class TestFlashFlood(unittest.TestCase):
     def _random_data(self, lower_size_limit=1, upper_size_limit=10) -> bytes:
         return os.urandom(randint(lower_size_limit, upper_size_limit))
 
+class _DyingEventStream(dict):
+    def __getitem__(self, key):
+        os._exit(1)
+
+    def __contains__(self, key):
+        os._exit(1)
+
 if __name__ == '__main__':
     unittest.main()
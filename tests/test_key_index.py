@@ -6,6 +6,7 @@ import time
 import typing
 from uuid import uuid4
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 
@@ -32,7 +33,7 @@ class TestKeyIndex(unittest.TestCase):
     def setUp(self):
         class KeyIndex(BaseKeyIndex):
             bucket = self.bucket
-            _index_pfx = self.root_pfx
+            _pfx = f"{self.root_pfx}/{uuid4()}"
 
         self.index = KeyIndex
 
@@ -46,6 +47,50 @@ class TestKeyIndex(unittest.TestCase):
         for key, val in items.items():
             self.assertEqual(self.index.get(key), val)
 
+    def test_key_index_delete(self):
+        self.index.put("foo", "bar")
+        self.index.delete("foo")
+        self.assertIsNone(self.index.get("foo"))
+
+    def test_key_index_lookup_prefix(self):
+        self.index.put("foo", "bar")
+        self.index.put("foobar", "doom")
+        self.assertEqual(self.index.get("foo"), "bar")
+        self.assertEqual(self.index.get("foobar"), "doom")
+
+    def test_key_index_lookup_dash_suffix(self):
+        self.index.put("foo-", "bar")
+        self.assertIsNone(self.index.get("foo"))
+        self.index.put("foo", "doom")
+        self.assertEqual(self.index.get("foo-"), "bar")
+        self.assertEqual(self.index.get("foo"), "doom")
+        self.assertEqual([["foo-"], ["foo"]],
+                         [[entry.lookup for entry in entries] for entries in self.index.list_entries()])
+        self.index.delete("foo")
+        self.assertEqual(self.index.get("foo-"), "bar")
+
+    def test_key_index_concurrent_put(self, number_of_writers=8):
+        targets = [str(uuid4()) for _ in range(number_of_writers)]
+        with ThreadPoolExecutor(max_workers=number_of_writers) as e:
+            for f in [e.submit(self.index.put, "foo", target) for target in targets]:
+                f.result()
+        with self.subTest("The revision sorting last should win"):
+            keys = self.index._lookup_keys("foo")
+            self.assertIn(self.index.get("foo"), targets)
+            self.assertEqual(self.index.get("foo"), self.index._target_for_key(keys[-1]))
+        with self.subTest("Superseded revisions should be deleted by subsequent writes"):
+            self.index.put("foo", "bar")
+            self.assertEqual(1, len(self.index._lookup_keys("foo")))
+            self.assertEqual(self.index.get("foo"), "bar")
+
+    def test_key_index_legacy_revisions(self):
+        key = f"{self.index._pfx}/foo{self.index.DELIMITER}0000000001"
+        self.bucket.Object(key).upload_fileobj(io.BytesIO(b""), ExtraArgs=dict(Metadata=dict(target="bar")))
+        self.assertEqual(self.index.get("foo"), "bar")
+        self.index.put("foo", "doom")
+        self.assertEqual(self.index.get("foo"), "doom")
+        self.assertEqual(1, len(self.index._lookup_keys("foo")))
+
 
 if __name__ == '__main__':
     unittest.main()
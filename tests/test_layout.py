@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+import os
+import sys
+from uuid import uuid4
+from datetime import datetime, timedelta
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.util import date_partitions, concurrent_map
+from flashflood.objects import partition_for_journal
+from tests import infra
+
+
+class TestPartitions(unittest.TestCase):
+    def test_date_partitions(self):
+        start, end = datetime(2019, 12, 30, 23), datetime(2020, 1, 2)
+        self.assertEqual(["2019/12/30", "2019/12/31", "2020/01/01", "2020/01/02"],
+                         date_partitions("%Y/%m/%d", start, end))
+        self.assertEqual(["2019/12", "2020/01"], date_partitions("%Y/%m", start, end))
+        self.assertEqual([], date_partitions("%Y/%m/%d", end, start))
+
+    def test_partition_for_journal(self):
+        self.assertEqual("2008/02/24", partition_for_journal("%Y/%m/%d", "2008-02-24T215615.697022Z--new--a--b"))
+        self.assertEqual("2008/02", partition_for_journal("%Y/%m", "2008-02-24T215615.697022Z"))
+
+    def test_concurrent_map(self):
+        self.assertEqual([i * i for i in range(20)], list(concurrent_map(lambda i: i * i, range(20), 3)))
+
+
+class TestPartitionedLayout(unittest.TestCase):
+    def setUp(self):
+        self.s3 = boto3.resource("s3")
+        self.root_pfx = f"flashflood-test-layout-{uuid4()}"
+        self.flashflood = flashflood.FlashFlood(self.s3, infra.get_env("S3_BUCKET"), self.root_pfx,
+                                                partition_format="%Y/%m/%d")
+
+    def tearDown(self):
+        self.flashflood._destroy()
+
+    def _put_events(self, ff, first_day: datetime, number_of_days: int, events_per_day: int):
+        return [ff.put(os.urandom(5), date=first_day + timedelta(days=d, hours=h))
+                for d in range(number_of_days) for h in range(events_per_day)]
+
+    def test_layout(self):
+        ff = self.flashflood
+        events = self._put_events(ff, datetime(2019, 3, 30), 4, 3)
+        keys = [item.key for item in ff.storage.list(f"{ff._journal_pfx}/")]
+        self.assertEqual(12, len(keys))
+        self.assertTrue(all(key.startswith(f"{ff._journal_pfx}/2019/0") for key in keys))
+        self.assertEqual(events, list(ff.replay()))
+        with self.subTest("journals never span partitions"):
+            for _ in range(4):
+                ff.journal(minimum_number_of_events=3)
+            journal_ids = list(ff.list_journals())
+            self.assertEqual(4, len(journal_ids))
+            for journal_id in journal_ids:
+                self.assertEqual(journal_id.start_date.date(), journal_id.end_date.date())
+            with self.assertRaises(flashflood.FlashFloodJournalingError):
+                ff.journal(minimum_number_of_events=4)
+        with self.subTest("bounded replay lists overlapping partitions"):
+            from_date, to_date = datetime(2019, 3, 30, 12), datetime(2019, 4, 1, 1)
+            with ff.measure() as m:
+                replayed = list(ff.replay(from_date, to_date))
+            self.assertEqual([e for e in events if from_date < e.date <= to_date], replayed)
+            self.assertEqual(3, m.requests("LIST"))
+        with self.subTest("updates are partitioned with their journal"):
+            ff.update_event(events[4].event_id, b"new data")
+            ff.delete_event(events[7].event_id)
+            update_keys = [item.key for item in ff.storage.list(f"{ff._update_pfx}/")]
+            self.assertEqual([f"{ff._update_pfx}/2019/03/31", f"{ff._update_pfx}/2019/04/01"],
+                             [key.rsplit("/", 1)[0] for key in update_keys])
+            self.assertEqual(2, ff.update())
+            replayed = {e.event_id: e.data for e in ff.replay()}
+            self.assertEqual(b"new data", replayed[events[4].event_id])
+            self.assertNotIn(events[7].event_id, replayed)
+            self.assertEqual(b"new data", ff.get_event(events[4].event_id).data)
+
+    def test_journal_closed_partitions(self):
+        ff = self.flashflood
+        events = self._put_events(ff, datetime(2019, 3, 30), 3, 3)
+        for _ in range(3):
+            ff.journal(minimum_number_of_events=5)
+        journal_ids = list(ff.list_journals())
+        self.assertEqual(3, len(journal_ids))
+        self.assertNotIn("new", [journal_id.version for journal_id in journal_ids])
+        self.assertEqual(events, list(ff.replay()))
+        with self.assertRaises(flashflood.FlashFloodJournalingError):
+            ff.journal(minimum_number_of_events=5)
+        with self.subTest("the current partition is combined only above the minimums"):
+            ff.put(os.urandom(5))
+            with self.assertRaises(flashflood.FlashFloodJournalingError):
+                ff.journal(minimum_number_of_events=5)
+
+    def test_migrate_layout(self):
+        flat = flashflood.FlashFlood(self.s3, infra.get_env("S3_BUCKET"), self.root_pfx)
+        events = self._put_events(flat, datetime(2019, 12, 30), 3, 2)
+        flat.journal(minimum_number_of_events=4)
+        flat.update_event(events[-1].event_id, b"new data")
+        self.assertEqual(3 + 1, self.flashflood.migrate_layout(None))
+        self.assertEqual([], list(flat.list_journals()))
+        self.assertEqual(4, len(list(self.flashflood.list_journals())))  # the journal spanning two days was split
+        self.assertEqual(events, list(self.flashflood.replay()))
+        from_date, to_date = datetime(2019, 12, 30, 12), datetime(2019, 12, 31, 12)
+        self.assertEqual(events[2:4], list(self.flashflood.replay(from_date, to_date)))
+        self.assertEqual(1, self.flashflood.update())
+        self.assertEqual(b"new data", self.flashflood.get_event(events[-1].event_id).data)
+        self.assertEqual(4, flat.migrate_layout("%Y/%m/%d"))
+        self.assertEqual([], list(self.flashflood.list_journals()))
+        self.assertEqual([e.event_id for e in events], [e.event_id for e in flat.replay()])
+        with self.assertRaises(ValueError):
+            self.flashflood.migrate_layout("%Y/%W/%d")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+import os
+import sys
+import time
+import typing
+from uuid import uuid4
+from datetime import timedelta
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+from flashflood.lease import BaseJournalLease
+from flashflood.identifiers import JournalID, JournalLeaseID
+from flashflood.util import concurrent_listing, delete_keys, datetime_to_timestamp, timestamp_now
+from tests import infra, random_date
+
+
+class TestJournalLease(unittest.TestCase):
+    bucket: typing.Any = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.root_pfx = f"flashflood-test-lease-{uuid4()}"
+        cls.s3 = boto3.resource("s3")
+        cls.bucket = cls.s3.Bucket(infra.get_env("S3_BUCKET"))
+
+    @classmethod
+    def tearDownClass(cls):
+        keys_to_delete = [item.key for item in concurrent_listing(cls.bucket, [f"{cls.root_pfx}/"])]
+        delete_keys(cls.bucket, keys_to_delete)
+
+    def setUp(self):
+        class JournalLease(BaseJournalLease):
+            bucket = self.bucket
+            s3_client = self.s3.meta.client
+            _pfx = f"{self.root_pfx}/{uuid4()}"
+
+        self.JournalLease = JournalLease
+        self.journal_ids = sorted(_random_journal_id() for _ in range(6))
+
+    def test_lease_id(self):
+        expiration_timestamp = timestamp_now()
+        lease_id = JournalLeaseID.make(self.journal_ids[0], self.journal_ids[-1], expiration_timestamp, "owner")
+        self.assertEqual(self.journal_ids[0], lease_id.first_journal_id)
+        self.assertEqual(self.journal_ids[-1], lease_id.last_journal_id)
+        self.assertEqual("owner", lease_id.owner)
+        self.assertEqual(expiration_timestamp, datetime_to_timestamp(lease_id.expiration_date))
+
+    def test_acquire(self):
+        lease = self.JournalLease.acquire(self.journal_ids[:3], 60)
+        with self.subTest("Lease should cover its range of journals"):
+            self.assertIsNotNone(lease)
+            for journal_id in self.journal_ids[:3]:
+                self.assertTrue(lease.covers(journal_id))
+            for journal_id in self.journal_ids[3:]:
+                self.assertFalse(lease.covers(journal_id))
+        with self.subTest("Should not be able to lease overlapping journals"):
+            self.assertIsNone(self.JournalLease.acquire(self.journal_ids[2:4], 60))
+            self.assertEqual([lease.id_], [other.id_ for other in self.JournalLease.list()])
+        with self.subTest("Should be able to lease disjoint journals"):
+            self.assertIsNotNone(self.JournalLease.acquire(self.journal_ids[3:], 60))
+        with self.subTest("Should be able to lease journals after release"):
+            lease.release()
+            self.assertIsNotNone(self.JournalLease.acquire(self.journal_ids[:3], 60))
+
+    def test_expiration(self):
+        lease = self.JournalLease.acquire(self.journal_ids, 1)
+        self.assertIsNotNone(lease)
+        time.sleep(1.5)
+        with self.subTest("Expired leases should not be listed"):
+            self.assertTrue(lease.is_expired)
+            self.assertEqual(0, len(list(self.JournalLease.list())))
+        with self.subTest("Should be able to lease journals covered by an expired lease"):
+            self.assertIsNotNone(self.JournalLease.acquire(self.journal_ids, 60))
+
+
+def _random_journal_id():
+    start_date = random_date()
+    return JournalID.make(datetime_to_timestamp(start_date),
+                          datetime_to_timestamp(start_date + timedelta(days=1)),
+                          "test_version",
+                          str(uuid4()))
+
+if __name__ == '__main__':
+    unittest.main()
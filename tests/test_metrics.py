@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+import os
+import sys
+from uuid import uuid4
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.metrics import RequestStats, attributed, submit, LATENCY_BUCKETS, UNATTRIBUTED
+from tests import infra
+
+
+class TestRequestStats(unittest.TestCase):
+    def test_record(self):
+        stats = RequestStats()
+        stats.record("GET", 10, 0.0001)
+        stats.record("GET", 5, 100)
+        stats.record("PUT", 3, 0.003)
+        self.assertEqual(3, stats.requests())
+        self.assertEqual(2, stats.requests("GET"))
+        self.assertEqual(15, stats.bytes_transferred("GET"))
+        histogram = stats.histogram("GET")
+        self.assertEqual(len(LATENCY_BUCKETS) + 1, len(histogram))
+        self.assertEqual(1, histogram[0])
+        self.assertEqual(1, histogram[-1])
+        self.assertEqual(dict(count=1, bytes=3, seconds=0.003, histogram=stats.histogram("PUT")),
+                         stats.to_dict()[UNATTRIBUTED]['PUT'])
+
+    def test_measure(self):
+        stats = RequestStats()
+        stats.record("GET")
+        with stats.measure() as m:
+            stats.record("PUT")
+        stats.record("PUT")
+        self.assertEqual(1, m.requests())
+        self.assertEqual(1, m.requests("PUT"))
+        self.assertEqual(3, stats.requests())
+
+    def test_attribution(self):
+        stats = RequestStats()
+
+        class Thing:
+            @attributed
+            def outer(self):
+                stats.record("GET")
+                self.inner()
+                with ThreadPoolExecutor() as e:
+                    submit(e, stats.record, "DELETE").result()
+
+            @attributed
+            def inner(self):
+                stats.record("PUT")
+
+            @attributed
+            def events(self):
+                for i in range(2):
+                    stats.record("LIST")
+                    yield i
+
+        thing = Thing()
+        thing.outer()
+        thing.inner()
+        for _ in thing.events():
+            stats.record("HEAD")
+        self.assertEqual(dict(outer=["DELETE", "GET", "PUT"], inner=["PUT"], events=["LIST"], unattributed=["HEAD"]),
+                         {method: sorted(ops) for method, ops in stats.to_dict().items()})
+        self.assertEqual(2, stats.requests("LIST", method="events"))
+
+
+class TestFlashFloodMetrics(unittest.TestCase):
+    def test_measure(self):
+        s3 = boto3.resource("s3")
+        ff = flashflood.FlashFlood(s3, infra.get_env("S3_BUCKET"), f"flashflood-test-metrics-{uuid4()}")
+        try:
+            with ff.measure() as m:
+                events = [ff.put(os.urandom(10)) for _ in range(3)]
+            self.assertEqual({"put"}, set(m.to_dict()))
+            self.assertEqual(9, m.requests("PUT", method="put"))  # blob, manifest and index entry per event
+            self.assertGreater(m.bytes_transferred("PUT", method="put"), 3 * 10)
+            ff.journal(minimum_number_of_events=3)
+            with ff.measure() as m:
+                self.assertEqual(events, list(ff.replay()))
+                for event in events:
+                    ff.get_event(event.event_id)
+            self.assertEqual(2, m.requests("GET", method="replay"))  # manifest and blob
+            self.assertEqual(1, m.requests("LIST", method="replay"))
+            self.assertEqual(4, m.requests("GET", method="get_event"))  # one cached manifest and a range per event
+            self.assertEqual(3, m.requests("LIST", method="get_event"))  # index lookups
+            self.assertGreater(m.bytes_transferred("GET", method="get_event"), 3 * 10)
+            self.assertGreater(ff.stats.requests(method="journal"), 0)
+            self.assertEqual(0, ff.stats.requests(method=UNATTRIBUTED))
+        finally:
+            ff._destroy()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,10 +15,10 @@ import boto3
 pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
 sys.path.insert(0, pkg_root)  # noqa
 
-from flashflood.objects import BaseJournal, BaseJournalUpdate
+from flashflood.objects import EventTable, BaseJournal, BaseJournalUpdate, JournalUpdates
 from flashflood.identifiers import JournalID, JournalUpdateID, JournalUpdateAction, TOMBSTONE_SUFFIX
-from flashflood.util import concurrent_listing, delete_keys, datetime_to_timestamp, timestamp_now
-from flashflood.exceptions import FlashFloodException, FlashFloodJournalUploadError
+from flashflood.util import concurrent_listing, delete_keys, datetime_to_timestamp, timestamp_now, LRUCache
+from flashflood.exceptions import FlashFloodException, FlashFloodEventNotFound, FlashFloodJournalUploadError
 from tests import infra, random_date
 
 
@@ -142,6 +142,42 @@ class TestObjects(unittest.TestCase):
             e = journal.get_event(event_id)
             self.assertEqual(e.data, self.event_data[event_id])
 
+    def test_event_table(self):
+        table = EventTable(self.events)
+        with self.subTest("Iteration should produce manifest events"):
+            self.assertEqual(3, len(table))
+            self.assertEqual(self.events, list(table))
+            self.assertEqual(self.events, table.to_list())
+            self.assertEqual(self.events[1], table[1])
+        with self.subTest("Extend should shift offsets"):
+            table.extend(EventTable(self.events), len(self.journal_data))
+            self.assertEqual(self.events + [{**e, **dict(offset=e['offset'] + len(self.journal_data))}
+                                            for e in self.events],
+                             list(table))
+        with self.subTest("Journal manifest should round trip through uploads"):
+            journal = self.Journal.from_key(self.journal.upload())
+            self.assertIsInstance(journal.events, EventTable)
+            self.assertEqual(self.events, journal.manifest()['events'])
+
+    def test_journal_get_event_cached(self):
+        class Journal(self.Journal):
+            manifest_cache = LRUCache(2)
+
+        key = self.journal.upload()
+        journal = Journal.from_key(key, use_cache=True)
+        with self.subTest("Cached manifests should be shared"):
+            self.assertIs(journal.events, Journal.from_key(key, use_cache=True).events)
+            self.assertIsNot(journal.events, Journal.from_key(key).events)
+        with self.subTest("Events should be found through cached manifest"):
+            for event_info in self.events:
+                event_id = event_info['event_id']
+                self.assertEqual(self.events.index(event_info), journal.events.position(event_id))
+                self.assertEqual(self.event_data[event_id], journal.get_event(event_id).data)
+        with self.subTest("Missing events should raise"):
+            self.assertIsNone(journal.events.position("not-an-event"))
+            with self.assertRaises(FlashFloodEventNotFound):
+                journal.get_event("not-an-event")
+
     def test_list_journals(self):
         """
         Test that journals are listed omitting old versions and tombstones.
@@ -253,6 +289,34 @@ class TestObjects(unittest.TestCase):
                 del expected_updates[journal_id]
             self.assertEqual(0, len(expected_updates))
 
+    def test_journal_updates_resolution(self):
+        class JournalUpdate(BaseJournalUpdate):
+            bucket = self.bucket
+            s3_client = self.Journal.s3_client
+            _pfx = f"{self.root_pfx}/test_journal_updates_resolution"
+
+        journal_id, event_id = _random_journal_id(), str(uuid4())
+
+        def _update(timestamp: str, action: JournalUpdateAction) -> BaseJournalUpdate:
+            return JournalUpdate(JournalUpdateID(JournalUpdateID.DELIMITER.join(
+                [journal_id[::-1], event_id, timestamp, action.name])))
+
+        older = _update("2019-01-01T000000.000000Z", JournalUpdateAction.UPDATE)
+        newer = _update("2019-01-02T000000.000000Z", JournalUpdateAction.UPDATE)
+        delete = _update("2019-01-02T000000.000000Z", JournalUpdateAction.DELETE)
+        for ordering in [[older, newer, delete], [delete, newer, older], [newer, delete, older]]:
+            updates = JournalUpdates()
+            for update in ordering:
+                updates.add(update)
+            self.assertEqual({event_id: delete}, updates)
+            self.assertEqual({older, newer}, set(updates.superseded))
+            self.assertEqual({older, newer, delete}, set(updates.markers()))
+        updates = JournalUpdates()
+        updates.add(newer)
+        updates.add(older)
+        self.assertEqual({event_id: newer}, updates)
+        self.assertEqual([older], updates.superseded)
+
     def _generate_and_upload_test_updates(self, pfx: str, number_of_updates: int=50):
         living_updates = list()
         dead_updates = list()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+import os
+import sys
+from uuid import uuid4
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.identifiers import JournalID
+from tests import infra
+
+
+class TestReindex(unittest.TestCase):
+    def setUp(self):
+        self.flashflood = flashflood.FlashFlood(boto3.resource("s3"),
+                                                infra.get_env("S3_BUCKET"),
+                                                f"flashflood-test-reindex-{uuid4()}")
+
+    def tearDown(self):
+        self.flashflood._destroy()
+
+    def test_rebuild_index(self):
+        ff = self.flashflood
+        events = [ff.put(os.urandom(8)) for _ in range(8)]
+        ff.journal(minimum_number_of_events=4)
+        ff.delete_event(events[7].event_id)
+        report = ff.verify_index()
+        self.assertTrue(report.is_consistent)
+        self.assertEqual(7, report.number_of_entries)
+        # Corrupt the index: remove two entries, retarget one, and add an entry for an unknown event
+        journal_id = ff._KeyIndex.get(events[2].event_id)
+        ff.storage.delete(ff._KeyIndex._lookup_keys(events[0].event_id) + ff._KeyIndex._lookup_keys(events[1].event_id))
+        ff._KeyIndex._write(events[2].event_id, str(uuid4()))
+        ghost_key = ff._KeyIndex._write("ghost", journal_id)
+        progress = list()
+        report = ff.verify_index(chunk_size=3, progress=progress.append, progress_interval=0)
+        self.assertEqual(2, report.missing)
+        self.assertEqual(1, report.stale)
+        self.assertEqual(1, report.dangling)
+        self.assertEqual([ghost_key], report.dangling_keys)
+        self.assertEqual(1, report.orphaned)
+        self.assertEqual(1, len(report.orphaned_keys))
+        self.assertEqual(5 + 1, report.number_of_entries)
+        self.assertGreater(len(progress), 0)
+        self.assertEqual(0, progress[-1].number_of_writes)
+        self.assertEqual([], ff.verify_index(sample_size=0).dangling_keys)
+        self.assertFalse(ff.event_exists(events[0].event_id))
+        report = ff.rebuild_index(chunk_size=3)
+        self.assertEqual((2, 1), (report.missing, report.stale))
+        self.assertTrue(ff.verify_index().is_consistent)
+        for event in events[:7]:
+            self.assertEqual(event, ff.get_event(event.event_id))
+        self.assertEqual(JournalID(journal_id), ff._KeyIndex.get(events[2].event_id))
+        self.assertIsNone(ff._KeyIndex.get("ghost"))
+        self.assertFalse(ff.event_exists(events[7].event_id))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import io
+import os
+import sys
+import tempfile
+from uuid import uuid4
+import unittest
+
+import boto3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.storage import S3Storage, FilesystemStorage, MemoryStorage
+from flashflood.exceptions import FlashFloodObjectNotFound
+from tests import infra
+
+
+class TestStorage(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = boto3.resource("s3")
+        cls.bucket = cls.s3.Bucket(infra.get_env("S3_BUCKET"))
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.storages = dict(s3=S3Storage(self.bucket, self.s3.meta.client),
+                             filesystem=FilesystemStorage(self.tempdir.name),
+                             memory=MemoryStorage())
+        self.root_pfx = f"flashflood-test-storage-{uuid4()}"
+
+    def tearDown(self):
+        storage = self.storages['s3']
+        storage.delete([item.key for item in storage.list(f"{self.root_pfx}/")])
+        self.tempdir.cleanup()
+
+    def test_objects(self):
+        for name, storage in self.storages.items():
+            with self.subTest(storage=name):
+                key = f"{self.root_pfx}/{name}/foo"
+                data = os.urandom(100)
+                storage.put(key, data, metadata=dict(target="bar"))
+                self.assertEqual(data, storage.get(key))
+                self.assertEqual(data[10:20], storage.get_range(key, 10, 20).read())
+                self.assertEqual(data[90:], storage.get_range(key, 90).read())
+                self.assertEqual(100, storage.size(key))
+                self.assertEqual(dict(target="bar"), storage.metadata(key))
+                storage.put(key, io.BytesIO(data[:10]))
+                self.assertEqual(data[:10], storage.get(key))
+                storage.put(f"{key}.dead", tagging=dict(garbage="true"))
+                storage.update_tagging(key, dict(garbage="true"))
+                self.assertEqual(b"", storage.get(f"{key}.dead"))
+                storage.delete([key, f"{key}.dead", f"{key}.missing"])
+                with self.assertRaises(FlashFloodObjectNotFound):
+                    storage.get(key)
+                with self.assertRaises(FlashFloodObjectNotFound):
+                    storage.size(key)
+
+    def test_list(self):
+        suffixes = ["a.dead", "a/b", "a/c", "ab", "b/c/d", "c", "d" * 300, f"{'d' * 300}e"]
+        for name, storage in self.storages.items():
+            with self.subTest(storage=name):
+                pfx = f"{self.root_pfx}/{name}"
+                for suffix in suffixes:
+                    storage.put(f"{pfx}/{suffix}", suffix.encode("utf-8"))
+                listed = [item.key[len(pfx) + 1:] for item in storage.list(f"{pfx}/")]
+                self.assertEqual(suffixes, listed)
+                self.assertEqual([len(s) for s in suffixes], [item.size for item in storage.list(f"{pfx}/")])
+                listed = [item.key[len(pfx) + 1:] for item in storage.list(f"{pfx}/a", marker=f"{pfx}/a/b")]
+                self.assertEqual(["a/c", "ab"], listed)
+                listed = [item.key[len(pfx) + 1:] for item in storage.list(f"{pfx}/", marker=f"{pfx}/b")]
+                self.assertEqual(["b/c/d", "c", "d" * 300, f"{'d' * 300}e"], listed)
+                self.assertEqual([], list(storage.list(f"{pfx}/x")))
+
+    def test_flashflood(self):
+        for name, storage in self.storages.items():
+            if "s3" == name:
+                continue
+            with self.subTest(storage=name):
+                ff = flashflood.FlashFlood(None, None, self.root_pfx, storage=storage)
+                events = [ff.put(os.urandom(5)) for _ in range(7)]
+                ff.journal(minimum_number_of_events=4)
+                ff.journal(minimum_number_of_events=3)
+                self.assertEqual(2, len(list(ff.list_journals())))
+                ff.update_event(events[1].event_id, b"updated")
+                ff.delete_event(events[2].event_id)
+                ff.update()
+                events[1] = events[1]._replace(data=b"updated")
+                del events[2]
+                self.assertEqual(events, list(ff.replay()))
+                for event in events:
+                    self.assertEqual(event, ff.get_event(event.event_id))
+                ff._destroy()
+                self.assertEqual([], list(storage.list(f"{self.root_pfx}/")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+import io
+import os
+import sys
+from uuid import uuid4
+import unittest
+
+import boto3
+import urllib3
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood.streams import EventStreamReader, ChunkedRange
+from flashflood.exceptions import FlashFloodException
+from tests import infra
+
+
+class TestEventStreamReader(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = boto3.resource("s3")
+        cls.bucket = cls.s3.Bucket(infra.get_env("S3_BUCKET"))
+        cls.flashflood = flashflood.FlashFlood(cls.s3, cls.bucket.name, f"flashflood-test-streams-{uuid4()}")
+        cls.events = [cls.flashflood.put(os.urandom(7)) for _ in range(6)]
+        cls.flashflood.journal(minimum_number_of_events=6)
+        cls.event_stream = next(iter(cls.flashflood.list_event_streams()))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.flashflood._destroy()
+
+    def test_read_range(self):
+        reader = EventStreamReader(pool_size=2)
+        data = b"".join(e.data for e in self.events)
+        stream = reader.read_range(self.event_stream['stream_url'], 3, 17)
+        self.assertEqual(data[3:10], stream.read(7))
+        self.assertEqual(data[10:17], stream.read())
+        self.assertEqual(b"", stream.read())
+        stream.close()
+
+    def test_resume(self):
+        reader = _DroppingStreamReader(number_of_drops=2)
+        replayed = [e for e in flashflood.replay_event_stream(self.event_stream, stream_reader=reader)]
+        self.assertEqual(self.events, replayed)
+        self.assertEqual(2, reader.number_of_resumes)
+
+    def test_resume_limit(self):
+        reader = _DroppingStreamReader(number_of_drops=3, maximum_number_of_resumes=2)
+        with self.assertRaises(FlashFloodException):
+            [e for e in flashflood.replay_event_stream(self.event_stream, stream_reader=reader)]
+
+    def test_chunked_range(self):
+        data = os.urandom(100)
+        boundaries = list(range(0, 100, 7))
+        requested = list()
+
+        def _read_range(start, end):
+            requested.append((start, end))
+            return io.BytesIO(data[start:end])
+
+        stream = ChunkedRange(_read_range, boundaries, 10, 90, chunk_size=20, number_of_connections=3)
+        self.assertEqual(data[10:13], stream.read(3))
+        self.assertEqual(data[13:90], stream.read())
+        stream.close()
+        with self.subTest("Chunks should be cut at boundaries"):
+            requested.sort()
+            self.assertEqual((10, 90), (requested[0][0], requested[-1][1]))
+            for (_, end), (start, _) in zip(requested[:-1], requested[1:]):
+                self.assertEqual(end, start)
+                self.assertIn(start, boundaries)
+
+    def test_parallel_replay(self):
+        with self.subTest("Event streams"):
+            reader = EventStreamReader(number_of_connections=3, chunk_size=10)
+            self.assertEqual(self.events,
+                             [e for e in flashflood.replay_event_stream(self.event_stream, stream_reader=reader)])
+        with self.subTest("Journals"):
+            self.assertEqual(self.events, [e for e in self.flashflood.replay(number_of_connections=3)])
+
+
+class _DroppingStreamReader(EventStreamReader):
+    """
+    Drop connections after 10 bytes, `number_of_drops` times.
+    """
+    def __init__(self, number_of_drops: int, **kwargs):
+        super().__init__(**kwargs)
+        self.number_of_drops = number_of_drops
+
+    def _get(self, url, start, end):
+        resp = super()._get(url, start, end)
+        if self.number_of_drops:
+            self.number_of_drops -= 1
+            resp.raw = _DroppingRaw(resp.raw, 10)
+        return resp
+
+
+class _DroppingRaw:
+    def __init__(self, raw, number_of_bytes):
+        self.raw = raw
+        self.remaining = number_of_bytes
+
+    def read(self, size):
+        if not self.remaining:
+            raise urllib3.exceptions.ProtocolError("Connection dropped")
+        data = self.raw.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def release_conn(self):
+        self.raw.release_conn()
+
+    def close(self):
+        self.raw.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+import os
+import sys
+from uuid import uuid4
+import unittest
+
+pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noqa
+sys.path.insert(0, pkg_root)  # noqa
+
+import flashflood
+from flashflood import tracing
+from flashflood.storage import MemoryStorage
+
+
+class TestTracing(unittest.TestCase):
+    def tearDown(self):
+        tracing.set_tracer(None)
+
+    def test_disabled(self):
+        self.assertIsNone(tracing.get_tracer())
+        with tracing.span("foo", bar=1) as s:
+            s.set_attribute("baz", 2)
+
+    def test_recording_tracer(self):
+        tracer = tracing.RecordingTracer()
+        tracing.set_tracer(tracer)
+        with tracing.span("outer", a=1):
+            with tracing.span("inner") as s:
+                s.set_attribute("b", 2)
+        with self.assertRaises(ValueError):
+            with tracing.span("failing"):
+                raise ValueError()
+        self.assertEqual([("inner", "outer", dict(b=2)), ("outer", None, dict(a=1)), ("failing", None, dict())],
+                         [(s.name, s.parent, s.attributes) for s in tracer.spans])
+        self.assertIsInstance(tracer.spans[-1].exception, ValueError)
+
+    def test_flashflood_spans(self):
+        tracer = tracing.RecordingTracer()
+        tracing.set_tracer(tracer)
+        ff = flashflood.FlashFlood(None, None, f"flashflood-test-tracing-{uuid4()}", storage=MemoryStorage())
+        events = [ff.put(os.urandom(5)) for _ in range(3)]
+        with self.assertLogs("flashflood", "INFO") as logs:
+            ff.journal(minimum_number_of_events=3)
+        self.assertEqual(1, len(logs.records))
+        self.assertTrue(hasattr(logs.records[0], "journal_id"))
+        self.assertEqual(events, list(ff.replay()))
+        self.assertEqual(events[0], ff.get_event(events[0].event_id))
+        names = {s.name for s in tracer.spans}
+        for name in ["flashflood.journal.upload", "flashflood.journal.combine", "flashflood.manifest.fetch",
+                     "flashflood.blob.read", "flashflood.index.put_batch", "flashflood.index.get"]:
+            self.assertIn(name, names)
+        combine = [s for s in tracer.spans if "flashflood.journal.combine" == s.name][0]
+        self.assertEqual(3, combine.attributes['number_of_journals'])
+        uploads = [s for s in tracer.spans if "flashflood.journal.upload" == s.name]
+        self.assertEqual([None] * 3 + ["flashflood.journal.combine"], [s.parent for s in uploads])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,7 +14,8 @@ pkg_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))  # noq
 sys.path.insert(0, pkg_root)  # noqa
 
 from flashflood import config
-from flashflood.util import concurrent_listing, delete_keys, S3Deleter, upload_object, update_object_tagging
+from flashflood.util import (concurrent_listing, delete_keys, S3Deleter, upload_object, update_object_tagging,
+                             LRUCache, external_sort)
 from tests import infra
 
 
@@ -91,6 +92,24 @@ class TestUtils(unittest.TestCase):
         update_object_tagging(self.s3_client, self.bucket.name, key, tagging)
         self.assertEqual(tagging, self._get_tagging(key))
 
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(1, cache.get("a"))
+        cache.put("c", 3)
+        with self.subTest("Least recently used item should be evicted"):
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(1, cache.get("a"))
+            self.assertEqual(3, cache.get("c"))
+            self.assertEqual(2, len(cache))
+
+    def test_external_sort(self):
+        items = [(str(uuid4()), i) for i in range(100)]
+        for chunk_size in (7, 100, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(sorted(items), list(external_sort(iter(items), chunk_size)))
+
     def _get_tagging(self, key):
         tagset = self.s3_client.get_object_tagging(Bucket=self.bucket.name, Key=key)['TagSet']
         return {tag['Key']: tag['Value'] for tag in tagset}